@@ -1,21 +1,27 @@
-from flask import Flask, render_template
+from flask import Flask, Response, jsonify, render_template
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from dotenv import load_dotenv
 import os
 import logging
+from typing import Optional
 from extensions import db
 
 # Import our custom modules
-from facades.cmc_facade import get_btc_price, CMCApiError
+from facades.cmc_facade import CMCApiError, get_cmc_health
+from facades.price_cache import get_cached_btc_price
 from server.db_accessor import DBAccessor
-from server.models.daily_image_version import DailyImageVersion
-from server.models.utils import TaskStatus
+from server.metrics import init_app as init_metrics, metrics
+from server.page_cache import RenderedPageCache, render_cached_page
+from server.page_state import PageState, page_state_cache
+from server.state_stream import StatePublisher
 from openai_files.utils import PromptType
-from const import DEFAULT_IMAGE_URL
-
-#Import holiday list
-from server.models.prompt import Prompt
+from const import (
+    BTC_PRICE_MAX_AGE_SECONDS,
+    DEFAULT_IMAGE_URL,
+    PAGE_CACHE_MAX_AGE_SECONDS,
+    STATE_POLL_SECONDS,
+)
 
 load_dotenv()
 
@@ -29,16 +35,57 @@ logger = logging.getLogger(__name__)
 
 # Initialize database outside of create_app to avoid circular imports
 
+PRICE_ERROR_CONTEXT = {
+    "message": "⚠️ Unable to fetch current Bitcoin price",
+    "price": "N/A",
+    "image_url": DEFAULT_IMAGE_URL,
+    "is_above_100k": False,
+    "error": "Price data temporarily unavailable",
+}
+
+UNEXPECTED_ERROR_CONTEXT = {
+    "message": "⚠️ Something went wrong",
+    "price": "N/A",
+    "image_url": DEFAULT_IMAGE_URL,
+    "is_above_100k": False,
+    "error": "Service temporarily unavailable",
+}
+
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object("config.Config")
     db.init_app(app)
+    init_metrics(app)
 
     # Create application context for database operations
     with app.app_context():
         pass
 
+    # Rendered HTML per distinct page state, shared by all requests
+    page_cache = RenderedPageCache()
+
+    def get_stream_state():
+        # Runs on the publisher's thread, outside of any request.
+        with app.test_request_context("/"):
+            try:
+                return build_home_context()
+            except CMCApiError:
+                return None
+            finally:
+                DBAccessor().rollback()
+
+    # Builds the /api/stream state once per poll for every open tab
+    state_publisher = StatePublisher(get_stream_state)
+    app.extensions["state_publisher"] = state_publisher
+
+    @app.context_processor
+    def live_update_settings():
+        return {
+            "state_stream_enabled": app.config["STATE_STREAM_ENABLED"],
+            "state_poll_ms": STATE_POLL_SECONDS * 1000,
+        }
+
     @app.route("/")
     def home():
         # Check if we're in demo mode (no API keys)
@@ -46,65 +93,61 @@ def create_app():
             return demo_mode()
 
         try:
-            # Get current Bitcoin price
-            btc_price = get_btc_price()
-            logger.info(f"Fetched BTC price: ${btc_price:,.2f}")
-
-            # Determine which image type to show based on price
-            is_above_100k = btc_price >= 100000
-            target_prompt_type = (
-                PromptType.GENERATE_IMAGE_HAPPY
-                if is_above_100k
-                else PromptType.GENERATE_IMAGE_SAD
-            )
+            context = build_home_context()
+            logger.info(f"Fetched BTC price: ${context['price']:,.2f}")
 
-            # Get the appropriate image from database
-            image_url = get_current_image(target_prompt_type)
-
-            # Determine the message
-            if is_above_100k:
-                message = "🚀 Bitcoin is above $100K! Time to celebrate! 🎉"
-            else:
-                message = (
-                    f"😅 Bitcoin is at ${btc_price:,.2f} - Still waiting for $100K..."
-                )
-            # grab the daily holidays
-            holiday_prompt = get_current_holidays()
-
-            return render_template(
-                "index.html",
-                message=message,
-                price=btc_price,
-                image_url=image_url,
-                is_above_100k=is_above_100k,
-                holidays=holiday_prompt,
-            )
+            with metrics.stage("render"):
+                return render_cached_page(page_cache, "index.html", **context)
 
         except CMCApiError as e:
             logger.error(f"Failed to fetch Bitcoin price: {e}")
-            return render_template(
-                "index.html",
-                message="⚠️ Unable to fetch current Bitcoin price",
-                price="N/A",
-                image_url=DEFAULT_IMAGE_URL,
-                is_above_100k=False,
-                error="Price data temporarily unavailable",
+            return render_cached_page(
+                page_cache, "index.html", cacheable=False, **PRICE_ERROR_CONTEXT
             )
         except Exception as e:
             logger.error(f"Unexpected error: {e}")
-            return render_template(
-                "index.html",
-                message="⚠️ Something went wrong",
-                price="N/A",
-                image_url=DEFAULT_IMAGE_URL,
-                is_above_100k=False,
-                error="Service temporarily unavailable",
+            return render_cached_page(
+                page_cache, "index.html", cacheable=False, **UNEXPECTED_ERROR_CONTEXT
             )
 
+    @app.route("/api/state")
+    def api_state():
+        """Current price, bucket, image and holidays as JSON"""
+        try:
+            state = build_home_context()
+        except CMCApiError as e:
+            logger.error(f"Failed to fetch Bitcoin price: {e}")
+            return {"error": "Price data temporarily unavailable"}, 503
+
+        response = jsonify(state)
+        response.add_etag()
+        response.cache_control.public = True
+        response.cache_control.max_age = PAGE_CACHE_MAX_AGE_SECONDS
+        return response.make_conditional(request)
+
+    @app.route("/api/stream")
+    def api_stream():
+        """Server-Sent Events pushing the /api/state payload when it changes"""
+        if not app.config["STATE_STREAM_ENABLED"]:
+            # 204 tells EventSource not to reconnect; the page polls instead.
+            return "", 204
+
+        response = Response(
+            state_publisher.subscribe(), mimetype="text/event-stream"
+        )
+        response.headers["Cache-Control"] = "no-cache"
+        # Stop nginx-style proxies from buffering the stream
+        response.headers["X-Accel-Buffering"] = "no"
+        return response
+
     @app.route("/health")
     def health_check():
-        """Simple health check endpoint"""
-        return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
+        """Simple health check endpoint, plus the CMC client's upstream health"""
+        return {
+            "status": "healthy",
+            "timestamp": datetime.utcnow().isoformat(),
+            "cmc": get_cmc_health(),
+        }
 
     return app
 
@@ -148,133 +191,103 @@ def demo_mode():
     )
 
 
-def get_current_image(prompt_type: PromptType) -> str:
+def build_home_context(
+    btc_price: Optional[float] = None, page_state: Optional[PageState] = None
+) -> dict:
     """
-    Get the current active image URL for the specified prompt type.
-    Falls back to local images, then default image if no active image is found.
+    Everything the home page shows for the current price and day.
+    Shared by the rendered page and /api/state; the ASGI app passes in the
+    price and page state it already fetched asynchronously, so nothing here
+    touches the sync DB session.
+    Raises: CMCApiError if no BTC price is available
     """
-    try:
-        db_accessor = DBAccessor()
-
-        # Query for the most recent active image of the specified type
-
-        latest_version = (
-            db_accessor.query(DailyImageVersion)
-            .filter(
-                DailyImageVersion.prompt_type == prompt_type,
-                DailyImageVersion.is_active == True,
-                DailyImageVersion.status == TaskStatus.COMPLETED,
-                DailyImageVersion.presigned_url.isnot(None),
-                DailyImageVersion.presigned_url_expiry > datetime.now(),
-            )
-            .order_by(DailyImageVersion.prompt_date.desc())
-            .first()
-        )
+    if page_state is None:
+        with metrics.stage("state"):
+            page_state = page_state_cache.get()
+    # Get current Bitcoin price
+    if btc_price is None:
+        with metrics.stage("price"):
+            btc_price = get_latest_btc_price(page_state)
+
+    # Determine which image type to show based on price
+    is_above_100k = btc_price >= 100000
+    target_prompt_type = (
+        PromptType.GENERATE_IMAGE_HAPPY if is_above_100k else PromptType.GENERATE_IMAGE_SAD
+    )
 
-        if latest_version and latest_version.presigned_url:
-            logger.info(f"Found active image for {prompt_type.value}")
-            return latest_version.presigned_url
-        else:
-            logger.warning(
-                f"No active image found for {prompt_type.value}, using local images"
-            )
-            # Fall back to local images
-            from flask import url_for
-
-            if prompt_type == PromptType.GENERATE_IMAGE_HAPPY:
-                try:
-                    return url_for(
-                        "static", filename="images/happy_investor_btc100k_lol.png"
-                    )
-                except:
-                    pass
-            elif prompt_type == PromptType.GENERATE_IMAGE_SAD:
-                try:
-                    return url_for(
-                        "static", filename="images/sad_investor_btc100k_lol.png"
-                    )
-                except:
-                    pass
-            return DEFAULT_IMAGE_URL
-
-
-    except Exception as e:
-        logger.error(f"Error fetching image for {prompt_type.value}: {e}")
-        # Fall back to local images on error
-        from flask import url_for
+    # Get the appropriate image from database
+    with metrics.stage("image"):
+        image_url = get_current_image(target_prompt_type, page_state)
 
-        try:
-            if prompt_type == PromptType.GENERATE_IMAGE_HAPPY:
-                return url_for(
-                    "static", filename="images/happy_investor_btc100k_lol.png"
-                )
-            elif prompt_type == PromptType.GENERATE_IMAGE_SAD:
-                return url_for("static", filename="images/sad_investor_btc100k_lol.png")
-        except:
-            pass
-        return DEFAULT_IMAGE_URL
+    # Determine the message
+    if is_above_100k:
+        message = "🚀 Bitcoin is above $100K! Time to celebrate! 🎉"
+    else:
+        message = f"😅 Bitcoin is at ${btc_price:,.2f} - Still waiting for $100K..."
+
+    # grab the daily holidays
+    with metrics.stage("holidays"):
+        holidays = get_current_holidays(page_state)
 
+    return {
+        "message": message,
+        "price": btc_price,
+        "image_url": image_url,
+        "is_above_100k": is_above_100k,
+        "holidays": holidays,
+    }
 
 
-def get_current_holidays() -> list[dict[str, str]]:
+def get_latest_btc_price(page_state: Optional[PageState] = None) -> float:
     """
-    Get the current holidays from the database and parse them into a structured list.
-    Returns a list of dicts: [{'name': 'Holiday Name', 'description': 'Description'}]
+    Get the newest BTC price written by the worker's price poller, as carried
+    by the page state snapshot (so no query per request).
+    Falls back to the cached CMC quote if the poller hasn't written recently.
+    """
+    page_state = page_state or page_state_cache.get()
+    btc_price = page_state.latest_btc_price(BTC_PRICE_MAX_AGE_SECONDS)
+    if btc_price is not None:
+        return btc_price
+
+    logger.warning("No recent BTC price in database, falling back to CMC")
+    return get_cached_btc_price()
+
+
+def get_current_image(
+    prompt_type: PromptType, page_state: Optional[PageState] = None
+) -> str:
+    """
+    Get the current active image URL for the specified prompt type.
+    Falls back to local images, then default image if no active image is found.
     """
+    page_state = page_state or page_state_cache.get()
+    image_url = page_state.image_url(prompt_type)
+    if image_url:
+        return image_url
+
+    logger.warning(f"No active image found for {prompt_type.value}, using local images")
+    # Fall back to local images
+    from flask import url_for
+
     try:
-        db_accessor = DBAccessor()
-
-        # Query for the most recent holiday prompt
-        latest_prompt = (
-            db_accessor.query(Prompt)
-            .filter(
-                Prompt.prompt_type == PromptType.GET_HOLIDAYS,
-                Prompt.status == TaskStatus.COMPLETED,
-            )
-            .order_by(Prompt.prompt_date.desc())
-            .first()
-        )
+        if prompt_type == PromptType.GENERATE_IMAGE_HAPPY:
+            return url_for("static", filename="images/happy_investor_btc100k_lol.png")
+        elif prompt_type == PromptType.GENERATE_IMAGE_SAD:
+            return url_for("static", filename="images/sad_investor_btc100k_lol.png")
+    except:
+        pass
+    return DEFAULT_IMAGE_URL
+
 
-        if not latest_prompt or not latest_prompt.prompt_text:
-            return []
-
-        # Parse the raw text
-        holidays = []
-        raw_lines = latest_prompt.prompt_text.split('\n')
-        
-        for line in raw_lines:
-            line = line.strip()
-            if not line:
-                continue
-                
-            # Remove leading bullet points if present
-            if line.startswith('- ') or line.startswith('* '):
-                line = line[2:]
-            
-            # Split into name and description
-            # We look for " - " or ": " as separators
-            parts = []
-            if " - " in line:
-                parts = line.split(" - ", 1)
-            elif ": " in line:
-                parts = line.split(": ", 1)
-            else:
-                # If no separator found, treat whole line as name
-                parts = [line, ""]
-                
-            name = parts[0].strip()
-            description = parts[1].strip() if len(parts) > 1 else ""
-            
-            holidays.append({
-                "name": name,
-                "description": description
-            })
-            
-        return holidays
-
-    except Exception as e:
-        logger.error(f"Error fetching holidays: {e}")
-        return []
+def get_current_holidays(
+    page_state: Optional[PageState] = None,
+) -> list[dict[str, str]]:
+    """
+    Get the current holidays, already parsed into a structured list.
+    Returns a list of dicts: [{'name': 'Holiday Name', 'description': 'Description'}]
+    """
+    page_state = page_state or page_state_cache.get()
+    return list(page_state.holidays)
 
 
 if __name__ == "__main__":
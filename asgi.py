@@ -0,0 +1,246 @@
+"""
+ASGI entry point: async serving mode for the hot path.
+
+    GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker \\
+        gunicorn -c gunicorn.conf.py "asgi:create_asgi_app()"
+    uvicorn --factory asgi:create_asgi_app
+
+`/` and `/api/state` are served on the event loop. The BTC price and page
+state are read through SQLAlchemy's async engine, falling back to CMC over
+the shared httpx.AsyncClient, so a single worker can hold hundreds of
+requests while they wait on upstreams. Only the (cached) template render
+touches Flask. /api/stream is also served natively: an open stream is a
+coroutine waiting on the shared StatePublisher, not a parked thread, so the
+page switches from polling to EventSource in this mode. Everything else -
+static files, /health and demo mode - is handed to the Flask app unchanged.
+"""
+
+import asyncio
+import json
+import logging
+import os
+
+from asgiref.wsgi import WsgiToAsgi  # type: ignore
+from flask import Flask, Response
+
+from app import (
+    PRICE_ERROR_CONTEXT,
+    UNEXPECTED_ERROR_CONTEXT,
+    build_home_context,
+    create_app,
+)
+from const import BTC_PRICE_MAX_AGE_SECONDS, PAGE_CACHE_MAX_AGE_SECONDS
+from facades.cmc_facade import CMCApiError, close_async_client
+from facades.price_cache import get_cached_btc_price_async
+from server.async_db import async_session, dispose_async_engine
+from server.metrics import metrics
+from server.page_cache import RenderedPageCache, render_cached_page
+from server.page_state import PageState, page_state_cache
+from server.state_stream import StatePublisher
+
+logger = logging.getLogger(__name__)
+
+
+async def get_latest_btc_price_async(page_state: PageState) -> float:
+    """
+    get_latest_btc_price for the event loop: the polled price comes with the
+    page state snapshot, and the CMC fallback goes over httpx.
+    """
+    btc_price = page_state.latest_btc_price(BTC_PRICE_MAX_AGE_SECONDS)
+    if btc_price is not None:
+        return btc_price
+
+    logger.warning("No recent BTC price in database, falling back to CMC")
+    return await get_cached_btc_price_async()
+
+
+class AsyncApp:
+    def __init__(self, flask_app: Flask):
+        self.flask_app = flask_app
+        self.wsgi_app = WsgiToAsgi(flask_app)
+        self.page_cache = RenderedPageCache()
+        self.state_publisher: StatePublisher = flask_app.extensions["state_publisher"]
+        self.routes = {
+            "/": self.home,
+            "/api/state": self.api_state,
+            "/api/stream": self.api_stream,
+        }
+        # Streams are cheap here, so let the page use them.
+        flask_app.config["STATE_STREAM_ENABLED"] = True
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+
+        handler = self.routes.get(scope.get("path", ""))
+        if (
+            scope["type"] == "http"
+            and scope["method"] in ("GET", "HEAD")
+            and handler is not None
+            # Demo mode is random per request; let Flask handle it.
+            and os.getenv("CMC_API_KEY")
+        ):
+            token = metrics.begin_request()
+            try:
+                await handler(scope, receive, send)
+            finally:
+                metrics.end_request(token)
+            return
+
+        await self.wsgi_app(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await close_async_client()
+                await dispose_async_engine()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def fetch_state(self) -> tuple[float, PageState]:
+        # All of the request's I/O happens here, on the event loop. Both
+        # results are handed to build_home_context so it never falls back to
+        # the blocking sync session.
+        with metrics.stage("state"):
+            async with async_session() as session:
+                page_state = await page_state_cache.get_async(session)
+        with metrics.stage("price"):
+            btc_price = await get_latest_btc_price_async(page_state)
+        return btc_price, page_state
+
+    async def home(self, scope, receive, send):
+        try:
+            btc_price, page_state = await self.fetch_state()
+            with self.request_context(scope):
+                context = build_home_context(btc_price, page_state)
+                logger.info(f"Fetched BTC price: ${btc_price:,.2f}")
+                with metrics.stage("render"):
+                    response = render_cached_page(
+                        self.page_cache, "index.html", **context
+                    )
+
+        except CMCApiError as e:
+            logger.error(f"Failed to fetch Bitcoin price: {e}")
+            with self.request_context(scope):
+                response = render_cached_page(
+                    self.page_cache, "index.html", cacheable=False, **PRICE_ERROR_CONTEXT
+                )
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}")
+            with self.request_context(scope):
+                response = render_cached_page(
+                    self.page_cache,
+                    "index.html",
+                    cacheable=False,
+                    **UNEXPECTED_ERROR_CONTEXT,
+                )
+
+        await self.send_response(scope, send, response)
+
+    async def api_state(self, scope, receive, send):
+        try:
+            btc_price, page_state = await self.fetch_state()
+        except CMCApiError as e:
+            logger.error(f"Failed to fetch Bitcoin price: {e}")
+            response = Response(
+                json.dumps({"error": "Price data temporarily unavailable"}),
+                status=503,
+                mimetype="application/json",
+            )
+            await self.send_response(scope, send, response)
+            return
+
+        with self.request_context(scope) as ctx:
+            state = build_home_context(btc_price, page_state)
+            response = self.flask_app.json.response(state)
+            response.add_etag()
+            response.cache_control.public = True
+            response.cache_control.max_age = PAGE_CACHE_MAX_AGE_SECONDS
+            response = response.make_conditional(ctx.request)
+
+        await self.send_response(scope, send, response)
+
+    async def api_stream(self, scope, receive, send):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream; charset=utf-8"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),
+                ],
+            }
+        )
+        if scope["method"] == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        events = self.state_publisher.subscribe_async()
+
+        async def pump():
+            async for chunk in events:
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk.encode("utf-8"),
+                        "more_body": True,
+                    }
+                )
+
+        async def wait_for_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        streaming = asyncio.ensure_future(pump())
+        disconnect = asyncio.ensure_future(wait_for_disconnect())
+        try:
+            done, _ = await asyncio.wait(
+                {streaming, disconnect}, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            for task in (streaming, disconnect):
+                task.cancel()
+            await asyncio.gather(streaming, disconnect, return_exceptions=True)
+            await events.aclose()
+
+        if disconnect not in done:
+            # Stream reached its max lifetime; EventSource will reconnect.
+            await send({"type": "http.response.body", "body": b""})
+
+    def request_context(self, scope):
+        headers = [
+            (name.decode("latin-1"), value.decode("latin-1"))
+            for name, value in scope.get("headers", [])
+        ]
+        host = dict(headers).get("host", "localhost")
+        return self.flask_app.test_request_context(
+            scope["path"],
+            base_url=f"{scope.get('scheme', 'http')}://{host}{scope.get('root_path', '')}",
+            method=scope["method"],
+            query_string=scope.get("query_string", b""),
+            headers=headers,
+        )
+
+    async def send_response(self, scope, send, response: Response):
+        metrics.finish_response(response, scope["path"])
+        body = b"" if scope["method"] == "HEAD" else response.get_data()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": [
+                    (name.lower().encode("latin-1"), value.encode("latin-1"))
+                    for name, value in response.headers.items()
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+
+def create_asgi_app() -> AsyncApp:
+    return AsyncApp(create_app())
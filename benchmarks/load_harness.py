@@ -0,0 +1,304 @@
+"""
+Load test harness for the web app.
+
+Serves create_app() with the production gunicorn settings (or Flask's dev
+server, for comparison), with the page state snapshot's DB recheck (which
+also carries the polled BTC price) replaced by a stub that sleeps for a
+configurable latency. Then hammers it
+from N keep-alive client threads and reports throughput and latency.
+
+    python -m benchmarks.load_harness --concurrency 50 --duration 10
+    python -m benchmarks.load_harness --server werkzeug --concurrency 50
+    python -m benchmarks.load_harness --path /api/state --db-latency-ms 20
+
+--streams N holds N /api/stream connections open (like N open tabs) while
+the load runs, to check that / stays responsive. Under gthread the stream is
+off by default and answers 204; --enable-stream turns it on to show each
+open stream pinning a worker thread. --server asgi serves asgi.py, where
+streams are coroutines:
+
+    python -m benchmarks.load_harness --streams 100 --enable-stream
+    python -m benchmarks.load_harness --server asgi --streams 100
+"""
+
+import argparse
+import asyncio
+import http.client
+import os
+import runpy
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import replace
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def install_stubs(price: float, db_latency_ms: float) -> None:
+    """Replace upstream/DB reads on the request path with sleeps."""
+    # Importing app needs these; the stubs below mean neither is used.
+    os.environ.setdefault("CMC_API_KEY", "load-test")
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+    from openai_files.utils import PromptType
+    from server.page_state import PageState, PageStateCache
+
+    def stub_state(self, state):
+        if state is None:
+            state = PageState(
+                image_urls={
+                    PromptType.GENERATE_IMAGE_HAPPY: "https://example.com/happy.png",
+                    PromptType.GENERATE_IMAGE_SAD: "https://example.com/sad.png",
+                },
+                expires_at=datetime.now() + timedelta(days=1),
+                holidays=(
+                    {"name": "Load Test Day", "description": "Lots of requests"},
+                ),
+            )
+        # The recheck also picks up the latest polled price.
+        state = replace(state, btc_price=price, btc_price_quoted_at=datetime.now())
+        self._recheck_at = time.monotonic() + self.recheck_seconds
+        self._state = state
+        return state
+
+    def stub_refresh(self, state):
+        time.sleep(db_latency_ms / 1000)
+        return stub_state(self, state)
+
+    async def stub_get_async(self, session):
+        state = self._state
+        if state is None or self._is_due(state):
+            await asyncio.sleep(db_latency_ms / 1000)
+            state = stub_state(self, state)
+        return state
+
+    patch.object(PageStateCache, "_refresh", stub_refresh).start()
+    patch.object(PageStateCache, "get_async", stub_get_async).start()
+
+
+def serve(args: argparse.Namespace) -> None:
+    install_stubs(args.price, args.db_latency_ms)
+    if args.enable_stream:
+        os.environ["STATE_STREAM_ENABLED"] = "true"
+    from app import create_app
+    from asgi import create_asgi_app
+
+    if args.server == "werkzeug":
+        create_app().run(host="127.0.0.1", port=args.port, threaded=True)
+        return
+
+    from gunicorn.app.base import BaseApplication  # type: ignore
+
+    class HarnessApplication(BaseApplication):
+        def load_config(self):
+            settings = runpy.run_path(os.path.join(ROOT_DIR, "gunicorn.conf.py"))
+            for key, value in settings.items():
+                if key in self.cfg.settings and value is not None:
+                    self.cfg.set(key, value)
+            self.cfg.set("bind", f"127.0.0.1:{args.port}")
+            self.cfg.set("accesslog", None)
+            if args.workers:
+                self.cfg.set("workers", args.workers)
+            if args.threads:
+                self.cfg.set("threads", args.threads)
+            if args.server == "asgi":
+                self.cfg.set("worker_class", "uvicorn.workers.UvicornWorker")
+
+        def load(self):
+            return create_asgi_app() if args.server == "asgi" else create_app()
+
+    HarnessApplication().run()
+
+
+def wait_for_port(port: int, timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server did not start listening on port {port}")
+
+
+def hold_streams(port: int, count: int, stop: threading.Event) -> Counter:
+    """Open `count` /api/stream connections and keep reading until `stop`."""
+    statuses: Counter = Counter()
+    lock = threading.Lock()
+    opened = threading.Barrier(count + 1) if count else None
+
+    def stream() -> None:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+        try:
+            conn.request("GET", "/api/stream")
+            response = conn.getresponse()
+            with lock:
+                statuses[response.status] += 1
+        except (OSError, http.client.HTTPException):
+            with lock:
+                statuses["error"] += 1
+            response = None
+        opened.wait()
+
+        while response is not None and not stop.is_set():
+            try:
+                if not response.readline():
+                    break
+            except socket.timeout:
+                continue
+            except (OSError, http.client.HTTPException):
+                break
+        conn.close()
+
+    for _ in range(count):
+        threading.Thread(target=stream, daemon=True).start()
+    if opened is not None:
+        opened.wait()
+    return statuses
+
+
+def drive_load(
+    port: int, path: str, concurrency: int, duration: float, conditional: bool
+) -> dict:
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client() -> None:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        etag = None
+        local_latencies = []
+        local_statuses: Counter = Counter()
+        while time.monotonic() < deadline:
+            headers = {"If-None-Match": etag} if conditional and etag else {}
+            started = time.perf_counter()
+            try:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                etag = response.getheader("ETag") or etag
+                local_statuses[response.status] += 1
+            except (OSError, http.client.HTTPException):
+                local_statuses["error"] += 1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                continue
+            local_latencies.append(time.perf_counter() - started)
+        conn.close()
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.update(local_statuses)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    return {
+        "requests": len(latencies),
+        "requests_per_second": len(latencies) / elapsed,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "statuses": dict(statuses),
+    }
+
+
+def run(args: argparse.Namespace) -> dict:
+    command = [
+        sys.executable, "-m", "benchmarks.load_harness", "serve",
+        "--server", args.server,
+        "--port", str(args.port),
+        "--price", str(args.price),
+        "--db-latency-ms", str(args.db_latency_ms),
+    ]
+    if args.workers:
+        command += ["--workers", str(args.workers)]
+    if args.threads:
+        command += ["--threads", str(args.threads)]
+    if args.enable_stream:
+        command += ["--enable-stream"]
+
+    server = subprocess.Popen(
+        command, cwd=ROOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    stop_streams = threading.Event()
+    try:
+        wait_for_port(args.port)
+        # Warm up caches and worker imports before measuring.
+        drive_load(args.port, args.path, min(args.concurrency, 4), 1.0, False)
+        stream_statuses = hold_streams(args.port, args.streams, stop_streams)
+        result = drive_load(
+            args.port, args.path, args.concurrency, args.duration, args.conditional
+        )
+        result["stream_statuses"] = dict(stream_statuses)
+        return result
+    finally:
+        stop_streams.set()
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("mode", nargs="?", choices=["run", "serve"], default="run")
+    parser.add_argument(
+        "--server", choices=["gunicorn", "asgi", "werkzeug"], default="gunicorn"
+    )
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--workers", type=int, help="override gunicorn workers")
+    parser.add_argument("--threads", type=int, help="override gunicorn threads")
+    parser.add_argument("--path", default="/")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--price", type=float, default=95000.0)
+    parser.add_argument("--db-latency-ms", type=float, default=5.0)
+    parser.add_argument(
+        "--streams", type=int, default=0,
+        help="hold this many /api/stream connections open during the run",
+    )
+    parser.add_argument(
+        "--enable-stream", action="store_true",
+        help="set STATE_STREAM_ENABLED for the Flask app",
+    )
+    parser.add_argument(
+        "--conditional", action="store_true",
+        help="send If-None-Match like a revalidating browser/CDN",
+    )
+    args = parser.parse_args()
+
+    if args.mode == "serve":
+        serve(args)
+        return
+
+    result = run(args)
+    print(
+        f"{args.server} {args.path} concurrency={args.concurrency}: "
+        f"{result['requests_per_second']:.1f} req/s, "
+        f"p50={result['p50_ms']:.1f}ms p95={result['p95_ms']:.1f}ms "
+        f"p99={result['p99_ms']:.1f}ms statuses={result['statuses']}"
+    )
+    if args.streams:
+        print(f"{args.streams} open streams: statuses={result['stream_statuses']}")
+
+
+if __name__ == "__main__":
+    main()
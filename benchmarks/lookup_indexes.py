@@ -0,0 +1,217 @@
+"""
+Benchmark for the current image / holiday lookups as history grows.
+
+Seeds a database with years of daily pipeline history (a holiday prompt,
+two image prompts, their image links and versions per day, plus the odd
+failed retry), then times page_state's active_version_query,
+latest_holidays_query and recheck_query (the fingerprint every request-path
+recheck runs) at each size, with and without the lookup indexes. With them
+the time stays flat (index probes); without them it grows with the table
+(a scan plus sort).
+
+    python -m benchmarks.lookup_indexes
+    python -m benchmarks.lookup_indexes --years 1 10 50 --iterations 500
+    python -m benchmarks.lookup_indexes --database-url postgresql://...
+
+The default is a throwaway SQLite file. Against Postgres, point it at an
+empty scratch database: it creates and drops the tables itself.
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Engine, create_engine, insert, text
+
+os.environ.setdefault("CMC_API_KEY", "benchmark")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from openai_files.utils import PromptType  # noqa: E402
+from server.models import DailyImageVersion, ImageLink, Prompt  # noqa: E402
+from server.models.base import Base  # noqa: E402
+from server.models.utils import TaskStatus  # noqa: E402
+from server.page_state import (  # noqa: E402
+    active_version_query,
+    latest_holidays_query,
+    recheck_query,
+)
+
+IMAGE_TYPES = (PromptType.GENERATE_IMAGE_HAPPY, PromptType.GENERATE_IMAGE_SAD)
+LOOKUP_INDEXES = [
+    index
+    for table in (DailyImageVersion.__table__, Prompt.__table__)
+    for index in table.indexes
+    if index.name in ("ix_daily_image_version_current", "ix_prompt_type_status_date")
+]
+
+
+class HistorySeeder:
+    """Appends days of history, walking backwards from today."""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.next_id = 1
+        self.oldest = date.today()
+        self.days = 0
+
+    def seed_current(self) -> None:
+        # Today's live rows; everything seeded later is older and inactive.
+        self._insert_days([self.oldest], active=True)
+        self.days = 1
+
+    def grow_to(self, days: int, batch_days: int = 365) -> None:
+        while self.days < days:
+            count = min(batch_days, days - self.days)
+            dates = [self.oldest - timedelta(days=n + 1) for n in range(count)]
+            self._insert_days(dates, active=False)
+            self.oldest = dates[-1]
+            self.days += count
+
+    def _insert_days(self, dates: list[date], active: bool) -> None:
+        prompts, links, versions = [], [], []
+        expiry = datetime.now() + timedelta(days=1)
+        for day in dates:
+            prompts.append(self._prompt(day, PromptType.GET_HOLIDAYS, "Day - Desc"))
+            if day.day == 1:
+                # A failed attempt now and then, like real history.
+                prompts.append(
+                    self._prompt(day, PromptType.GET_HOLIDAYS, "", TaskStatus.FAILED)
+                )
+            for prompt_type in IMAGE_TYPES:
+                prompt = self._prompt(day, prompt_type, "image prompt")
+                prompts.append(prompt)
+                link_id = self._id()
+                links.append(
+                    {
+                        "id": link_id,
+                        "prompt_id": prompt["id"],
+                        "openai_image_url": "https://openai/image.png",
+                        "s3_image_url": f"https://bucket.s3.amazonaws.com/{day}.png",
+                        "status": TaskStatus.COMPLETED,
+                    }
+                )
+                versions.append(
+                    {
+                        "id": self._id(),
+                        "image_link_id": link_id,
+                        "presigned_url": f"https://s3/{day}.png?sig",
+                        "presigned_url_expiry": (
+                            expiry if active else datetime.fromordinal(day.toordinal())
+                        ),
+                        "is_active": active,
+                        "prompt_type": prompt_type,
+                        "prompt_date": day,
+                        "status": TaskStatus.COMPLETED,
+                    }
+                )
+
+        with self.engine.begin() as conn:
+            conn.execute(insert(Prompt), prompts)
+            conn.execute(insert(ImageLink), links)
+            conn.execute(insert(DailyImageVersion), versions)
+
+    def _prompt(self, day, prompt_type, prompt_text, status=TaskStatus.COMPLETED):
+        return {
+            "id": self._id(),
+            "prompt_text": prompt_text,
+            "prompt_date": day,
+            "prompt_type": prompt_type,
+            "status": status,
+        }
+
+    def _id(self) -> int:
+        self.next_id += 1
+        return self.next_id
+
+
+def time_lookups(engine: Engine, iterations: int) -> dict[str, float]:
+    """Median microseconds per lookup."""
+    queries = {
+        "current image": lambda: active_version_query(
+            PromptType.GENERATE_IMAGE_SAD, datetime.now()
+        ),
+        "current holidays": latest_holidays_query,
+        "recheck": lambda: recheck_query(datetime.now()),
+    }
+    results = {}
+    with engine.connect() as conn:
+        for name, query in queries.items():
+            assert conn.execute(query()).first() is not None
+            samples = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                conn.execute(query()).first()
+                samples.append(time.perf_counter() - start)
+            results[name] = statistics.median(samples) * 1e6
+    return results
+
+
+def set_indexes(engine: Engine, enabled: bool) -> None:
+    for index in LOOKUP_INDEXES:
+        if enabled:
+            index.create(engine, checkfirst=True)
+        else:
+            index.drop(engine, checkfirst=True)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+
+def run(database_url: str, years: list[int], iterations: int) -> list[dict]:
+    engine = create_engine(database_url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    seeder = HistorySeeder(engine)
+    seeder.seed_current()
+
+    rows = []
+    try:
+        for year_count in sorted(years):
+            seeder.grow_to(year_count * 365)
+            row = {"years": year_count, "versions": seeder.days * len(IMAGE_TYPES)}
+            for enabled in (True, False):
+                set_indexes(engine, enabled)
+                label = "indexed" if enabled else "unindexed"
+                for name, micros in time_lookups(engine, iterations).items():
+                    row[f"{name} {label}"] = micros
+            set_indexes(engine, True)
+            rows.append(row)
+    finally:
+        Base.metadata.drop_all(engine)
+        engine.dispose()
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 5, 20, 50])
+    parser.add_argument("--iterations", type=int, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{tmp}/history.db"
+        rows = run(database_url, args.years, args.iterations)
+
+    print(
+        f"{'years':>5} {'versions':>9}  "
+        f"{'image idx':>10} {'image scan':>11}  "
+        f"{'holiday idx':>11} {'holiday scan':>12}  "
+        f"{'recheck idx':>11} {'recheck scan':>12}"
+    )
+    for row in rows:
+        print(
+            f"{row['years']:>5} {row['versions']:>9}  "
+            f"{row['current image indexed']:>8.0f}us "
+            f"{row['current image unindexed']:>9.0f}us  "
+            f"{row['current holidays indexed']:>9.0f}us "
+            f"{row['current holidays unindexed']:>10.0f}us  "
+            f"{row['recheck indexed']:>9.0f}us "
+            f"{row['recheck unindexed']:>10.0f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
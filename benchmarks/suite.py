@@ -0,0 +1,360 @@
+"""
+Benchmark suite for the request path and the daily pipeline.
+
+Times each case and compares the medians with a stored baseline. Any case
+more than --tolerance slower than the baseline is reported as a regression
+and the run exits 1.
+
+- parse holidays: parse_holiday_list on a typical answer
+- render index.html: the home template with a full context
+- home cached / home cold state: GET / through the Flask test client
+  with today's images seeded, the page state snapshot warm or rebuilt
+  from the DB each time
+- current image+holidays Ny: get_current_image and get_current_holidays,
+  rebuilding the snapshot, over N years of seeded history
+- generate_daily_images: one day's full pipeline against the fake OpenAI
+  and S3 backends (tests/fakes)
+
+    python -m benchmarks.suite
+    python -m benchmarks.suite --only home --output results.json
+    python -m benchmarks.suite --save-baseline
+
+The databases are throwaway SQLite files. BENCHMARK_DATABASE_URL points
+the app cases elsewhere, e.g. at a scratch Postgres database; the suite
+creates and drops the tables there itself. DATABASE_URL is never used.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta
+from typing import Callable, Iterable, Optional
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+HOLIDAY_TEXT = "\n".join(
+    f"{n}. **Holiday {n}** - A description of holiday number {n}, with details."
+    for n in range(1, 31)
+)
+
+
+@dataclass
+class Result:
+    name: str
+    iterations: int
+    median_us: float
+    p95_us: float
+    min_us: float
+
+
+def measure(
+    name: str,
+    fn: Callable[[], object],
+    iterations: int,
+    warmup: int = 3,
+    before_each: Optional[Callable[[], object]] = None,
+) -> Result:
+    """Time fn() `iterations` times; before_each runs untimed."""
+    for _ in range(warmup):
+        if before_each:
+            before_each()
+        fn()
+    samples = []
+    for _ in range(iterations):
+        if before_each:
+            before_each()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return Result(
+        name=name,
+        iterations=iterations,
+        median_us=statistics.median(samples),
+        p95_us=samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        min_us=samples[0],
+    )
+
+
+def bench_parse_holidays(iterations: int) -> list[Result]:
+    from openai_files.helpers import parse_holiday_list
+
+    return [
+        measure("parse holidays", lambda: parse_holiday_list(HOLIDAY_TEXT), iterations)
+    ]
+
+
+def bench_render(app, iterations: int) -> list[Result]:
+    from flask import render_template
+
+    from openai_files.helpers import parse_holiday_list
+
+    context = {
+        "message": "🚀 Bitcoin is above $100K! Time to celebrate! 🎉",
+        "price": 101234.56,
+        "image_url": "https://bucket.s3.amazonaws.com/happy.png?X-Amz-Signature=x",
+        "is_above_100k": True,
+        "holidays": parse_holiday_list(HOLIDAY_TEXT),
+    }
+    with app.test_request_context("/"):
+        return [
+            measure(
+                "render index.html",
+                lambda: render_template("index.html", **context),
+                iterations,
+            )
+        ]
+
+
+def bench_home(app, iterations: int) -> list[Result]:
+    from extensions import db
+    from server.models import BitcoinPrice
+    from server.page_state import page_state_cache
+
+    with app.app_context():
+        db.session.add(BitcoinPrice(price=101234.56, quoted_at=datetime.now()))
+        db.session.commit()
+        db.session.remove()
+
+    client = app.test_client()
+
+    def get_home():
+        response = client.get("/")
+        assert response.status_code == 200, response.status_code
+
+    page_state_cache.invalidate()
+    return [
+        measure("home cached", get_home, iterations),
+        measure(
+            "home cold state",
+            get_home,
+            iterations,
+            before_each=page_state_cache.invalidate,
+        ),
+    ]
+
+
+def bench_lookups(
+    app, seeder, years: Iterable[int], iterations: int
+) -> list[Result]:
+    from app import get_current_holidays, get_current_image
+    from extensions import db
+    from openai_files.utils import PromptType
+    from server.page_state import page_state_cache
+
+    def lookup():
+        page_state_cache.invalidate()
+        get_current_image(PromptType.GENERATE_IMAGE_SAD)
+        get_current_holidays()
+
+    results = []
+    with app.app_context():
+        for year_count in sorted(years):
+            seeder.grow_to(year_count * 365)
+            results.append(
+                measure(f"current image+holidays {year_count}y", lookup, iterations)
+            )
+            db.session.remove()
+    page_state_cache.invalidate()
+    return results
+
+
+def bench_pipeline(workdir: str, iterations: int) -> list[Result]:
+    from sqlalchemy import create_engine
+
+    from openai_files.rate_limiter import RateLimiter
+    from openai_files.utils import PromptType
+    from server.daily_image_generator import DailyImageGenerator
+    from server.models.base import Base
+    from tests.fakes import OfflineBackends
+    from tests.helpers import ThreadSessionAccessor
+
+    engine = create_engine(f"sqlite:///{os.path.join(workdir, 'pipeline.db')}")
+    Base.metadata.create_all(engine)
+    db_accessor = ThreadSessionAccessor(engine)
+    days = iter(date(2026, 1, 1) + timedelta(days=n) for n in range(10_000))
+    prompt_types = [PromptType.GENERATE_IMAGE_HAPPY, PromptType.GENERATE_IMAGE_SAD]
+
+    try:
+        with OfflineBackends() as backends:
+            # The image limit (5/min) would make this a rate limiter
+            # benchmark; its waits are skipped.
+            openai_client = backends.openai_client(
+                rate_limiter=RateLimiter(sleep=lambda seconds: None)
+            )
+            generator = DailyImageGenerator(
+                openai_client, backends.s3_client, db_accessor
+            )
+
+            def generate_day():
+                # A new day every time; a repeated one would resume as a no-op.
+                day = next(days)
+                generator.generate_daily_images(
+                    prompt_types,
+                    datetime(day.year, day.month, day.day),
+                    datetime.now() + timedelta(days=1),
+                )
+                db_accessor.session.remove()
+
+            return [
+                measure("generate_daily_images", generate_day, iterations, warmup=1)
+            ]
+    finally:
+        engine.dispose()
+
+
+def run(
+    only: Optional[str] = None,
+    iterations: int = 200,
+    pipeline_iterations: int = 10,
+    years: Iterable[int] = (1, 10),
+) -> list[Result]:
+    # The app reads its config on import, so it is imported only once
+    # DATABASE_URL points at the benchmark database.
+    with tempfile.TemporaryDirectory() as workdir:
+        database_url = os.getenv(
+            "BENCHMARK_DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'app.db')}"
+        )
+        os.environ["DATABASE_URL"] = database_url
+        os.environ.setdefault("CMC_API_KEY", "benchmark")
+
+        from app import create_app
+        from benchmarks.lookup_indexes import HistorySeeder
+        from extensions import db
+        from server.models.base import Base
+
+        app = create_app()
+        app.config["SQLALCHEMY_DATABASE_URI"] = database_url
+        with app.app_context():
+            Base.metadata.drop_all(db.engine)
+            Base.metadata.create_all(db.engine)
+            # Today's active images and holidays, for the home page too.
+            seeder = HistorySeeder(db.engine)
+            seeder.seed_current()
+
+        cases: list[tuple[str, Callable[[], list[Result]]]] = [
+            ("parse holidays", lambda: bench_parse_holidays(iterations * 10)),
+            ("render", lambda: bench_render(app, iterations)),
+            ("home", lambda: bench_home(app, iterations)),
+            (
+                "current image",
+                lambda: bench_lookups(app, seeder, years, iterations // 4),
+            ),
+            ("generate", lambda: bench_pipeline(workdir, pipeline_iterations)),
+        ]
+        results = []
+        try:
+            for name, case in cases:
+                if only and only not in name:
+                    continue
+                results.extend(case())
+        finally:
+            with app.app_context():
+                db.session.remove()
+                Base.metadata.drop_all(db.engine)
+                db.engine.dispose()
+        return results
+
+
+def compare(
+    results: Iterable[Result],
+    baseline: dict,
+    tolerance: float,
+    min_delta_us: float = 20.0,
+) -> list[str]:
+    """
+    Regressions against the baseline's medians. A case must be both over
+    the tolerance and min_delta_us slower, so microsecond noise in the
+    fast cases doesn't fail the run.
+    """
+    regressions = []
+    for result in results:
+        base = baseline.get("cases", {}).get(result.name)
+        if base is None:
+            continue
+        delta = result.median_us - base["median_us"]
+        if delta > min_delta_us and delta > base["median_us"] * tolerance:
+            regressions.append(
+                f"{result.name}: {result.median_us:,.0f}us vs baseline "
+                f"{base['median_us']:,.0f}us (+{delta / base['median_us']:.0%})"
+            )
+    return regressions
+
+
+def to_json(results: Iterable[Result]) -> dict:
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+        },
+        "cases": {result.name: asdict(result) for result in results},
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--only", help="run the cases whose name contains this")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--pipeline-iterations", type=int, default=10)
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.5,
+        help="fail when a median is this fraction slower than the baseline",
+    )
+    parser.add_argument("--output", help="also write the results JSON here")
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="write the results as the new baseline instead of comparing",
+    )
+    args = parser.parse_args()
+    # The pipeline logs every step; keep the table readable.
+    logging.disable(logging.INFO)
+
+    results = run(args.only, args.iterations, args.pipeline_iterations, args.years)
+
+    baseline: dict = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print(f"{'case':<34} {'median':>10} {'p95':>10} {'baseline':>10}")
+    for result in results:
+        base = baseline.get("cases", {}).get(result.name, {}).get("median_us")
+        print(
+            f"{result.name:<34} {result.median_us:>8,.0f}us {result.p95_us:>8,.0f}us "
+            + (f"{base:>8,.0f}us" if base else f"{'-':>10}")
+        )
+
+    data = to_json(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(data, f, indent=2)
+    if args.save_baseline:
+        if args.only and baseline:
+            # Keep the cases that weren't rerun.
+            data["cases"] = {**baseline.get("cases", {}), **data["cases"]}
+        with open(args.baseline, "w") as f:
+            json.dump(data, f, indent=2)
+            f.write("\n")
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,3 +11,10 @@ class Config:
         uri = uri.replace("postgres://", "postgresql://", 1)
     SQLALCHEMY_DATABASE_URI = uri
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Drop connections the database closed while idle instead of failing
+    # the request that happens to check them out.
+    SQLALCHEMY_ENGINE_OPTIONS = {"pool_pre_ping": True}
+    # Each open /api/stream holds a gthread worker thread, so the page only
+    # uses it when served by the ASGI app (which turns this on) or an evented
+    # worker. Otherwise it polls /api/state.
+    STATE_STREAM_ENABLED = os.getenv("STATE_STREAM_ENABLED", "false").lower() == "true"
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from typing import Literal
 
 from dotenv import load_dotenv
@@ -22,3 +23,149 @@ DEFAULT_IMAGE_URL = "https://static0.gamerantimages.com/wordpress/wp-content/upl
 
 # 1 day + 5 minutes for overlap
 AWS_PRESIGNED_URL_EXPIRATION_SECONDS = 3600 * 24 + 5 * 60
+# Streaming image transfer (OpenAI -> S3). S3 parts must be at least 5 MiB.
+S3_TRANSFER_CHUNK_BYTES = int(os.getenv("S3_TRANSFER_CHUNK_BYTES", str(8 * 1024 * 1024)))
+S3_TRANSFER_MAX_CONCURRENCY = int(os.getenv("S3_TRANSFER_MAX_CONCURRENCY", "4"))
+IMAGE_DOWNLOAD_CONNECT_TIMEOUT_SECONDS = 10
+IMAGE_DOWNLOAD_READ_TIMEOUT_SECONDS = int(
+    os.getenv("IMAGE_DOWNLOAD_READ_TIMEOUT_SECONDS", "60")
+)
+# Daily image generation: prompt types (happy/sad) generated concurrently.
+DAILY_IMAGE_MAX_WORKERS = int(os.getenv("DAILY_IMAGE_MAX_WORKERS", "2"))
+# Batch each prompt type's rows into a couple of transactions instead of a
+# commit per step. The optional status table shows how far a crashed run got.
+DAILY_IMAGE_BATCH_WRITES = (
+    os.getenv("DAILY_IMAGE_BATCH_WRITES", "true").lower() == "true"
+)
+PIPELINE_STEP_STATUS_ENABLED = (
+    os.getenv("PIPELINE_STEP_STATUS_ENABLED", "false").lower() == "true"
+)
+# Trace each run's steps (duration, retries, tokens, bytes) into the
+# pipeline_run table, and append them as OTLP JSON lines to the export file
+# if one is set.
+PIPELINE_TRACING_ENABLED = (
+    os.getenv("PIPELINE_TRACING_ENABLED", "false").lower() == "true"
+)
+PIPELINE_TRACE_EXPORT_PATH = os.getenv("PIPELINE_TRACE_EXPORT_PATH", "")
+# Images are generated per calendar day in this timezone. The worker keeps
+# IMAGE_PREGENERATION_DAYS days (today included) generated ahead and flips
+# to the new day's images at midnight. Opt-in: 0 keeps the single 00:01 run.
+IMAGE_TIMEZONE = os.getenv("IMAGE_TIMEZONE", "America/Los_Angeles")
+IMAGE_PREGENERATION_DAYS = int(os.getenv("IMAGE_PREGENERATION_DAYS", "0"))
+IMAGE_PREGENERATION_INTERVAL_SECONDS = int(
+    os.getenv("IMAGE_PREGENERATION_INTERVAL_SECONDS", "3600")
+)
+# Durable job queue (server/job_queue.py). A claimed job is hidden from other
+# workers for the visibility timeout; failures retry with backoff until
+# JOB_MAX_ATTEMPTS, then stay FAILED as dead letters.
+JOB_QUEUE_ENABLED = os.getenv("JOB_QUEUE_ENABLED", "false").lower() == "true"
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "5"))
+JOB_VISIBILITY_TIMEOUT_SECONDS = int(os.getenv("JOB_VISIBILITY_TIMEOUT_SECONDS", "900"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_BACKOFF_BASE_SECONDS = 30
+JOB_BACKOFF_MAX_SECONDS = 3600
+# OpenAI image URLs expire an hour after generation. A rerun reuses a stored
+# one only if it has at least this long left, otherwise it regenerates.
+OPENAI_IMAGE_URL_TTL_SECONDS = 3600
+OPENAI_IMAGE_URL_MIN_REMAINING_SECONDS = 5 * 60
+# Starting client-side limits per OpenAI model; the x-ratelimit-* response
+# headers replace them with the account's real ones. Retries (429s, 5xx,
+# connection errors) are the client's own, up to OPENAI_MAX_RETRIES.
+OPENAI_CHAT_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_CHAT_REQUESTS_PER_MINUTE", "500"))
+OPENAI_CHAT_TOKENS_PER_MINUTE = int(os.getenv("OPENAI_CHAT_TOKENS_PER_MINUTE", "200000"))
+OPENAI_IMAGE_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_IMAGE_REQUESTS_PER_MINUTE", "5"))
+# Reserved per chat completion on top of the prompt, until usage is known.
+OPENAI_CHAT_COMPLETION_TOKEN_ESTIMATE = 1000
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+OPENAI_BACKOFF_BASE_SECONDS = 1.0
+OPENAI_BACKOFF_MAX_SECONDS = 30.0
+# Identical OpenAI requests are answered from a local SQLite file for the
+# TTL. Image URLs are only cached while they have enough life left to use.
+# Opt-in, for development: production should get fresh content every day.
+OPENAI_CACHE_ENABLED = os.getenv("OPENAI_CACHE_ENABLED", "false").lower() == "true"
+OPENAI_CACHE_PATH = os.getenv(
+    "OPENAI_CACHE_PATH",
+    os.path.join(tempfile.gettempdir(), "btc100klol_openai_cache.sqlite3"),
+)
+OPENAI_CACHE_MAX_BYTES = int(os.getenv("OPENAI_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+OPENAI_CACHE_CHAT_TTL_SECONDS = int(
+    os.getenv("OPENAI_CACHE_CHAT_TTL_SECONDS", str(7 * 24 * 3600))
+)
+OPENAI_CACHE_IMAGE_TTL_SECONDS = (
+    OPENAI_IMAGE_URL_TTL_SECONDS - OPENAI_IMAGE_URL_MIN_REMAINING_SECONDS
+)
+# The worker re-signs active image URLs this often, replacing any that expire
+# within the refresh window, so they're never left to lapse.
+PRESIGNED_URL_ROTATION_INTERVAL_SECONDS = int(
+    os.getenv("PRESIGNED_URL_ROTATION_INTERVAL_SECONDS", "3600")
+)
+PRESIGNED_URL_REFRESH_AHEAD_SECONDS = int(
+    os.getenv("PRESIGNED_URL_REFRESH_AHEAD_SECONDS", str(6 * 3600))
+)
+
+# BTC price cache
+# Quotes younger than the TTL are served as-is. Between TTL and TTL + max stale
+# the cached quote is still served while a single background refresh runs.
+BTC_PRICE_CACHE_TTL_SECONDS = int(os.getenv("BTC_PRICE_CACHE_TTL_SECONDS", "60"))
+BTC_PRICE_CACHE_MAX_STALE_SECONDS = int(
+    os.getenv("BTC_PRICE_CACHE_MAX_STALE_SECONDS", "300")
+)
+# "memory" keeps the quote per process, "sqlite" shares it across workers.
+BTC_PRICE_CACHE_BACKEND: Literal["memory", "sqlite"] = os.getenv(  # type: ignore
+    "BTC_PRICE_CACHE_BACKEND", "memory"
+)
+BTC_PRICE_CACHE_PATH = os.getenv(
+    "BTC_PRICE_CACHE_PATH",
+    os.path.join(tempfile.gettempdir(), "btc100klol_price_cache.sqlite3"),
+)
+
+# BTC price poller
+BTC_PRICE_POLL_INTERVAL_SECONDS = int(os.getenv("BTC_PRICE_POLL_INTERVAL_SECONDS", "60"))
+# home() only trusts a polled quote this recent before falling back to CMC.
+BTC_PRICE_MAX_AGE_SECONDS = int(os.getenv("BTC_PRICE_MAX_AGE_SECONDS", "300"))
+
+# Page state snapshot
+# How often the web process checks whether image/holiday rows have changed.
+PAGE_STATE_RECHECK_SECONDS = int(os.getenv("PAGE_STATE_RECHECK_SECONDS", "30"))
+
+# Rendered page cache
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "32"))
+# Browsers/CDNs may reuse a page this long, then serve it stale while they
+# revalidate for PAGE_CACHE_STALE_SECONDS more.
+PAGE_CACHE_MAX_AGE_SECONDS = int(os.getenv("PAGE_CACHE_MAX_AGE_SECONDS", "60"))
+PAGE_CACHE_STALE_SECONDS = int(os.getenv("PAGE_CACHE_STALE_SECONDS", "240"))
+
+# Live state stream (/api/stream)
+STATE_STREAM_POLL_SECONDS = int(os.getenv("STATE_STREAM_POLL_SECONDS", "5"))
+STATE_STREAM_HEARTBEAT_SECONDS = int(os.getenv("STATE_STREAM_HEARTBEAT_SECONDS", "15"))
+# Streams are closed after this long so they can't pin a worker forever;
+# EventSource reconnects on its own.
+STATE_STREAM_MAX_SECONDS = int(os.getenv("STATE_STREAM_MAX_SECONDS", "600"))
+# Without the stream (gthread workers) the page polls /api/state this often
+# instead, revalidating with its ETag.
+STATE_POLL_SECONDS = int(os.getenv("STATE_POLL_SECONDS", "30"))
+
+# CoinMarketCap client
+# Point at a stub (tests/fakes) to run without the real API.
+CMC_API_URL = os.getenv("CMC_API_URL", "https://pro-api.coinmarketcap.com")
+# Attempts after the first on timeouts, connection errors, 429 and 5xx.
+CMC_MAX_RETRIES = int(os.getenv("CMC_MAX_RETRIES", "2"))
+# Full-jitter exponential backoff between attempts.
+CMC_BACKOFF_BASE_SECONDS = float(os.getenv("CMC_BACKOFF_BASE_SECONDS", "0.5"))
+CMC_BACKOFF_MAX_SECONDS = float(os.getenv("CMC_BACKOFF_MAX_SECONDS", "4"))
+# After this many failed calls in a row CMC isn't called at all for
+# CMC_BREAKER_RESET_SECONDS, then a single probe decides whether to resume.
+CMC_BREAKER_FAILURE_THRESHOLD = int(os.getenv("CMC_BREAKER_FAILURE_THRESHOLD", "5"))
+CMC_BREAKER_RESET_SECONDS = float(os.getenv("CMC_BREAKER_RESET_SECONDS", "30"))
+# While CMC is failing, callers get the last good quote up to this old.
+CMC_LAST_PRICE_MAX_AGE_SECONDS = int(os.getenv("CMC_LAST_PRICE_MAX_AGE_SECONDS", "900"))
+
+# Request timing and Prometheus metrics (/metrics, Server-Timing headers).
+# Off by default; when off nothing is timed or counted.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+# Workers serve no HTTP; set this to expose their /metrics on a port.
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# Scrapers send it as "Authorization: Bearer <token>". The web app only
+# routes /metrics when it's set, so request stats are never public.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
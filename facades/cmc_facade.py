@@ -1,71 +1,454 @@
 import requests  # type: ignore
+from requests.adapters import HTTPAdapter  # type: ignore
+import asyncio
+import httpx
 import os
 import logging
 import json
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 from dotenv import load_dotenv  # change this to pull in API key from Const file
 
+from const import (
+    CMC_API_URL,
+    CMC_BACKOFF_BASE_SECONDS,
+    CMC_BACKOFF_MAX_SECONDS,
+    CMC_BREAKER_FAILURE_THRESHOLD,
+    CMC_BREAKER_RESET_SECONDS,
+    CMC_LAST_PRICE_MAX_AGE_SECONDS,
+    CMC_MAX_RETRIES,
+)
+from server.metrics import metrics
+
 load_dotenv()
 
+CMC_QUOTES_URL = f"{CMC_API_URL.rstrip('/')}/v2/cryptocurrency/quotes/latest"
+CMC_TIMEOUT_SECONDS = 10
+# Fail fast when CMC can't even be reached; the read timeout stays generous.
+CMC_CONNECT_TIMEOUT_SECONDS = 3
+CMC_POOL_SIZE = 10
+# Worth another attempt; anything else 4xx means the request itself is wrong.
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
 
-def get_btc_price():
-    # Fetches current BTC price from CoinMarketCap API
+def get_btc_price(serve_last_known: bool = True) -> float:
+    # Fetches current BTC price from CoinMarketCap API over the pooled session,
+    # retrying transient failures with jittered backoff.
+    # While the circuit breaker is open (or every attempt failed) the last
+    # good quote is returned instead, if serve_last_known and it's recent.
     # Returns: float price in USD
     # Raises: CMCApiError and its subclasses
 
-    url = "https://pro-api.coinmarketcap.com/v2/cryptocurrency/quotes/latest"
+    parameters = {"symbol": "BTC"}
+    headers = _build_headers()
+
+    if not breaker.allow_request():
+        stats.record("short_circuited")
+        return _last_known_or_raise(
+            CMCCircuitOpenError("CMC circuit breaker is open"), serve_last_known
+        )
+
+    error: CMCApiError = CMCConnectionError("Failed to connect to CMC API")
+    for attempt in range(CMC_MAX_RETRIES + 1):
+        if attempt:
+            stats.record("retries")
+            time.sleep(backoff_delay(attempt))
+
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = get_session().get(
+                CMC_QUOTES_URL,
+                params=parameters,
+                headers=headers,
+                timeout=(CMC_CONNECT_TIMEOUT_SECONDS, CMC_TIMEOUT_SECONDS),
+            )
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                logger.warning(f"CMC API returned {response.status_code}")
+                error = CMCConnectionError(f"CMC API returned {response.status_code}")
+                response.close()  # hand the connection back to the pool
+                continue
+            response.raise_for_status()  # Raise an HTTPError for bad responses
+
+            price = _parse_price(response.json())
+            ok = True
+            logger.info(f"Successfully fetched BTC price: ${price}")
+            return _record_success(price)
+
+        except requests.exceptions.Timeout:
+            logger.error("Timeout error occurred while connecting to CMC API")
+            error = CMCConnectionError("Failed to connect to CMC API")
+
+        except requests.exceptions.ConnectionError:
+            logger.error("Failed to connect to CMC API")
+            error = CMCConnectionError("Failed to establish connection to CMC API")
+
+        except json.JSONDecodeError as e:
+            logger.error(f"Invalid JSON response from CMC API: {str(e)}")
+            error = CMCResponseError("Invalid JSON response from API")
+            break
+
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Request to CMC API failed: {str(e)}")
+            error = CMCConnectionError(f"Request failed: {str(e)}")
+            break
+
+        except (KeyError, IndexError, TypeError) as e:
+            logger.error(f"Error parsing CMC API response: {str(e)}")
+            error = CMCResponseError(f"Failed to parse API response: {str(e)}")
+            break
+
+        except CMCResponseError as e:
+            error = e
+            break
+
+        finally:
+            elapsed = time.perf_counter() - started
+            stats.record_latency(elapsed)
+            metrics.observe_upstream("cmc", "quotes", elapsed, ok)
+
+    return _record_failure(error, serve_last_known)
+
+
+# One pooled, keep-alive session per process. Created lazily (and again
+# after a fork) so connections are never shared between workers.
+_session: Optional[requests.Session] = None
+_session_pid: Optional[int] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            session = requests.Session()
+            # Retries are ours (with jitter and the breaker), not urllib3's.
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=CMC_POOL_SIZE, max_retries=0
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session, _session_pid = session, os.getpid()
+        return _session
+
+
+def close_session() -> None:
+    global _session, _session_pid
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session, _session_pid = None, None
+
+
+# One pooled client per process for the async serving mode. Created lazily
+# so it is never inherited across a fork.
+_async_client: httpx.AsyncClient | None = None
+
+
+def get_async_client() -> httpx.AsyncClient:
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                CMC_TIMEOUT_SECONDS, connect=CMC_CONNECT_TIMEOUT_SECONDS
+            ),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    return _async_client
+
+
+async def close_async_client() -> None:
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+async def get_btc_price_async(serve_last_known: bool = True) -> float:
+    # Same as get_btc_price, over the shared httpx.AsyncClient. Shares the
+    # circuit breaker, counters and last known price with the sync path.
+    # Raises: CMCApiError and its subclasses
 
     parameters = {"symbol": "BTC"}
+    headers = _build_headers()
 
-    headers = {
-        "Accepts": "application/json",
-        "X-CMC_PRO_API_KEY": os.getenv("CMC_API_KEY"),
+    if not breaker.allow_request():
+        stats.record("short_circuited")
+        return _last_known_or_raise(
+            CMCCircuitOpenError("CMC circuit breaker is open"), serve_last_known
+        )
+
+    error: CMCApiError = CMCConnectionError("Failed to connect to CMC API")
+    for attempt in range(CMC_MAX_RETRIES + 1):
+        if attempt:
+            stats.record("retries")
+            await asyncio.sleep(backoff_delay(attempt))
+
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = await get_async_client().get(
+                CMC_QUOTES_URL, params=parameters, headers=headers
+            )
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                logger.warning(f"CMC API returned {response.status_code}")
+                error = CMCConnectionError(f"CMC API returned {response.status_code}")
+                continue
+            response.raise_for_status()
+
+            price = _parse_price(response.json())
+            ok = True
+            logger.info(f"Successfully fetched BTC price: ${price}")
+            return _record_success(price)
+
+        except httpx.TimeoutException:
+            logger.error("Timeout error occurred while connecting to CMC API")
+            error = CMCConnectionError("Failed to connect to CMC API")
+
+        except httpx.ConnectError:
+            logger.error("Failed to connect to CMC API")
+            error = CMCConnectionError("Failed to establish connection to CMC API")
+
+        except httpx.HTTPError as e:
+            logger.error(f"Request to CMC API failed: {str(e)}")
+            error = CMCConnectionError(f"Request failed: {str(e)}")
+            break
+
+        except (KeyError, IndexError, TypeError) as e:
+            logger.error(f"Error parsing CMC API response: {str(e)}")
+            error = CMCResponseError(f"Failed to parse API response: {str(e)}")
+            break
+
+        except json.JSONDecodeError as e:
+            logger.error(f"Invalid JSON response from CMC API: {str(e)}")
+            error = CMCResponseError("Invalid JSON response from API")
+            break
+
+        except CMCResponseError as e:
+            error = e
+            break
+
+        finally:
+            elapsed = time.perf_counter() - started
+            stats.record_latency(elapsed)
+            metrics.observe_upstream("cmc", "quotes", elapsed, ok)
+
+    return _record_failure(error, serve_last_known)
+
+
+def backoff_delay(attempt: int) -> float:
+    # Full jitter: spreads retries from many workers instead of syncing them.
+    ceiling = CMC_BACKOFF_BASE_SECONDS * 2 ** (attempt - 1)
+    ceiling = min(CMC_BACKOFF_MAX_SECONDS, ceiling)
+    return random.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """
+    closed: calls go through; CMC_BREAKER_FAILURE_THRESHOLD failed calls in
+    a row open it.
+    open: calls fail fast until reset_seconds have passed.
+    half_open: one probe call is let through; success closes the breaker,
+    failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = CMC_BREAKER_FAILURE_THRESHOLD,
+        reset_seconds: float = CMC_BREAKER_RESET_SECONDS,
+        clock=time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.consecutive_failures = 0
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and self._reset_elapsed():
+                return self.HALF_OPEN
+            return self._state
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and self._reset_elapsed():
+                self._state = self.HALF_OPEN
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("CMC circuit breaker closed")
+            self._state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if (
+                self._state == self.HALF_OPEN
+                or self.consecutive_failures >= self.failure_threshold
+            ):
+                if self._state != self.OPEN:
+                    logger.warning(
+                        f"CMC circuit breaker opened after "
+                        f"{self.consecutive_failures} failure(s)"
+                    )
+                self._state = self.OPEN
+                self._opened_at = self.clock()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def _reset_elapsed(self) -> bool:
+        return self.clock() - self._opened_at >= self.reset_seconds
+
+
+@dataclass
+class CMCStats:
+    successes: int = 0
+    failures: int = 0
+    retries: int = 0
+    short_circuited: int = 0
+    last_known_served: int = 0
+    attempts: int = 0
+    total_latency_seconds: float = 0.0
+    max_latency_seconds: float = 0.0
+    last_latency_seconds: float = 0.0
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+
+    def record(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def record_latency(self, seconds: float) -> None:
+        with self._lock:
+            self.attempts += 1
+            self.total_latency_seconds += seconds
+            self.max_latency_seconds = max(self.max_latency_seconds, seconds)
+            self.last_latency_seconds = seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            data = asdict(self)
+        attempts = data["attempts"]
+        data["mean_latency_seconds"] = (
+            data["total_latency_seconds"] / attempts if attempts else 0.0
+        )
+        return data
+
+    def reset(self) -> None:
+        with self._lock:
+            for name, value in asdict(CMCStats()).items():
+                setattr(self, name, value)
+
+
+breaker = CircuitBreaker()
+stats = CMCStats()
+# (price, time.monotonic() when fetched) of the last successful call
+_last_known_price: Optional[tuple[float, float]] = None
+
+
+def get_cmc_health() -> dict:
+    """Circuit breaker state and call counters, for /health."""
+    last_price_age = None
+    if _last_known_price is not None:
+        last_price_age = time.monotonic() - _last_known_price[1]
+    return {
+        "state": breaker.state,
+        "consecutive_failures": breaker.consecutive_failures,
+        "last_price_age_seconds": last_price_age,
+        **stats.snapshot(),
     }
 
-    if not os.getenv("CMC_API_KEY"):
-        raise CMCApiError("CMC API Key not found in environment variables")
 
-    try:
-        response = requests.get(url, params=parameters, headers=headers, timeout=10)
-        response.raise_for_status()  # Raise an HTTPError for bad responses
+def reset_cmc_state() -> None:
+    # Forget breaker state, counters and the last known price (tests, forks).
+    global _last_known_price
+    breaker.reset()
+    stats.reset()
+    _last_known_price = None
 
-        data = response.json()
 
-        # Validate response structure
-        if "data" not in data or "BTC" not in data["data"]:
-            raise CMCResponseError("Invalid API response structure")
+def _record_success(price: float) -> float:
+    global _last_known_price
+    breaker.record_success()
+    stats.record("successes")
+    _last_known_price = (price, time.monotonic())
+    return price
 
-        if not data["data"]["BTC"]:
-            raise CMCResponseError("No BTC data found in response")
 
-        price = response.json()["data"]["BTC"][0]["quote"]["USD"]["price"]
+def _record_failure(error: "CMCApiError", serve_last_known: bool) -> float:
+    breaker.record_failure()
+    stats.record("failures")
+    return _last_known_or_raise(error, serve_last_known)
 
-        if not isinstance(price, (int, float)):
-            raise CMCResponseError("Invalid price format received")
 
-        logger.info(f"Successfully fetched BTC price: ${price}")
-        return float(price)
+def _last_known_or_raise(error: "CMCApiError", serve_last_known: bool) -> float:
+    last_known = _last_known_price
+    if (
+        serve_last_known
+        and last_known is not None
+        and time.monotonic() - last_known[1] <= CMC_LAST_PRICE_MAX_AGE_SECONDS
+    ):
+        stats.record("last_known_served")
+        logger.warning(f"Serving last known BTC price after CMC failure: {error}")
+        return last_known[0]
+    raise error
 
-    except requests.exceptions.Timeout:
-        logger.error("Timeout error occurred while connecting to CMC API")
-        raise CMCConnectionError("Failed to connect to CMC API")
 
-    except requests.exceptions.ConnectionError:
-        logger.error("Failed to connect to CMC API")
-        raise CMCConnectionError("Failed to establish connection to CMC API")
+def _build_headers() -> dict:
+    headers = {
+        "Accepts": "application/json",
+        "X-CMC_PRO_API_KEY": os.getenv("CMC_API_KEY"),
+    }
 
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Request to CMC API failed: {str(e)}")
-        raise CMCConnectionError(f"Request failed: {str(e)}")
+    if not os.getenv("CMC_API_KEY"):
+        raise CMCApiError("CMC API Key not found in environment variables")
+
+    return headers
+
+
+def _parse_price(data: dict) -> float:
+    # Validate response structure
+    if "data" not in data or "BTC" not in data["data"]:
+        raise CMCResponseError("Invalid API response structure")
+
+    if not data["data"]["BTC"]:
+        raise CMCResponseError("No BTC data found in response")
 
-    except (KeyError, IndexError, TypeError) as e:
-        logger.error(f"Error parsing CMC API response: {str(e)}")
-        raise CMCResponseError(f"Failed to parse API response: {str(e)}")
+    price = data["data"]["BTC"][0]["quote"]["USD"]["price"]
 
-    except json.JSONDecodeError as e:
-        logger.error(f"Invalid JSON response from CMC API: {str(e)}")
-        raise CMCResponseError("Invalid JSON response from API")
+    if not isinstance(price, (int, float)):
+        raise CMCResponseError("Invalid price format received")
+
+    return float(price)
 
 
 class CMCApiError(Exception):
@@ -84,3 +467,9 @@ class CMCResponseError(CMCApiError):
     """Exception for invalid API responses"""
 
     pass
+
+
+class CMCCircuitOpenError(CMCConnectionError):
+    """CMC is being skipped after repeated failures"""
+
+    pass
@@ -0,0 +1,343 @@
+"""
+BTC Price Cache
+
+Sits in front of get_btc_price so page views don't each pay for a
+CoinMarketCap round trip (and don't burn API quota per visitor).
+
+- Quotes younger than the TTL are served straight from the store.
+- Quotes past the TTL but within the stale window are served immediately
+  while one background refresh fetches a new quote.
+- Concurrent misses are coalesced so only one upstream call is in flight
+  per process; the store lease extends that across processes.
+
+The store is pluggable. InMemoryPriceStore is per process, SQLitePriceStore
+is a local file every gunicorn worker on the box can share.
+"""
+
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, Protocol
+
+from const import (
+    BTC_PRICE_CACHE_BACKEND,
+    BTC_PRICE_CACHE_MAX_STALE_SECONDS,
+    BTC_PRICE_CACHE_PATH,
+    BTC_PRICE_CACHE_TTL_SECONDS,
+)
+from facades.cmc_facade import get_btc_price, get_btc_price_async
+from server.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# How long one fetcher may hold the refresh lease before others give up
+# waiting on it. Comfortably above the CMC request timeout.
+DEFAULT_LEASE_SECONDS = 15.0
+
+
+@dataclass(frozen=True)
+class CachedPrice:
+    price: float
+    fetched_at: float
+
+    def age(self, now: float) -> float:
+        return now - self.fetched_at
+
+
+class PriceStore(Protocol):
+    def get(self) -> Optional[CachedPrice]: ...
+
+    def set(self, entry: CachedPrice) -> None: ...
+
+    def try_acquire_lease(self, lease_seconds: float) -> bool: ...
+
+    def release_lease(self) -> None: ...
+
+
+class InMemoryPriceStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entry: Optional[CachedPrice] = None
+        self._lease_until = 0.0
+
+    def get(self) -> Optional[CachedPrice]:
+        return self._entry
+
+    def set(self, entry: CachedPrice) -> None:
+        with self._lock:
+            self._entry = entry
+
+    def try_acquire_lease(self, lease_seconds: float) -> bool:
+        now = time.time()
+        with self._lock:
+            if self._lease_until > now:
+                return False
+            self._lease_until = now + lease_seconds
+            return True
+
+    def release_lease(self) -> None:
+        with self._lock:
+            self._lease_until = 0.0
+
+
+class SQLitePriceStore:
+    """
+    Single-row SQLite table shared by every process pointing at the same file.
+    A connection is opened per call so the store is safe to use across forks.
+    """
+
+    _KEY = "BTC"
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS price_cache ("
+                " key TEXT PRIMARY KEY,"
+                " price REAL,"
+                " fetched_at REAL,"
+                " lease_until REAL NOT NULL DEFAULT 0"
+                ")"
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO price_cache (key) VALUES (?)", (self._KEY,)
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def get(self) -> Optional[CachedPrice]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT price, fetched_at FROM price_cache WHERE key = ?",
+                (self._KEY,),
+            ).fetchone()
+        if not row or row[0] is None:
+            return None
+        return CachedPrice(price=row[0], fetched_at=row[1])
+
+    def set(self, entry: CachedPrice) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE price_cache SET price = ?, fetched_at = ? WHERE key = ?",
+                (entry.price, entry.fetched_at, self._KEY),
+            )
+
+    def try_acquire_lease(self, lease_seconds: float) -> bool:
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE price_cache SET lease_until = ?"
+                " WHERE key = ? AND lease_until <= ?",
+                (now + lease_seconds, self._KEY, now),
+            )
+            return cursor.rowcount == 1
+
+    def release_lease(self) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE price_cache SET lease_until = 0 WHERE key = ?", (self._KEY,)
+            )
+
+
+class _Flight:
+    """One in-progress upstream fetch that callers can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.price: Optional[float] = None
+        self.error: Optional[Exception] = None
+
+
+class PriceCache:
+    def __init__(
+        self,
+        fetch_price: Callable[[], float] = get_btc_price,
+        store: Optional[PriceStore] = None,
+        ttl_seconds: float = BTC_PRICE_CACHE_TTL_SECONDS,
+        max_stale_seconds: float = BTC_PRICE_CACHE_MAX_STALE_SECONDS,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    ):
+        self.fetch_price = fetch_price
+        self.store = store or InMemoryPriceStore()
+        self.ttl_seconds = ttl_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self.lease_seconds = lease_seconds
+
+        self._lock = threading.Lock()
+        self._flight: Optional[_Flight] = None
+        self._async_flight: Optional[asyncio.Task] = None
+
+    def get_price(self) -> float:
+        entry = self.store.get()
+        now = time.time()
+
+        if entry and entry.age(now) < self.ttl_seconds:
+            metrics.record_cache("btc_price", True)
+            return entry.price
+
+        if entry and entry.age(now) < self.ttl_seconds + self.max_stale_seconds:
+            metrics.record_cache("btc_price", True)
+            self._refresh_in_background()
+            return entry.price
+
+        metrics.record_cache("btc_price", False)
+        return self._refresh()
+
+    async def get_price_async(
+        self, fetch_price_async: Callable[[], Awaitable[float]] = get_btc_price_async
+    ) -> float:
+        """
+        get_price for the ASGI app. Concurrent misses on the event loop
+        await one shared fetch task, and the store lease still coalesces
+        fetches across processes. Store calls run in a thread since the
+        SQLite store does file I/O.
+        """
+        entry = await asyncio.to_thread(self.store.get)
+        now = time.time()
+
+        if entry and entry.age(now) < self.ttl_seconds:
+            metrics.record_cache("btc_price", True)
+            return entry.price
+
+        # Tasks belong to the loop that created them; never share one across
+        # loops (e.g. separate asyncio.run calls in one process).
+        loop = asyncio.get_running_loop()
+        flight = self._async_flight
+        if flight is None or flight.done() or flight.get_loop() is not loop:
+            flight = loop.create_task(self._fetch_async(fetch_price_async))
+            # Background refreshes may fail with nobody awaiting them.
+            flight.add_done_callback(lambda task: task.cancelled() or task.exception())
+            self._async_flight = flight
+
+        if entry and entry.age(now) < self.ttl_seconds + self.max_stale_seconds:
+            metrics.record_cache("btc_price", True)
+            return entry.price
+
+        metrics.record_cache("btc_price", False)
+        return await asyncio.shield(flight)
+
+    async def _fetch_async(
+        self, fetch_price_async: Callable[[], Awaitable[float]]
+    ) -> float:
+        has_lease = await asyncio.to_thread(
+            self.store.try_acquire_lease, self.lease_seconds
+        )
+        if not has_lease:
+            # Another process is already fetching. Wait for its quote to land.
+            started = time.time()
+            while time.time() < started + self.lease_seconds:
+                await asyncio.sleep(0.05)
+                entry = await asyncio.to_thread(self.store.get)
+                if entry and entry.fetched_at >= started:
+                    return entry.price
+            logger.warning("Timed out waiting on shared price refresh; fetching")
+
+        try:
+            price = await fetch_price_async()
+            await asyncio.to_thread(
+                self.store.set, CachedPrice(price=price, fetched_at=time.time())
+            )
+            return price
+        except Exception as e:
+            logger.error(f"Failed to refresh cached BTC price: {e}")
+            raise
+        finally:
+            if has_lease:
+                await asyncio.to_thread(self.store.release_lease)
+
+    def _start_flight(self) -> tuple[_Flight, bool]:
+        with self._lock:
+            if self._flight is not None:
+                return self._flight, False
+            self._flight = _Flight()
+            return self._flight, True
+
+    def _refresh(self) -> float:
+        flight, is_leader = self._start_flight()
+        if is_leader:
+            self._run_flight(flight)
+        else:
+            flight.done.wait(self.lease_seconds)
+
+        if flight.error:
+            raise flight.error
+        if flight.price is None:
+            # The leader is still stuck upstream; fall back to our own call.
+            return self.fetch_price()
+        return flight.price
+
+    def _refresh_in_background(self) -> None:
+        flight, is_leader = self._start_flight()
+        if not is_leader:
+            return
+        threading.Thread(
+            target=self._run_flight, args=(flight,), name="price-cache-refresh",
+            daemon=True,
+        ).start()
+
+    def _run_flight(self, flight: _Flight) -> None:
+        try:
+            flight.price = self._fetch_with_lease()
+        except Exception as e:
+            logger.error(f"Failed to refresh cached BTC price: {e}")
+            flight.error = e
+        finally:
+            with self._lock:
+                self._flight = None
+            flight.done.set()
+
+    def _fetch_with_lease(self) -> float:
+        has_lease = self.store.try_acquire_lease(self.lease_seconds)
+        if not has_lease:
+            # Another process is already fetching. Wait for its quote to land.
+            started = time.time()
+            deadline = started + self.lease_seconds
+            while time.time() < deadline:
+                time.sleep(0.05)
+                entry = self.store.get()
+                if entry and entry.fetched_at >= started:
+                    return entry.price
+            logger.warning("Timed out waiting on shared price refresh; fetching")
+
+        try:
+            price = self.fetch_price()
+            self.store.set(CachedPrice(price=price, fetched_at=time.time()))
+            return price
+        finally:
+            # Only the holder may release; otherwise we could clear a lease
+            # another process took after ours timed out.
+            if has_lease:
+                self.store.release_lease()
+
+
+_default_cache: Optional[PriceCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_price_cache() -> PriceCache:
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                store: PriceStore
+                if BTC_PRICE_CACHE_BACKEND == "sqlite":
+                    store = SQLitePriceStore(BTC_PRICE_CACHE_PATH)
+                else:
+                    store = InMemoryPriceStore()
+                _default_cache = PriceCache(store=store)
+    return _default_cache
+
+
+def get_cached_btc_price() -> float:
+    # Drop-in replacement for get_btc_price backed by the shared cache.
+    # Raises: CMCApiError and its subclasses when no usable quote is cached
+    return get_price_cache().get_price()
+
+
+async def get_cached_btc_price_async() -> float:
+    # get_cached_btc_price for the ASGI app, fetching over httpx on a miss.
+    return await get_price_cache().get_price_async()
@@ -0,0 +1,60 @@
+"""
+Gunicorn settings for the web dyno.
+
+    gunicorn -c gunicorn.conf.py "app:create_app()"
+
+home() is I/O bound (a DB read, occasionally CMC), so each worker runs a
+pool of threads rather than handling one request at a time.
+
+A thread is busy for as long as its connection is, so an open /api/stream
+would pin one for up to STATE_STREAM_MAX_SECONDS and workers x threads tabs
+would starve everything else. Under gthread the stream is therefore off
+(STATE_STREAM_ENABLED) and the page polls /api/state with ETags instead; the
+ASGI mode below serves streams as coroutines and turns them back on.
+`python -m benchmarks.load_harness --streams N` shows the difference.
+
+Every setting can be overridden from the environment without a deploy.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# Heroku sets WEB_CONCURRENCY based on dyno size.
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# For the async serving mode (asgi.py) use uvicorn.workers.UvicornWorker;
+# threads are then ignored and concurrency comes from the event loop.
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# Import the app once in the master and fork it, so workers start fast and
+# share read-only memory. create_app() opens no connections, and post_fork
+# below makes sure no pooled connection is ever shared across processes.
+preload_app = True
+
+# Keep connections from the router/CDN open between requests.
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Heroku's router gives up after 30s; don't keep working on a dead request.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "25"))
+
+# Recycle workers now and then to cap slow memory growth.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def post_fork(server, worker):
+    # Drop any pooled DB connections inherited from the master. close=False
+    # leaves the master's sockets alone instead of closing them underneath it.
+    from extensions import db
+
+    app = worker.app.wsgi()
+    # asgi.AsyncApp wraps the Flask app
+    app = getattr(app, "flask_app", app)
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
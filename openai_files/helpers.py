@@ -35,3 +35,32 @@ PROMPTS = {
 
 def get_prompt(prompt_type: PromptType, param: str) -> str:
     return PROMPTS[prompt_type](param)
+
+
+def parse_holiday_list(holiday_text: str) -> list[dict[str, str]]:
+    """
+    Parse a GET_HOLIDAYS completion into [{'name': ..., 'description': ...}].
+    Lines look like "- Holiday Name - Brief Description"; ": " is also
+    accepted as a separator, and lines without one become a bare name.
+    """
+    holidays = []
+    for line in holiday_text.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+
+        # Remove leading bullet points if present
+        if line.startswith("- ") or line.startswith("* "):
+            line = line[2:]
+
+        # Split into name and description
+        if " - " in line:
+            parts = line.split(" - ", 1)
+        elif ": " in line:
+            parts = line.split(": ", 1)
+        else:
+            parts = [line, ""]
+
+        holidays.append({"name": parts[0].strip(), "description": parts[1].strip()})
+
+    return holidays
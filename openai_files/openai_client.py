@@ -1,32 +1,79 @@
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 import logging
-from typing import Optional
+import random
+import time
+from typing import Any, Callable, Optional
 
 from dotenv import load_dotenv
-from openai import OpenAI, OpenAIError
+from openai import (
+    APIConnectionError,
+    InternalServerError,
+    OpenAI,
+    OpenAIError,
+    RateLimitError,
+)
 
 from const import (
-    AWS_PRESIGNED_URL_EXPIRATION_SECONDS,
     DEFAULT_IMAGE_QUALITY,
     DEFAULT_IMAGE_SIZE,
+    OPENAI_BACKOFF_BASE_SECONDS,
+    OPENAI_BACKOFF_MAX_SECONDS,
+    OPENAI_CACHE_CHAT_TTL_SECONDS,
+    OPENAI_CACHE_ENABLED,
+    OPENAI_CACHE_IMAGE_TTL_SECONDS,
+    OPENAI_CHAT_COMPLETION_TOKEN_ESTIMATE,
+    OPENAI_CHAT_REQUESTS_PER_MINUTE,
+    OPENAI_CHAT_TOKENS_PER_MINUTE,
+    OPENAI_IMAGE_REQUESTS_PER_MINUTE,
+    OPENAI_MAX_RETRIES,
 )
 from .helpers import get_prompt, get_system_message
 from .openai_exceptions import OpenAIClientError
+from .rate_limiter import RateLimiter, rate_limiter as shared_rate_limiter
+from .response_cache import ResponseCache, cache_key, get_response_cache
 from .utils import PromptType
 from server.db_accessor import DBAccessor
+from server.metrics import metrics
+from server.pipeline_trace import add_to_span
 
 # from server.models import Prompt, DailyImageVersion
 
 load_dotenv()
 
 
+def backoff_delay(attempt: int) -> float:
+    # Full jitter, as for the CMC retries.
+    ceiling = OPENAI_BACKOFF_BASE_SECONDS * 2 ** (attempt - 1)
+    return random.uniform(0, min(OPENAI_BACKOFF_MAX_SECONDS, ceiling))
+
+
 class OpenAIClient:
-    def __init__(self, chat_model: str = "gpt-4o-mini", image_model: str = "dall-e-3"):
-        self.client = OpenAI()
+    def __init__(
+        self,
+        chat_model: str = "gpt-4o-mini",
+        image_model: str = "dall-e-3",
+        client: Optional[OpenAI] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        max_retries: int = OPENAI_MAX_RETRIES,
+        cache: Optional[ResponseCache] = None,
+        use_cache: bool = OPENAI_CACHE_ENABLED,
+    ):
+        # Retries are ours, not the SDK's: a 429 then holds every caller of
+        # the model in the shared rate limiter, not just this request.
+        self.client = client or OpenAI(max_retries=0)
         self.chat_model = chat_model
         self.image_model = image_model
+        self.rate_limiter = rate_limiter or shared_rate_limiter
+        self.max_retries = max_retries
+        # use_cache=False bypasses the cache for this client entirely; the
+        # fetch methods take the same flag per call.
+        self.cache = (cache or get_response_cache()) if use_cache else None
+        self.rate_limiter.configure(
+            chat_model, OPENAI_CHAT_REQUESTS_PER_MINUTE, OPENAI_CHAT_TOKENS_PER_MINUTE
+        )
+        self.rate_limiter.configure(image_model, OPENAI_IMAGE_REQUESTS_PER_MINUTE)
 
-    def fetch_holiday_list(self, target_date: datetime) -> str:
+    def fetch_holiday_list(self, target_date: datetime, use_cache: bool = True) -> str:
         date_today = target_date.strftime("%B %d, %Y")
         prompt = get_prompt(PromptType.GET_HOLIDAYS, date_today)
         system_message = get_system_message(PromptType.GET_HOLIDAYS)
@@ -34,17 +81,63 @@ class OpenAIClient:
         return self.fetch_chat_completion(
             prompt,
             system_message,
+            use_cache=use_cache,
+        )
+
+    def fetch_chat_completion(
+        self, prompt: str, system_message: str, use_cache: bool = True
+    ) -> str:
+        messages = self.generate_messages(prompt, system_message)
+        return self._cached(
+            cache_key("chat", model=self.chat_model, messages=messages),
+            lambda: self._create_chat_completion(messages),
+            OPENAI_CACHE_CHAT_TTL_SECONDS,
+            use_cache,
+        )
+
+    def fetch_generated_image_url(self, prompt, use_cache: bool = True) -> str:
+        return self._cached(
+            cache_key(
+                "image",
+                model=self.image_model,
+                prompt=prompt,
+                size=DEFAULT_IMAGE_SIZE,
+                quality=DEFAULT_IMAGE_QUALITY,
+            ),
+            lambda: self._generate_image_url(prompt),
+            OPENAI_CACHE_IMAGE_TTL_SECONDS,
+            use_cache,
         )
 
-    def fetch_chat_completion(self, prompt: str, system_message: str) -> str:
+    def _cached(
+        self, key: str, fetch: Callable[[], str], ttl_seconds: float, use_cache: bool
+    ) -> str:
+        if self.cache is None or not use_cache:
+            return fetch()
+        return self.cache.get_or_fetch(key, fetch, ttl_seconds)
+
+    def _create_chat_completion(self, messages: list) -> str:
+        # Roughly four characters a token, plus room for the answer.
+        reserved = (
+            sum(len(message["content"]) for message in messages) // 4
+            + OPENAI_CHAT_COMPLETION_TOKEN_ESTIMATE
+        )
         try:
-            completion = self.client.chat.completions.create(
-                model=self.chat_model,
-                messages=self.generate_messages(
-                    prompt,
-                    system_message,
+            completion = self._rate_limited(
+                self.chat_model,
+                lambda: self.client.chat.completions.with_raw_response.create(
+                    model=self.chat_model, messages=messages
                 ),
+                tokens=reserved,
             )
+            if completion.usage is not None:
+                self.rate_limiter.settle(
+                    self.chat_model, reserved, completion.usage.total_tokens
+                )
+                add_to_span("openai.prompt_tokens", completion.usage.prompt_tokens)
+                add_to_span(
+                    "openai.completion_tokens", completion.usage.completion_tokens
+                )
 
             content = completion.choices[0].message.content
             if not content:
@@ -64,16 +157,20 @@ class OpenAIClient:
                 f"OpenAI API chat completion failed: {str(e)}"
             ) from e
 
-    def fetch_generated_image_url(self, prompt) -> str:
+    def _generate_image_url(self, prompt: str) -> str:
         try:
-            response = self.client.images.generate(
-                model=self.image_model,
-                prompt=prompt,
-                size=DEFAULT_IMAGE_SIZE,
-                quality=DEFAULT_IMAGE_QUALITY,
-                n=1,
+            response = self._rate_limited(
+                self.image_model,
+                lambda: self.client.images.with_raw_response.generate(
+                    model=self.image_model,
+                    prompt=prompt,
+                    size=DEFAULT_IMAGE_SIZE,
+                    quality=DEFAULT_IMAGE_QUALITY,
+                    n=1,
+                ),
             )
 
+            add_to_span("openai.images", len(response.data))
             url = response.data[0].url
             if not url:
                 raise ValueError("OpenAI image URL is blank.")
@@ -94,6 +191,38 @@ class OpenAIClient:
                 f"OpenAI API image generation failed: {str(e)}"
             ) from e
 
+    def _rate_limited(
+        self, model: str, request: Callable[[], Any], tokens: float = 0
+    ) -> Any:
+        """
+        Send a raw-response request once the rate limiter lets it through,
+        retrying 429s, 5xx and connection errors. Returns the parsed body.
+        """
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire(model, tokens)
+            try:
+                with metrics.upstream("openai", model):
+                    raw = request()
+            except RateLimitError as e:
+                if e.code == "insufficient_quota":
+                    raise  # Out of credit: waiting won't help.
+                # Every caller's next acquire() waits out the Retry-After.
+                self.rate_limiter.throttled(model, e.response.headers)
+                if attempt == self.max_retries:
+                    raise
+            except (APIConnectionError, InternalServerError) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = backoff_delay(attempt + 1)
+                logging.warning(f"OpenAI request failed, retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+            else:
+                self.rate_limiter.observe(model, raw.headers)
+                return raw.parse()
+            attempt += 1
+            add_to_span("openai.retries", 1)
+
     def generate_unique_file_name(self, file_name: str, file_type: str = "png") -> str:
         current_utc_epoch_s = int(datetime.now(timezone.utc).timestamp())
         return f"{file_name}-{current_utc_epoch_s}.{file_type}"
@@ -106,42 +235,3 @@ class OpenAIClient:
             {"role": "system", "content": system_message},
             {"role": "user", "content": prompt},
         ]
-
-
-if __name__ == "__main__":
-    # Live tests. Remove when launching.
-    # TODO(john): remove all of this once daily_image_generator tests
-    # succeed.
-    from server.s3_client import S3ClientFactory
-    from server.db_accessor import DBAccessor
-    from server.models import Prompt
-    from server.models.daily_image_version import DailyImageVersion
-    from server.models.image_link import ImageLink
-    from openai_files.utils import PromptType
-    from server.models.utils import TaskStatus
-    from app import create_app
-    from server.daily_image_generator import DailyImageGenerator
-
-    # This is what should happen on the cron task.
-    app = create_app()
-
-    with app.app_context():
-        s3_client = S3ClientFactory()
-        db_accessor = DBAccessor()
-
-        client = OpenAIClient()
-
-        # This returns a list of holidays for the current date.
-        current_date = datetime.now()
-
-        daily_image_generator = DailyImageGenerator(
-            openai_client=client,
-            s3_client=s3_client,
-            db_accessor=db_accessor,
-        )
-
-        daily_image_generator.generate_daily_images(
-            [PromptType.GENERATE_IMAGE_HAPPY, PromptType.GENERATE_IMAGE_SAD],
-            current_date,
-            current_date + timedelta(seconds=int(AWS_PRESIGNED_URL_EXPIRATION_SECONDS)),
-        )
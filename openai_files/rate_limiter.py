@@ -0,0 +1,269 @@
+"""
+OpenAI Rate Limiter
+
+Client-side token buckets, one set per model, shared by every OpenAIClient
+in the process. Callers wait on acquire() before each request, so parallel
+generations and backfills queue here at the allowed rate instead of
+colliding on 429s and sleeping in SDK retries.
+
+- Each model has a requests-per-minute bucket and, for chat models, a
+  tokens-per-minute bucket. acquire() reserves capacity up front and
+  returns how long the caller was held.
+- observe() reads OpenAI's x-ratelimit-* response headers. The buckets
+  adopt the account's real limits and stop at zero remaining until the
+  reset time.
+- A 429's Retry-After blocks the whole model, not just the caller that
+  got it.
+"""
+
+import logging
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Mapping, Optional
+
+from const import OPENAI_CHAT_REQUESTS_PER_MINUTE, OPENAI_CHAT_TOKENS_PER_MINUTE
+
+logger = logging.getLogger(__name__)
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds from OpenAI's reset headers, e.g. "20ms", "1s", "6m0s"."""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def retry_after_seconds(headers: Mapping[str, str]) -> Optional[float]:
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    try:
+        return float(headers.get("retry-after") or "")
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """
+    Holds up to `capacity` tokens, refilled at capacity per `period` seconds.
+    Reservations may drive it negative; later callers then wait their turn.
+    """
+
+    def __init__(
+        self,
+        capacity: float,
+        period: float = 60,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.capacity = float(capacity)
+        self.period = period
+        self.clock = clock
+        self._level = float(capacity)
+        self._updated = clock()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+    def reserve(self, amount: float = 1) -> float:
+        """Take `amount` tokens; returns how many seconds to wait first."""
+        with self._lock:
+            now = self._refill()
+            self._level -= amount
+            wait = -self._level / self.rate if self._level < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def adjust(self, amount: float) -> None:
+        """Give back (positive) or take more (negative) than was reserved."""
+        with self._lock:
+            self._refill()
+            self._level = min(self.capacity, self._level + amount)
+
+    def sync(
+        self,
+        limit: Optional[float],
+        remaining: Optional[float],
+        reset_seconds: Optional[float],
+    ) -> None:
+        """Line the bucket up with what the server says is left."""
+        with self._lock:
+            self._refill()
+            if limit:
+                self.capacity = float(limit)
+            if remaining is not None:
+                self._level = min(self._level, remaining)
+                if remaining <= 0 and reset_seconds:
+                    # Empty: the next token arrives when the server resets.
+                    self._level = 1 - reset_seconds * self.rate
+
+    def block_for(self, seconds: float) -> None:
+        with self._lock:
+            now = self._refill()
+            self._blocked_until = max(self._blocked_until, now + seconds)
+
+    def _refill(self) -> float:
+        now = self.clock()
+        self._level = min(
+            self.capacity, self._level + (now - self._updated) * self.rate
+        )
+        self._updated = now
+        return now
+
+
+@dataclass
+class RateLimitStats:
+    requests: int = 0
+    waits: int = 0
+    throttled: int = 0
+    total_queued_seconds: float = 0.0
+    max_queued_seconds: float = 0.0
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+
+    def record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.requests += 1
+            if seconds > 0:
+                self.waits += 1
+                self.total_queued_seconds += seconds
+                self.max_queued_seconds = max(self.max_queued_seconds, seconds)
+
+    def record_throttled(self) -> None:
+        with self._lock:
+            self.throttled += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            data = asdict(self)
+        requests = data["requests"]
+        data["mean_queued_seconds"] = (
+            data["total_queued_seconds"] / requests if requests else 0.0
+        )
+        return data
+
+
+class ModelLimits:
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: Optional[float],
+        clock: Callable[[], float],
+    ):
+        self.requests = TokenBucket(requests_per_minute, clock=clock)
+        self.tokens = (
+            TokenBucket(tokens_per_minute, clock=clock) if tokens_per_minute else None
+        )
+        self.stats = RateLimitStats()
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.clock = clock
+        self.sleep = sleep
+        self._models: dict[str, ModelLimits] = {}
+        self._lock = threading.Lock()
+
+    def configure(
+        self,
+        model: str,
+        requests_per_minute: float,
+        tokens_per_minute: Optional[float] = None,
+    ) -> None:
+        """Set a model's starting limits, unless it already has some."""
+        with self._lock:
+            if model not in self._models:
+                self._models[model] = ModelLimits(
+                    requests_per_minute, tokens_per_minute, self.clock
+                )
+
+    def acquire(self, model: str, tokens: float = 0) -> float:
+        """Wait until `model` can take a request of `tokens` tokens."""
+        limits = self._limits(model)
+        wait = limits.requests.reserve(1)
+        if limits.tokens is not None and tokens:
+            wait = max(wait, limits.tokens.reserve(tokens))
+        if wait > 0:
+            logger.debug(f"Waiting {wait:.2f}s for the {model} rate limit")
+            self.sleep(wait)
+        limits.stats.record_wait(wait)
+        return wait
+
+    def settle(self, model: str, reserved_tokens: float, used_tokens: float) -> None:
+        """Correct a token reservation once the real usage is known."""
+        limits = self._limits(model)
+        if limits.tokens is not None and reserved_tokens != used_tokens:
+            limits.tokens.adjust(reserved_tokens - used_tokens)
+
+    def observe(self, model: str, headers: Mapping[str, str]) -> None:
+        limits = self._limits(model)
+        limits.requests.sync(
+            _number(headers.get("x-ratelimit-limit-requests")),
+            _number(headers.get("x-ratelimit-remaining-requests")),
+            parse_reset_duration(headers.get("x-ratelimit-reset-requests")),
+        )
+        if limits.tokens is not None:
+            limits.tokens.sync(
+                _number(headers.get("x-ratelimit-limit-tokens")),
+                _number(headers.get("x-ratelimit-remaining-tokens")),
+                parse_reset_duration(headers.get("x-ratelimit-reset-tokens")),
+            )
+
+    def throttled(self, model: str, headers: Mapping[str, str]) -> float:
+        """Record a 429. Returns the Retry-After applied to the model."""
+        limits = self._limits(model)
+        limits.stats.record_throttled()
+        self.observe(model, headers)
+        delay = retry_after_seconds(headers)
+        if delay is None:
+            delay = parse_reset_duration(
+                headers.get("x-ratelimit-reset-requests")
+            ) or 60 / limits.requests.capacity
+        limits.requests.block_for(delay)
+        logger.warning(f"OpenAI rate limited {model}; holding it for {delay:.1f}s")
+        return delay
+
+    def stats(self) -> dict[str, dict]:
+        with self._lock:
+            models = dict(self._models)
+        return {model: limits.stats.snapshot() for model, limits in models.items()}
+
+    def _limits(self, model: str) -> ModelLimits:
+        with self._lock:
+            limits = self._models.get(model)
+            if limits is None:
+                # Not configured: start from the chat defaults and let the
+                # response headers correct them.
+                limits = self._models[model] = ModelLimits(
+                    OPENAI_CHAT_REQUESTS_PER_MINUTE,
+                    OPENAI_CHAT_TOKENS_PER_MINUTE,
+                    self.clock,
+                )
+            return limits
+
+
+def _number(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+# Shared by every client in the process, so all callers queue together.
+rate_limiter = RateLimiter()
@@ -0,0 +1,184 @@
+"""
+OpenAI Response Cache
+
+Content-addressed store for OpenAI results. The key is a hash of exactly
+what was sent: the call kind, model, messages or prompt, size and quality.
+An identical request is answered from the cache instead of paying for a
+fresh call. This covers retries, resumed pipeline runs, manual reruns and
+tests replaying a recorded run offline.
+
+- Entries expire after their TTL. Image URLs die an hour after generation,
+  so they get a short TTL; chat answers a long one.
+- The file is kept under max_bytes by evicting the least recently used
+  entries.
+- The cache is a local SQLite file, shared by every process on the box. A
+  connection is opened per call, so it is safe to use across forks.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Optional
+
+from const import OPENAI_CACHE_MAX_BYTES, OPENAI_CACHE_PATH
+from server.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(kind: str, **request: Any) -> str:
+    """sha256 of the request, canonicalised so key order doesn't matter."""
+    payload = json.dumps({"kind": kind, **request}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+@dataclass
+class ResponseCacheStats:
+    hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    evicted: int = 0
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+
+    def record(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            data = asdict(self)
+        lookups = data["hits"] + data["misses"]
+        data["hit_ratio"] = data["hits"] / lookups if lookups else 0.0
+        return data
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.stats = ResponseCacheStats()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS openai_response_cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " last_used REAL NOT NULL"
+                ")"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_openai_response_cache_last_used"
+                " ON openai_response_cache (last_used)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def get(self, key: str) -> Optional[str]:
+        now = self.clock()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM openai_response_cache WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is not None and row[1] <= now:
+                conn.execute("DELETE FROM openai_response_cache WHERE key = ?", (key,))
+                self.stats.record("expired")
+                row = None
+            if row is None:
+                self.stats.record("misses")
+                metrics.record_cache("openai_response", False)
+                return None
+            conn.execute(
+                "UPDATE openai_response_cache SET last_used = ? WHERE key = ?",
+                (now, key),
+            )
+        self.stats.record("hits")
+        metrics.record_cache("openai_response", True)
+        return row[0]
+
+    def set(self, key: str, value: str, ttl_seconds: float) -> None:
+        now = self.clock()
+        size = len(key) + len(value.encode())
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO openai_response_cache"
+                " (key, value, size, expires_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now + ttl_seconds, now),
+            )
+            self._evict(conn, now)
+
+    def get_or_fetch(
+        self, key: str, fetch: Callable[[], str], ttl_seconds: float
+    ) -> str:
+        # The cache only ever saves a call; a broken cache file mustn't cost one.
+        try:
+            value = self.get(key)
+        except sqlite3.Error as e:
+            logger.warning(f"OpenAI cache read failed: {e}")
+            value = None
+        if value is None:
+            value = fetch()
+            try:
+                self.set(key, value, ttl_seconds)
+            except sqlite3.Error as e:
+                logger.warning(f"OpenAI cache write failed: {e}")
+        return value
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM openai_response_cache")
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        expired = conn.execute(
+            "DELETE FROM openai_response_cache WHERE expires_at <= ?", (now,)
+        ).rowcount
+        total = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM openai_response_cache"
+        ).fetchone()[0]
+        evicted = 0
+        if total > self.max_bytes:
+            # Oldest use first, until what's left fits.
+            rows = conn.execute(
+                "SELECT key, size FROM openai_response_cache ORDER BY last_used"
+            ).fetchall()
+            doomed = []
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                doomed.append((key,))
+                total -= size
+            conn.executemany("DELETE FROM openai_response_cache WHERE key = ?", doomed)
+            evicted = len(doomed)
+        if expired or evicted:
+            self.stats.record("expired", expired)
+            self.stats.record("evicted", evicted)
+            logger.debug(f"OpenAI cache dropped {expired} expired, {evicted} LRU")
+
+
+_default_cache: Optional[ResponseCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = ResponseCache(
+                    OPENAI_CACHE_PATH, max_bytes=OPENAI_CACHE_MAX_BYTES
+                )
+    return _default_cache
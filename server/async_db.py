@@ -0,0 +1,77 @@
+"""
+Async database access for the ASGI serving mode (asgi.py).
+
+Uses SQLAlchemy's async engine against the same DATABASE_URL as the Flask
+app, swapping in an async driver (asyncpg / aiosqlite). The engine is
+created lazily on first use so it is never shared across a fork.
+"""
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.pool import StaticPool
+
+from config import Config
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+_engine: Optional[AsyncEngine] = None
+_session_factory: Optional[async_sessionmaker[AsyncSession]] = None
+
+
+def to_async_url(database_url: str):
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend}")
+    url = url.set(drivername=ASYNC_DRIVERS[backend])
+
+    # asyncpg doesn't understand libpq's sslmode; Heroku URLs carry it.
+    if "sslmode" in url.query:
+        url = url.difference_update_query(["sslmode"])
+    return url
+
+
+def get_async_engine() -> AsyncEngine:
+    global _engine, _session_factory
+    if _engine is None:
+        if not Config.SQLALCHEMY_DATABASE_URI:
+            raise RuntimeError("DATABASE_URL must be set for async database access")
+
+        url = to_async_url(Config.SQLALCHEMY_DATABASE_URI)
+        options: dict = {"pool_pre_ping": True}
+        if url.get_backend_name() == "sqlite" and not url.database:
+            # In-memory SQLite only exists on the one connection.
+            options = {"poolclass": StaticPool}
+        elif "sslmode" in make_url(Config.SQLALCHEMY_DATABASE_URI).query:
+            options["connect_args"] = {"ssl": "require"}
+
+        _engine = create_async_engine(url, **options)
+        _session_factory = async_sessionmaker(_engine, expire_on_commit=False)
+    return _engine
+
+
+@asynccontextmanager
+async def async_session() -> AsyncIterator[AsyncSession]:
+    get_async_engine()
+    assert _session_factory is not None
+    async with _session_factory() as session:
+        yield session
+
+
+async def dispose_async_engine() -> None:
+    global _engine, _session_factory
+    if _engine is not None:
+        await _engine.dispose()
+    _engine = None
+    _session_factory = None
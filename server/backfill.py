@@ -0,0 +1,132 @@
+"""
+Historical Backfill
+
+Generates images for a range of past (or future) dates, several dates at a
+time. It is safe to interrupt and rerun:
+
+- Only dates missing a finished version of some prompt type are picked up
+  (pregeneration.missing_dates), so finished dates are skipped.
+- A date that was cut off part way resumes from its first incomplete
+  step, because that is what DailyImageGenerator does on a rerun.
+
+Dates are started at most one per min_interval_seconds, which keeps a long
+backfill within the OpenAI quota. Progress is logged as dates finish.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def date_range(start: date, end: date) -> list[date]:
+    """Every date from start to end, both included."""
+    return [start + timedelta(days=n) for n in range((end - start).days + 1)]
+
+
+@dataclass
+class BackfillResult:
+    completed: list[date] = field(default_factory=list)
+    failed: list[date] = field(default_factory=list)
+    # Never started because the backfill was stopped; not errors.
+    skipped: list[date] = field(default_factory=list)
+
+
+class Backfill:
+    def __init__(
+        self,
+        generate_day: Callable[[date], None],
+        max_workers: int = 2,
+        min_interval_seconds: float = 0,
+        app=None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.generate_day = generate_day
+        self.max_workers = max_workers
+        self.min_interval_seconds = min_interval_seconds
+        # Each worker thread needs its own app context (and so DB session).
+        self.app = app
+        self.clock = clock
+        self._stop = threading.Event()
+        self._pace_lock = threading.Lock()
+        self._next_start = 0.0
+
+    def run(self, dates: Iterable[date]) -> BackfillResult:
+        dates = sorted(dates)
+        result = BackfillResult()
+        if not dates:
+            logger.info("Backfill: nothing to do")
+            return result
+
+        started = self.clock()
+        self._stop.clear()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = {executor.submit(self._run_day, day): day for day in dates}
+            for future in as_completed(futures):
+                day = futures[future]
+                outcome = future.result()
+                if outcome is None:
+                    result.skipped.append(day)
+                elif outcome:
+                    result.completed.append(day)
+                else:
+                    result.failed.append(day)
+                self._log_progress(result, len(dates), started)
+        except KeyboardInterrupt:
+            # Dates already running finish; the rest are picked up next run.
+            logger.warning("Backfill interrupted, waiting for running dates")
+            self._stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        finally:
+            executor.shutdown(wait=True)
+
+        result.completed.sort()
+        result.failed.sort()
+        result.skipped.sort()
+        return result
+
+    def stop(self) -> None:
+        """Don't start any more dates."""
+        self._stop.set()
+
+    def _run_day(self, day: date) -> Optional[bool]:
+        """True if the date completed, False if it failed, None if skipped."""
+        self._pace()
+        if self._stop.is_set():
+            return None
+        try:
+            if self.app is None:
+                self.generate_day(day)
+            else:
+                with self.app.app_context():
+                    self.generate_day(day)
+        except Exception:
+            logger.error(f"Backfill for {day} failed", exc_info=True)
+            return False
+        return True
+
+    def _pace(self) -> None:
+        if self.min_interval_seconds <= 0:
+            return
+        with self._pace_lock:
+            now = self.clock()
+            start_at = max(now, self._next_start)
+            self._next_start = start_at + self.min_interval_seconds
+        self._stop.wait(start_at - now)
+
+    def _log_progress(self, result: BackfillResult, total: int, started: float):
+        done = len(result.completed) + len(result.failed) + len(result.skipped)
+        elapsed = self.clock() - started
+        remaining = elapsed / done * (total - done)
+        logger.info(
+            f"Backfill {done}/{total} dates ({len(result.failed)} failed, "
+            f"{len(result.skipped)} skipped), {elapsed:.0f}s elapsed, "
+            f"~{remaining:.0f}s left"
+        )
@@ -0,0 +1,75 @@
+"""
+BTC Price Poller
+
+Runs in the worker, fetching a quote from CMC on a fixed interval and writing
+it to bitcoin_prices so the web process never calls CMC inline.
+
+Quotes are buffered and written with a single multi-row insert per flush.
+If a flush fails (e.g. the database is briefly unavailable) the quotes stay
+buffered and go out with the next successful flush.
+"""
+
+import logging
+from datetime import datetime
+from functools import partial
+from typing import Callable
+
+from sqlalchemy import insert
+
+from facades.cmc_facade import get_btc_price
+from server.db_accessor import DBAccessor
+from server.models import BitcoinPrice
+
+logger = logging.getLogger(__name__)
+
+# Oldest quotes are dropped past this so a long DB outage can't grow the
+# buffer without bound. A day of one-minute polls.
+MAX_BUFFERED_QUOTES = 1440
+
+
+class BitcoinPricePoller:
+    def __init__(
+        self,
+        db_accessor: DBAccessor,
+        # Only live quotes: a last-known fallback written with quoted_at=now
+        # would look fresh to home().
+        fetch_price: Callable[[], float] = partial(
+            get_btc_price, serve_last_known=False
+        ),
+        batch_size: int = 100,
+    ):
+        self.db_accessor = db_accessor
+        self.fetch_price = fetch_price
+        self.batch_size = batch_size
+        self._buffer: list[dict] = []
+
+    def poll(self) -> float:
+        price = self.fetch_price()
+        if price <= 0:
+            raise ValueError("Invalid Bitcoin price: must be greater than 0")
+
+        self._buffer.append({"price": price, "quoted_at": datetime.now()})
+        if len(self._buffer) > MAX_BUFFERED_QUOTES:
+            dropped = len(self._buffer) - MAX_BUFFERED_QUOTES
+            logger.warning(f"Dropping {dropped} unsaved BTC quotes")
+            del self._buffer[:dropped]
+
+        self.flush()
+        return price
+
+    def flush(self) -> int:
+        written = 0
+        while self._buffer:
+            batch = self._buffer[: self.batch_size]
+            with self.db_accessor.session_scope() as session:
+                session.execute(insert(BitcoinPrice), batch)
+            del self._buffer[: len(batch)]
+            written += len(batch)
+
+        if written:
+            logger.info(f"Wrote {written} BTC quote(s)")
+        return written
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
@@ -1,73 +1,443 @@
-from datetime import datetime, timedelta
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime, timedelta
+from typing import Any, ContextManager, Iterator, Optional
+from urllib.parse import parse_qs, urlparse
+
+from flask import current_app, has_app_context
 
 from server.s3_client import S3ClientFactory
+from server.presigner import s3_key_from_url
 from server.db_accessor import DBAccessor
-from server.models import Prompt, DailyImageVersion
+from server.models import Prompt, DailyImageVersion, Holiday
+from server.pipeline_status import StepStatusRecorder
+from server.pipeline_trace import PipelineTracer, Span, activate_span, current_span
+from server.unit_of_work import UnitOfWork
 from openai_files.openai_client import OpenAIClient
 from openai_files.utils import PromptType
 from server.models.utils import TaskStatus
 from server.models.image_link import ImageLink
-from openai_files.helpers import get_prompt
-
-from const import AWS_PRESIGNED_URL_EXPIRATION_SECONDS
+from openai_files.helpers import get_prompt, parse_holiday_list
+
+from const import (
+    AWS_PRESIGNED_URL_EXPIRATION_SECONDS,
+    DAILY_IMAGE_BATCH_WRITES,
+    DAILY_IMAGE_MAX_WORKERS,
+    OPENAI_IMAGE_URL_MIN_REMAINING_SECONDS,
+    OPENAI_IMAGE_URL_TTL_SECONDS,
+)
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def _as_date(value: datetime | date) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def openai_image_url_expiry(image_link: ImageLink) -> float:
+    """
+    Epoch seconds at which the stored OpenAI URL stops working. OpenAI's
+    URLs are SAS links carrying their expiry in `se`; failing that, assume
+    the documented hour from when the link was last written.
+    """
+    query = parse_qs(urlparse(image_link.openai_image_url).query)
+    if "se" in query:
+        try:
+            expiry = datetime.fromisoformat(query["se"][0].replace("Z", "+00:00"))
+            return expiry.timestamp()
+        except ValueError:
+            pass
+    return (image_link.last_modified_ts or 0) + OPENAI_IMAGE_URL_TTL_SECONDS
+
+
+def is_openai_image_url_usable(image_link: ImageLink) -> bool:
+    remaining = openai_image_url_expiry(image_link) - time.time()
+    return remaining > OPENAI_IMAGE_URL_MIN_REMAINING_SECONDS
+
+
+class DailyImageGenerationError(Exception):
+    """Some prompt types failed; the others' versions were still saved."""
+
+    def __init__(
+        self,
+        versions: list[DailyImageVersion],
+        errors: dict[PromptType, Exception],
+    ):
+        failed = ", ".join(
+            f"{prompt_type.value}: {error}" for prompt_type, error in errors.items()
+        )
+        super().__init__(f"Daily image generation failed for {failed}")
+        self.versions = versions
+        self.errors = errors
+
+
 class DailyImageGenerator:
     def __init__(
         self,
         openai_client: OpenAIClient,
         s3_client: S3ClientFactory,
         db_accessor: DBAccessor,
+        max_workers: int = DAILY_IMAGE_MAX_WORKERS,
+        batch_writes: bool = DAILY_IMAGE_BATCH_WRITES,
+        step_status: Optional[StepStatusRecorder] = None,
+        tracer: Optional[PipelineTracer] = None,
     ):
         self.openai_client = openai_client
         self.s3_client = s3_client
         self.db_accessor = db_accessor
+        # Prompt types are generated on up to this many threads at once.
+        self.max_workers = max_workers
+        # Batched: each branch writes its rows in two transactions (once the
+        # OpenAI image exists, and at the end) instead of one per step.
+        self.batch_writes = batch_writes
+        self.step_status = step_status
+        self.tracer = tracer
+        self._local = threading.local()
 
     def generate_daily_images(
         self,
         prompt_types: list[PromptType],
         target_date: datetime,
         presigned_url_expiry: datetime,
+        activate: bool = True,
+    ) -> list[DailyImageVersion]:
+        """
+        With activate=False the versions are finished but left inactive, for
+        activate_versions() to switch on when their date comes.
+        """
+        if self.tracer is None:
+            return self._generate_daily_images(
+                prompt_types, target_date, presigned_url_expiry, activate
+            )
+        with self.tracer.run(
+            "generate_daily_images",
+            target_date,
+            prompt_types=",".join(prompt_type.value for prompt_type in prompt_types),
+        ):
+            return self._generate_daily_images(
+                prompt_types, target_date, presigned_url_expiry, activate
+            )
+
+    def _generate_daily_images(
+        self,
+        prompt_types: list[PromptType],
+        target_date: datetime,
+        presigned_url_expiry: datetime,
+        activate: bool,
     ) -> list[DailyImageVersion]:
         logger.info(f"Starting daily image generation for target date: {target_date}")
         
-        # Get holiday list
-        logger.info("Fetching holiday list...")
-        holiday_prompt_record = self._create_holiday_prompt_record(target_date)
-        holiday_list = self._fetch_holiday_list(holiday_prompt_record, target_date)
-        logger.info(f"Holiday list fetched: {len(holiday_list)} chars")
+        # A rerun for the same date picks up each step from the first one
+        # that hasn't completed, reusing what's already recorded.
+        holiday_prompt_record = self._find_completed_prompt(
+            PromptType.GET_HOLIDAYS, target_date
+        )
+        if holiday_prompt_record is not None:
+            logger.info("Reusing holiday list from an earlier run")
+            holiday_list = holiday_prompt_record.prompt_text
+        else:
+            logger.info("Fetching holiday list...")
+            step = self._start_step(target_date, PromptType.GET_HOLIDAYS, "holidays")
+            try:
+                with self._span("holidays"), self._batched():
+                    holiday_prompt_record = self._create_holiday_prompt_record(
+                        target_date
+                    )
+                    holiday_list = self._fetch_holiday_list(
+                        holiday_prompt_record, target_date
+                    )
+            except Exception as e:
+                self._fail_step(target_date, PromptType.GET_HOLIDAYS, step, e)
+                raise
+            self._finish_step(target_date, PromptType.GET_HOLIDAYS)
+            logger.info(f"Holiday list fetched: {len(holiday_list)} chars")
+
+        # Each prompt type is independent after the holiday fetch, so they
+        # run side by side and one failing doesn't lose the others.
+        results = self._run_branches(
+            prompt_types, target_date, presigned_url_expiry, holiday_list, activate
+        )
 
         daily_versions: list[DailyImageVersion] = []
+        errors: dict[PromptType, Exception] = {}
+        for prompt_type, result in zip(prompt_types, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to generate {prompt_type.value}: {result}")
+                errors[prompt_type] = result
+            else:
+                daily_versions.append(result)
+
+        if errors:
+            raise DailyImageGenerationError(daily_versions, errors)
+
+        logger.info("Daily image generation completed successfully")
+        return daily_versions
+
+    def _run_branches(
+        self,
+        prompt_types: list[PromptType],
+        target_date: datetime,
+        presigned_url_expiry: datetime,
+        holiday_list: str,
+        activate: bool,
+    ) -> list[DailyImageVersion | Exception]:
+        def run(prompt_type: PromptType) -> DailyImageVersion | Exception:
+            try:
+                with self._span(
+                    "generate_for_prompt_type", prompt_type=prompt_type.value
+                ):
+                    return self._generate_for_prompt_type(
+                        prompt_type,
+                        target_date,
+                        presigned_url_expiry,
+                        holiday_list,
+                        activate,
+                    )
+            except Exception as e:
+                return e
+
+        if self.max_workers <= 1 or len(prompt_types) <= 1:
+            return [run(prompt_type) for prompt_type in prompt_types]
+
+        # Flask-SQLAlchemy scopes sessions to the app context, so a context
+        # per thread gives every branch its own session.
+        app = current_app._get_current_object() if has_app_context() else None
+        # Likewise the branches' spans belong under the caller's.
+        parent_span: Optional[Span] = current_span()
+
+        def run_in_thread(prompt_type: PromptType) -> DailyImageVersion | Exception:
+            with activate_span(parent_span):
+                if app is None:
+                    return run(prompt_type)
+                with app.app_context():
+                    return run(prompt_type)
+
+        with ThreadPoolExecutor(
+            max_workers=min(self.max_workers, len(prompt_types)),
+            thread_name_prefix="daily-image",
+        ) as executor:
+            results = list(executor.map(run_in_thread, prompt_types))
+
+        # The branch sessions are gone with their threads; hand the caller
+        # versions bound to its own session.
+        with self.db_accessor.session_scope() as session:
+            return [
+                result if isinstance(result, Exception) else session.merge(result)
+                for result in results
+            ]
+
+    def _generate_for_prompt_type(
+        self,
+        prompt_type: PromptType,
+        target_date: datetime,
+        presigned_url_expiry: datetime,
+        holiday_list: str,
+        activate: bool,
+    ) -> DailyImageVersion:
+        logger.info(f"Processing prompt type: {prompt_type.value}")
+        self._start_step(target_date, prompt_type, "image_prompt")
+        try:
+            with self._batched():
+                daily_version = self._run_steps(
+                    prompt_type,
+                    target_date,
+                    presigned_url_expiry,
+                    holiday_list,
+                    activate,
+                )
+        except Exception as e:
+            self._fail_step(target_date, prompt_type, self._local.step, e)
+            raise
+        self._finish_step(target_date, prompt_type)
+        return daily_version
 
-        # Generate image prompts
-        for prompt_type in prompt_types:
-            logger.info(f"Processing prompt type: {prompt_type.value}")
-            image_prompt_record = self._create_image_prompt_record(prompt_type)
-            
+    def _run_steps(
+        self,
+        prompt_type: PromptType,
+        target_date: datetime,
+        presigned_url_expiry: datetime,
+        holiday_list: str,
+        activate: bool,
+    ) -> DailyImageVersion:
+        image_link = None
+        image_prompt_record = self._find_completed_prompt(prompt_type, target_date)
+        if image_prompt_record is not None:
+            logger.info("Reusing image prompt from an earlier run")
+            image_prompt_text = image_prompt_record.prompt_text
+            image_link = self._find_image_link(image_prompt_record)
+        else:
+            image_prompt_record = self._create_image_prompt_record(
+                prompt_type, target_date
+            )
             logger.info("Generating image prompt...")
-            image_prompt_text = self._generate_image_prompt(
-                image_prompt_record, holiday_list
+            with self._span("image_prompt"):
+                image_prompt_text = self._generate_image_prompt(
+                    image_prompt_record, holiday_list
+                )
+
+        # Generate and save image
+        daily_version = None
+        if image_link is None:
+            image_link = self._create_image_link(image_prompt_record)
+        else:
+            daily_version = self._find_daily_version(image_link)
+
+        if image_link.status == TaskStatus.COMPLETED and image_link.s3_image_url:
+            logger.info("Reusing image already saved to S3")
+            file_name = s3_key_from_url(image_link.s3_image_url)
+        else:
+            if self._image_generated(image_link) and is_openai_image_url_usable(
+                image_link
+            ):
+                logger.info("Reusing OpenAI image from an earlier run")
+                openai_url = image_link.openai_image_url
+            else:
+                self._start_step(target_date, prompt_type, "image")
+                logger.info("Generating image via OpenAI...")
+                with self._span("image"):
+                    openai_url = self._generate_image(image_link, image_prompt_text)
+                    # Keep what OpenAI charged for, so a rerun can pick it up.
+                    self._checkpoint()
+            self._start_step(target_date, prompt_type, "s3")
+            with self._span("s3"):
+                file_name = self._save_to_s3(image_link, openai_url, target_date)
+
+        # Create and finalize daily version
+        if daily_version is not None and daily_version.status == TaskStatus.COMPLETED:
+            logger.info(f"Daily version already finalized for {prompt_type.value}")
+            return daily_version
+        if daily_version is None:
+            daily_version = self._create_daily_version(
+                image_link, prompt_type, target_date
             )
+        self._start_step(target_date, prompt_type, "presign")
+        with self._span("presign"):
+            self._finalize_daily_version(
+                daily_version, file_name, presigned_url_expiry, activate
+            )
+        logger.info(f"Daily version finalized for {prompt_type.value}")
+        return daily_version
 
-            # Generate and save image
-            image_link = self._create_image_link(image_prompt_record)
-            
-            logger.info("Generating image via OpenAI...")
-            openai_url = self._generate_image(image_link, image_prompt_text)
-            
-            s3_url = self._save_to_s3(image_link, openai_url, target_date)
-
-            # Create and finalize daily version
-            daily_version = self._create_daily_version(image_link, prompt_type)
-            self._finalize_daily_version(daily_version, s3_url, presigned_url_expiry)
-            daily_versions.append(daily_version)
-            logger.info(f"Daily version finalized for {prompt_type.value}")
+    @contextmanager
+    def _batched(self) -> Iterator[None]:
+        """Collect this thread's writes and commit them when the block ends."""
+        if not self.batch_writes:
+            yield
+            return
+        unit_of_work = UnitOfWork(self.db_accessor)
+        self._local.unit_of_work = unit_of_work
+        try:
+            yield
+        except Exception:
+            self._local.unit_of_work = None
+            # Record the failed step's status, as the per-step writes would
+            # have, without letting a DB error hide the step's own.
+            try:
+                unit_of_work.commit()
+            except Exception as e:
+                logger.error(f"Could not record failed step: {e}")
+            raise
+        finally:
+            self._local.unit_of_work = None
+        unit_of_work.commit()
+
+    def _span(self, name: str, **attributes: Any) -> ContextManager[Any]:
+        if self.tracer is None:
+            return nullcontext()
+        return self.tracer.span(name, **attributes)
+
+    def _checkpoint(self) -> None:
+        unit_of_work = getattr(self._local, "unit_of_work", None)
+        if unit_of_work is not None:
+            unit_of_work.commit()
+
+    @contextmanager
+    def _writes(self) -> Iterator[UnitOfWork]:
+        """One step's writes: part of the current batch, or committed now."""
+        unit_of_work = getattr(self._local, "unit_of_work", None)
+        if unit_of_work is not None:
+            yield unit_of_work
+            return
+        unit_of_work = UnitOfWork(self.db_accessor)
+        yield unit_of_work
+        unit_of_work.commit()
+
+    def _start_step(
+        self, target_date: datetime, prompt_type: PromptType, step: str
+    ) -> str:
+        self._local.step = step
+        if self.step_status is not None:
+            self.step_status.record(
+                target_date, prompt_type, step, TaskStatus.PROCESSING
+            )
+        return step
 
-        logger.info("Daily image generation completed successfully")
-        return daily_versions
+    def _fail_step(
+        self,
+        target_date: datetime,
+        prompt_type: PromptType,
+        step: str,
+        error: Exception,
+    ) -> None:
+        if self.step_status is not None:
+            self.step_status.record(
+                target_date, prompt_type, step, TaskStatus.FAILED, str(error)
+            )
+
+    def _finish_step(self, target_date: datetime, prompt_type: PromptType) -> None:
+        if self.step_status is not None:
+            self.step_status.record(
+                target_date, prompt_type, "done", TaskStatus.COMPLETED
+            )
+
+    @staticmethod
+    def _image_generated(image_link: ImageLink) -> bool:
+        # PROCESSING: OpenAI returned an image that hasn't reached S3 yet.
+        # FAILED with an s3_image_url: the S3 step failed, so generation hadn't.
+        if image_link.status == TaskStatus.PROCESSING:
+            return True
+        return (
+            image_link.status == TaskStatus.FAILED
+            and image_link.s3_image_url is not None
+        )
+
+    def _find_completed_prompt(
+        self, prompt_type: PromptType, target_date: datetime
+    ) -> Optional[Prompt]:
+        with self.db_accessor.session_scope() as session:
+            return (
+                session.query(Prompt)
+                .filter(
+                    Prompt.prompt_type == prompt_type,
+                    Prompt.prompt_date == _as_date(target_date),
+                    Prompt.status == TaskStatus.COMPLETED,
+                )
+                .order_by(Prompt.id.desc())
+                .first()
+            )
+
+    def _find_image_link(self, prompt: Prompt) -> Optional[ImageLink]:
+        with self.db_accessor.session_scope() as session:
+            return (
+                session.query(ImageLink)
+                .filter(ImageLink.prompt_id == prompt.id)
+                .order_by(ImageLink.id.desc())
+                .first()
+            )
+
+    def _find_daily_version(
+        self, image_link: ImageLink
+    ) -> Optional[DailyImageVersion]:
+        with self.db_accessor.session_scope() as session:
+            return (
+                session.query(DailyImageVersion)
+                .filter(DailyImageVersion.image_link_id == image_link.id)
+                .order_by(DailyImageVersion.id.desc())
+                .first()
+            )
 
     def _create_holiday_prompt_record(
         self,
@@ -79,7 +449,7 @@ class DailyImageGenerator:
             prompt_type=PromptType.GET_HOLIDAYS,
             status=TaskStatus.PENDING,
         )
-        with self.db_accessor.session_scope() as session:
+        with self._writes() as session:
             session.add(prompt)
         return prompt
 
@@ -95,24 +465,39 @@ class DailyImageGenerator:
             holiday_list = str(e)
             error = e
 
-        with self.db_accessor.session_scope() as session:
+        with self._writes() as session:
             attached_prompt = session.merge(prompt)
             attached_prompt.prompt_text = holiday_list
             attached_prompt.status = status
+            if error is None:
+                # Parsed once here, so readers get ready-made rows.
+                attached_prompt.holidays = [
+                    Holiday(
+                        holiday_date=target_date,
+                        position=position,
+                        name=holiday["name"],
+                        description=holiday["description"],
+                    )
+                    for position, holiday in enumerate(
+                        parse_holiday_list(holiday_list)
+                    )
+                ]
 
         if error:
             raise error
 
         return holiday_list
 
-    def _create_image_prompt_record(self, prompt_type: PromptType) -> Prompt:
+    def _create_image_prompt_record(
+        self, prompt_type: PromptType, target_date: datetime
+    ) -> Prompt:
         prompt = Prompt(
             prompt_text="",
-            prompt_date=datetime.now(),
+            prompt_date=target_date,
             prompt_type=prompt_type,
             status=TaskStatus.PENDING,
         )
-        with self.db_accessor.session_scope() as session:
+        with self._writes() as session:
             session.add(prompt)
         return prompt
 
@@ -132,7 +517,7 @@ class DailyImageGenerator:
             image_prompt_text = str(e)
             error = e
 
-        with self.db_accessor.session_scope() as session:
+        with self._writes() as session:
             attached_prompt = session.merge(prompt)
             attached_prompt.status = status
             attached_prompt.prompt_text = image_prompt_text
@@ -144,11 +529,11 @@ class DailyImageGenerator:
 
     def _create_image_link(self, prompt: Prompt) -> ImageLink:
         image_link = ImageLink(
-            prompt_id=prompt.id,
+            prompt=prompt,
             openai_image_url="",
             status=TaskStatus.PENDING,
         )
-        with self.db_accessor.session_scope() as session:
+        with self._writes() as session:
             session.add(image_link)
         return image_link
 
@@ -164,7 +549,7 @@ class DailyImageGenerator:
             openai_url = str(e)
             error = e
 
-        with self.db_accessor.session_scope() as session:
+        with self._writes() as session:
             attached_image_link = session.merge(image_link)
             attached_image_link.status = status
             attached_image_link.openai_image_url = openai_url
@@ -191,7 +576,7 @@ class DailyImageGenerator:
             s3_image_url = str(e)
             error = e
 
-        with self.db_accessor.session_scope() as session:
+        with self._writes() as session:
             attached_image_link = session.merge(image_link)
             attached_image_link.status = status
             attached_image_link.s3_image_url = s3_image_url
@@ -202,16 +587,17 @@ class DailyImageGenerator:
         return u_file_name
 
     def _create_daily_version(
-        self, image_link: ImageLink, prompt_type: PromptType
+        self, image_link: ImageLink, prompt_type: PromptType, target_date: datetime
     ) -> DailyImageVersion:
         daily_version = DailyImageVersion(
-            image_link_id=image_link.id,
             image_link=image_link,
             prompt_type=prompt_type,
-            prompt_date=datetime.now(),
+            prompt_date=target_date,
             status=TaskStatus.PENDING,
+            # Switched on by _finalize_daily_version or activate_versions.
+            is_active=False,
         )
-        with self.db_accessor.session_scope() as session:
+        with self._writes() as session:
             session.add(daily_version)
         return daily_version
 
@@ -220,6 +606,7 @@ class DailyImageGenerator:
         version: DailyImageVersion,
         file_name: str,
         presigned_url_expiry: datetime,
+        activate: bool = True,
     ) -> None:
         status = TaskStatus.FAILED
         presigned_url = ""
@@ -235,17 +622,21 @@ class DailyImageGenerator:
             presigned_url = str(e)
             error = e
 
-        with self.db_accessor.session_scope() as session:
+        with self._writes() as session:
             is_success = status is TaskStatus.COMPLETED
             attached_version = session.merge(version)
 
             # Deactivate other versions but only on success
-            if is_success:
-                session.query(DailyImageVersion).filter(
-                    DailyImageVersion.prompt_type == attached_version.prompt_type,
-                    DailyImageVersion.is_active,
-                    DailyImageVersion.id != attached_version.id,
-                ).update({DailyImageVersion.is_active: False})
+            if is_success and activate:
+                session.defer(
+                    lambda s: s.query(DailyImageVersion)
+                    .filter(
+                        DailyImageVersion.prompt_type == attached_version.prompt_type,
+                        DailyImageVersion.is_active,
+                        DailyImageVersion.id != attached_version.id,
+                    )
+                    .update({DailyImageVersion.is_active: False})
+                )
 
             # Update current version
             attached_version.presigned_url = presigned_url
@@ -253,7 +644,7 @@ class DailyImageGenerator:
             attached_version.presigned_url_expiry = (
                 presigned_url_expiry if is_success else None
             )
-            attached_version.is_active = is_success
+            attached_version.is_active = is_success and activate
 
         if error:
             raise error
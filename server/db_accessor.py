@@ -1,5 +1,6 @@
 import os
 from contextlib import contextmanager
+from sqlalchemy import Result
 from sqlalchemy.orm import Query
 from server.models import Base
 
@@ -50,6 +51,9 @@ class DBAccessor:
     def query(self, *args, **kwargs) -> Query:
         return self._db.session.query(*args, **kwargs)
 
+    def execute(self, *args, **kwargs) -> Result:
+        return self._db.session.execute(*args, **kwargs)
+
     def merge(self, instance: Base) -> Base:
         return self._db.session.merge(instance)
 
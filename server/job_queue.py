@@ -0,0 +1,353 @@
+"""
+Durable Job Queue
+
+Jobs live in the `job` table, so they survive restarts and any number of
+worker processes (dynos) can share a queue:
+
+- claim() takes due jobs with SELECT ... FOR UPDATE SKIP LOCKED on Postgres,
+  so concurrent workers never wait on or double-take a row. SQLite (tests)
+  has no row locks; there the conditional UPDATE that marks the job taken
+  is what makes a claim exclusive, and it backs up SKIP LOCKED on Postgres.
+- A claimed job is invisible to other workers until its visibility timeout.
+  If the worker dies, the job becomes claimable again; heartbeat() extends
+  the timeout for long-running work.
+- fail() retries with full-jitter exponential backoff until max_attempts,
+  then leaves the job FAILED: the dead letters, kept for inspection and
+  requeue().
+
+JobWorker runs a pool of threads claiming from a queue and dispatching each
+job to the handler registered for its task name.
+"""
+
+import logging
+import os
+import random
+import socket
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional
+
+from sqlalchemy import and_, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from const import (
+    JOB_BACKOFF_BASE_SECONDS,
+    JOB_BACKOFF_MAX_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_POLL_SECONDS,
+    JOB_VISIBILITY_TIMEOUT_SECONDS,
+    JOB_WORKER_CONCURRENCY,
+)
+from server.db_accessor import DBAccessor
+from server.models import Job
+from server.models.utils import TaskStatus
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE = "default"
+
+
+@dataclass(frozen=True)
+class ClaimedJob:
+    id: int
+    task: str
+    payload: dict
+    attempts: int
+    max_attempts: int
+    worker_id: str
+
+
+def job_backoff_delay(
+    attempt: int,
+    base_seconds: float = JOB_BACKOFF_BASE_SECONDS,
+    max_seconds: float = JOB_BACKOFF_MAX_SECONDS,
+) -> float:
+    # Full jitter, as for the CMC retries.
+    return random.uniform(0, min(max_seconds, base_seconds * 2 ** (attempt - 1)))
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+class JobQueue:
+    def __init__(
+        self,
+        db_accessor: DBAccessor,
+        queue: str = DEFAULT_QUEUE,
+        visibility_timeout_seconds: float = JOB_VISIBILITY_TIMEOUT_SECONDS,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+        backoff: Callable[[int], float] = job_backoff_delay,
+        clock: Callable[[], datetime] = datetime.now,
+    ):
+        self.db_accessor = db_accessor
+        self.queue = queue
+        self.visibility_timeout = timedelta(seconds=visibility_timeout_seconds)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.clock = clock
+
+    def enqueue(
+        self,
+        task: str,
+        payload: Optional[dict] = None,
+        run_at: Optional[datetime] = None,
+        dedupe_key: Optional[str] = None,
+        max_attempts: Optional[int] = None,
+    ) -> Optional[int]:
+        """
+        Add a job and return its id. With a dedupe_key, returns None instead
+        if an unfinished job with that key is already queued or running.
+        """
+        job = Job(
+            queue=self.queue,
+            task=task,
+            payload=payload or {},
+            dedupe_key=dedupe_key,
+            status=TaskStatus.PENDING,
+            attempts=0,
+            max_attempts=max_attempts or self.max_attempts,
+            run_at=run_at or self.clock(),
+        )
+        try:
+            with self.db_accessor.session_scope() as session:
+                session.add(job)
+                session.flush()
+                return job.id
+        except IntegrityError:
+            if dedupe_key is None:
+                raise
+            logger.info(f"Job {dedupe_key} already queued")
+            return None
+
+    def claim(self, worker_id: str, limit: int = 1) -> list[ClaimedJob]:
+        now = self.clock()
+        claimable = and_(
+            Job.queue == self.queue,
+            or_(
+                and_(Job.status == TaskStatus.PENDING, Job.run_at <= now),
+                # Taken by a worker that stopped answering.
+                and_(Job.status == TaskStatus.PROCESSING, Job.locked_until <= now),
+            ),
+        )
+        claimed = []
+        with self.db_accessor.session_scope() as session:
+            jobs = (
+                session.query(Job)
+                .filter(claimable)
+                .order_by(Job.run_at, Job.id)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            for job in jobs:
+                if job.attempts >= job.max_attempts:
+                    # Its last attempt timed out: dead-letter, don't rerun.
+                    job.status = TaskStatus.FAILED
+                    job.last_error = job.last_error or "visibility timeout expired"
+                    job.locked_by = None
+                    continue
+                taken = session.execute(
+                    update(Job)
+                    .where(Job.id == job.id, claimable)
+                    .values(
+                        status=TaskStatus.PROCESSING,
+                        attempts=Job.attempts + 1,
+                        locked_by=worker_id,
+                        locked_until=now + self.visibility_timeout,
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                if taken.rowcount:
+                    claimed.append(
+                        ClaimedJob(
+                            id=job.id,
+                            task=job.task,
+                            payload=dict(job.payload or {}),
+                            attempts=job.attempts + 1,
+                            max_attempts=job.max_attempts,
+                            worker_id=worker_id,
+                        )
+                    )
+        return claimed
+
+    def heartbeat(self, job: ClaimedJob) -> bool:
+        """Push the visibility timeout out again; False if the job was lost."""
+        return self._update_owned(
+            job, locked_until=self.clock() + self.visibility_timeout
+        )
+
+    def complete(self, job: ClaimedJob) -> bool:
+        return self._update_owned(
+            job, status=TaskStatus.COMPLETED, locked_by=None, locked_until=None
+        )
+
+    def fail(self, job: ClaimedJob, error: str) -> bool:
+        if job.attempts >= job.max_attempts:
+            logger.error(f"Job {job.id} ({job.task}) dead-lettered: {error}")
+            return self._update_owned(
+                job,
+                status=TaskStatus.FAILED,
+                last_error=error,
+                locked_by=None,
+                locked_until=None,
+            )
+        delay = self.backoff(job.attempts)
+        logger.warning(
+            f"Job {job.id} ({job.task}) attempt {job.attempts} failed, "
+            f"retrying in {delay:.0f}s: {error}"
+        )
+        return self._update_owned(
+            job,
+            status=TaskStatus.PENDING,
+            last_error=error,
+            run_at=self.clock() + timedelta(seconds=delay),
+            locked_by=None,
+            locked_until=None,
+        )
+
+    def requeue(self, job_id: int) -> bool:
+        """Give a dead letter a fresh set of attempts."""
+        with self.db_accessor.session_scope() as session:
+            result = session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == TaskStatus.FAILED)
+                .values(status=TaskStatus.PENDING, attempts=0, run_at=self.clock())
+                .execution_options(synchronize_session=False)
+            )
+            return bool(result.rowcount)
+
+    def dead_letters(self, limit: int = 100) -> list[Job]:
+        with self.db_accessor.session_scope() as session:
+            return (
+                session.query(Job)
+                .filter(Job.queue == self.queue, Job.status == TaskStatus.FAILED)
+                .order_by(Job.id.desc())
+                .limit(limit)
+                .all()
+            )
+
+    def _update_owned(self, job: ClaimedJob, **values: Any) -> bool:
+        # Only while this worker still holds it: if its visibility timeout
+        # ran out and someone else took the job, their result wins.
+        with self.db_accessor.session_scope() as session:
+            result = session.execute(
+                update(Job)
+                .where(
+                    Job.id == job.id,
+                    Job.status == TaskStatus.PROCESSING,
+                    Job.locked_by == job.worker_id,
+                )
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            updated = bool(result.rowcount)
+        if not updated:
+            logger.warning(f"Job {job.id} was no longer held by {job.worker_id}")
+        return updated
+
+
+Handler = Callable[[dict], Any]
+
+
+class JobWorker:
+    """
+    `concurrency` threads, each claiming one job at a time from the queue
+    and running handlers[job.task](job.payload). Run several of these
+    (one per dyno) to scale out; SKIP LOCKED keeps them from colliding.
+    """
+
+    def __init__(
+        self,
+        job_queue: JobQueue,
+        handlers: dict[str, Handler],
+        concurrency: int = JOB_WORKER_CONCURRENCY,
+        poll_seconds: float = JOB_POLL_SECONDS,
+        app=None,
+    ):
+        self.job_queue = job_queue
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        # Each thread needs its own app context (and so its own DB session).
+        self.app = app
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(
+                target=self._run,
+                args=(self._loop,),
+                name=f"job-worker-{n}",
+                daemon=True,
+            )
+            for n in range(self.concurrency)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def run_forever(self) -> None:
+        self.start()
+        try:
+            while not self._stop.wait(1):
+                pass
+        finally:
+            self.stop()
+
+    def _run(self, target: Callable[..., None], *args: Any) -> None:
+        if self.app is None:
+            target(*args)
+            return
+        with self.app.app_context():
+            target(*args)
+
+    def _loop(self) -> None:
+        worker_id = default_worker_id()
+        while not self._stop.is_set():
+            try:
+                ran = self.run_once(worker_id)
+            except Exception:
+                logger.error("Job worker loop failed", exc_info=True)
+                ran = False
+            if not ran:
+                self._stop.wait(self.poll_seconds)
+
+    def run_once(self, worker_id: Optional[str] = None) -> bool:
+        """Claim and run one job. Returns False if nothing was due."""
+        jobs = self.job_queue.claim(worker_id or default_worker_id(), limit=1)
+        if not jobs:
+            return False
+        job = jobs[0]
+        handler = self.handlers.get(job.task)
+        if handler is None:
+            self.job_queue.fail(job, f"No handler for task {job.task!r}")
+            return True
+        done = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._run, args=(self._heartbeat, job, done), daemon=True
+        )
+        heartbeat.start()
+        try:
+            handler(job.payload)
+        except Exception as e:
+            self.job_queue.fail(job, f"{type(e).__name__}: {e}")
+        else:
+            self.job_queue.complete(job)
+        finally:
+            done.set()
+        return True
+
+    def _heartbeat(self, job: ClaimedJob, done: threading.Event) -> None:
+        # Keep a long handler's job from timing out while it's still alive.
+        interval = self.job_queue.visibility_timeout.total_seconds() / 3
+        while not done.wait(interval):
+            if not self.job_queue.heartbeat(job):
+                return
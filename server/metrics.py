@@ -0,0 +1,461 @@
+"""
+Request Timing and Metrics
+
+Breaks a slow `/` down by where the time went:
+
+- stage timers (page state, price, image, holidays, render) for each request,
+  sent back to the browser as a Server-Timing header,
+- DB queries per request, counted by SQLAlchemy cursor events,
+- upstream latency histograms for CMC, OpenAI and S3,
+- hit ratios for the page, page state, BTC price and OpenAI response caches,
+
+all exposed in the Prometheus text format on /metrics, to scrapers
+presenting METRICS_TOKEN as a bearer token. Server-Timing is left off
+publicly cacheable responses, which a CDN would replay to everyone.
+
+Everything is off unless METRICS_ENABLED: no request hooks or SQLAlchemy
+listeners are installed, /metrics isn't routed, and every call here returns
+after one attribute check.
+
+Counters live in the process. Each gunicorn worker (and each worker dyno,
+via METRICS_PORT) has its own, so scrape them per process.
+"""
+
+import hmac
+import http.server
+import logging
+import threading
+import time
+from contextvars import ContextVar, Token
+from typing import Iterable, Optional
+
+from flask import Flask, Response, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from const import METRICS_ENABLED, METRICS_TOKEN
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+# OpenAI image generations take tens of seconds.
+UPSTREAM_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_QUERY_STARTS = "metrics_query_starts"
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        buckets: Iterable[float],
+        labels: tuple[str, ...] = (),
+    ):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labels = labels
+        # label values -> (per-bucket counts, sum, count)
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(v[0]), v[1], v[2]) for key, v in self._series.items()}
+        for label_values, (counts, total, count) in sorted(series.items()):
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _labels(self.labels + ("le",), label_values + (_number(bound),))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _labels(self.labels + ("le",), label_values + ("+Inf",))
+            lines.append(f"{self.name}_bucket{le} {count}")
+            lines.append(f"{self.name}_sum{labels} {_number(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def values(self) -> dict[tuple, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self.values().items()):
+            lines.append(
+                f"{self.name}{_labels(self.labels, label_values)} {_number(value)}"
+            )
+        return lines
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class RequestTiming:
+    """Where one request's time went, in seconds per stage."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: dict[str, float] = {}
+        self.db_queries = 0
+        self.db_seconds = 0.0
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def server_timing(self, total_seconds: float) -> str:
+        entries = [
+            f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages.items()
+        ]
+        if self.db_queries:
+            entries.append(
+                f'db;dur={self.db_seconds * 1000:.2f};desc="{self.db_queries} queries"'
+            )
+        entries.append(f"total;dur={total_seconds * 1000:.2f}")
+        return ", ".join(entries)
+
+
+class _Stage:
+    __slots__ = ("timing", "name", "histogram", "started")
+
+    def __init__(self, timing: RequestTiming, name: str, histogram: Histogram):
+        self.timing = timing
+        self.name = name
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.started
+        self.timing.add(self.name, seconds)
+        self.histogram.observe(seconds, self.name)
+
+
+class _Upstream:
+    __slots__ = ("metrics", "upstream", "operation", "started")
+
+    def __init__(self, metrics: "Metrics", upstream: str, operation: str):
+        self.metrics = metrics
+        self.upstream = upstream
+        self.operation = operation
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe_upstream(
+            self.upstream,
+            self.operation,
+            time.perf_counter() - self.started,
+            ok=exc_type is None,
+        )
+
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NO_STAGE = _NoStage()
+_current: ContextVar[Optional[RequestTiming]] = ContextVar(
+    "request_timing", default=None
+)
+
+
+class Metrics:
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self.request_seconds = Histogram(
+            "btc100k_request_duration_seconds",
+            "Time to answer a request.",
+            REQUEST_BUCKETS,
+            ("route", "status"),
+        )
+        self.stage_seconds = Histogram(
+            "btc100k_request_stage_seconds",
+            "Time spent in each stage of a request.",
+            STAGE_BUCKETS,
+            ("stage",),
+        )
+        self.request_db_queries = Histogram(
+            "btc100k_request_db_queries",
+            "Database queries run by a request.",
+            QUERY_COUNT_BUCKETS,
+            ("route",),
+        )
+        self.upstream_seconds = Histogram(
+            "btc100k_upstream_request_seconds",
+            "Latency of calls to CMC, OpenAI and S3.",
+            UPSTREAM_BUCKETS,
+            ("upstream", "operation", "outcome"),
+        )
+        self.cache_lookups = Counter(
+            "btc100k_cache_lookups_total",
+            "Cache lookups by cache and result.",
+            ("cache", "result"),
+        )
+
+    def stage(self, name: str):
+        """Time a block as one stage of the current request."""
+        if not self.enabled:
+            return _NO_STAGE
+        timing = _current.get()
+        if timing is None:
+            return _NO_STAGE
+        return _Stage(timing, name, self.stage_seconds)
+
+    def upstream(self, upstream: str, operation: str):
+        """Time a block as one call to an upstream; exceptions count as errors."""
+        if not self.enabled:
+            return _NO_STAGE
+        return _Upstream(self, upstream, operation)
+
+    def observe_upstream(
+        self, upstream: str, operation: str, seconds: float, ok: bool = True
+    ) -> None:
+        if not self.enabled:
+            return
+        self.upstream_seconds.observe(
+            seconds, upstream, operation, "ok" if ok else "error"
+        )
+        timing = _current.get()
+        if timing is not None:
+            timing.add(upstream, seconds)
+
+    def record_cache(self, cache: str, hit: bool) -> None:
+        if not self.enabled:
+            return
+        self.cache_lookups.inc(cache, "hit" if hit else "miss")
+
+    def begin_request(self) -> Optional[Token]:
+        if not self.enabled:
+            return None
+        return _current.set(RequestTiming())
+
+    def finish_response(self, response: Response, route: str) -> None:
+        """Record the request and add its Server-Timing header."""
+        timing = _current.get() if self.enabled else None
+        if timing is None:
+            return
+        total = time.perf_counter() - timing.started
+        # A shared cache would serve this request's timings with every hit.
+        if not response.cache_control.public:
+            response.headers["Server-Timing"] = timing.server_timing(total)
+        self.request_seconds.observe(total, route, str(response.status_code))
+        self.request_db_queries.observe(timing.db_queries, route)
+
+    def end_request(self, token: Optional[Token]) -> None:
+        if token is not None:
+            _current.reset(token)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in (
+            self.request_seconds,
+            self.stage_seconds,
+            self.request_db_queries,
+            self.upstream_seconds,
+            self.cache_lookups,
+        ):
+            lines.extend(metric.render())
+
+        lookups: dict[str, dict[str, float]] = {}
+        for (cache, result), value in self.cache_lookups.values().items():
+            lookups.setdefault(cache, {})[result] = value
+        lines.append(
+            "# HELP btc100k_cache_hit_ratio Share of cache lookups that were hits."
+        )
+        lines.append("# TYPE btc100k_cache_hit_ratio gauge")
+        for cache, results in sorted(lookups.items()):
+            ratio = results.get("hit", 0) / sum(results.values())
+            lines.append(f'btc100k_cache_hit_ratio{{cache="{cache}"}} {_number(ratio)}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        for metric in (
+            self.request_seconds,
+            self.stage_seconds,
+            self.request_db_queries,
+            self.upstream_seconds,
+            self.cache_lookups,
+        ):
+            metric.reset()
+
+
+metrics = Metrics()
+
+
+def is_authorized(authorization: Optional[str], token: str) -> bool:
+    """Whether an Authorization header carries the metrics bearer token."""
+    if not token or not authorization:
+        return False
+    scheme, _, presented = authorization.partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(
+        presented.encode(), token.encode()
+    )
+
+
+def init_app(app: Flask) -> None:
+    """
+    Time every request, if metrics are enabled, and serve /metrics to
+    holders of METRICS_TOKEN. Without a token there is no /metrics route.
+    """
+    if not metrics.enabled:
+        return
+    token = METRICS_TOKEN
+    instrument_engines()
+
+    @app.before_request
+    def begin_request_timing():
+        g.metrics_token = metrics.begin_request()
+
+    @app.after_request
+    def add_server_timing(response: Response) -> Response:
+        rule = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.finish_response(response, rule)
+        return response
+
+    @app.teardown_request
+    def end_request_timing(exc):
+        metrics.end_request(g.pop("metrics_token", None))
+
+    if not token:
+        logger.warning("METRICS_TOKEN is not set; not serving /metrics")
+        return
+
+    @app.route("/metrics")
+    def prometheus_metrics():
+        if not is_authorized(request.headers.get("Authorization"), token):
+            return Response(
+                "Unauthorized", 401, {"WWW-Authenticate": 'Bearer realm="metrics"'}
+            )
+        return Response(metrics.render(), content_type=CONTENT_TYPE)
+
+
+def instrument_engines() -> None:
+    """Count (and time) the queries each request runs, on every engine."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault(_QUERY_STARTS, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timing = _current.get()
+    starts = conn.info.get(_QUERY_STARTS)
+    if timing is None or not starts:
+        return
+    timing.db_queries += 1
+    timing.db_seconds += time.perf_counter() - starts.pop()
+
+
+def start_metrics_server(port: int) -> Optional[http.server.ThreadingHTTPServer]:
+    """
+    Serve /metrics on a daemon thread, for processes without a web app
+    (the scheduler and job workers), behind the same METRICS_TOKEN as the
+    web app. Returns None when metrics are off or there's no token.
+    """
+    if not metrics.enabled or not port:
+        return None
+    if not METRICS_TOKEN:
+        logger.warning("METRICS_TOKEN is not set; not serving metrics")
+        return None
+
+    server = http.server.ThreadingHTTPServer(
+        ("0.0.0.0", port), metrics_handler(METRICS_TOKEN)
+    )
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Serving metrics on port {server.server_port}")
+    return server
+
+
+def metrics_handler(token: str) -> type[http.server.BaseHTTPRequestHandler]:
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            if not is_authorized(self.headers.get("Authorization"), token):
+                self.send_response(401)
+                self.send_header("WWW-Authenticate", 'Bearer realm="metrics"')
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
@@ -0,0 +1,56 @@
+"""add pipeline_step_status table
+
+Revision ID: 5b1e7c9a2f40
+Revises: c4aec01a1d64
+Create Date: 2026-10-18 14:03:51.218734
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+prompt_type_enum = postgresql.ENUM(
+    "GET_HOLIDAYS",
+    "GENERATE_IMAGE_SAD",
+    "GENERATE_IMAGE_HAPPY",
+    name="prompttype",
+    create_type=False,
+)
+
+task_status_enum = postgresql.ENUM(
+    "PENDING", "PROCESSING", "COMPLETED", "FAILED", name="taskstatus", create_type=False
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5b1e7c9a2f40"
+down_revision: Union[str, None] = "c4aec01a1d64"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "pipeline_step_status",
+        sa.Column("prompt_date", sa.Date(), nullable=False),
+        sa.Column("prompt_type", prompt_type_enum, nullable=False),
+        sa.Column("step", sa.Text(), nullable=False),
+        sa.Column("status", task_status_enum, server_default="PENDING", nullable=False),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("created", sa.DateTime(), nullable=False),
+        sa.Column("created_ts", sa.Integer(), nullable=False),
+        sa.Column("last_modified", sa.DateTime(), nullable=False),
+        sa.Column("last_modified_ts", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "prompt_date", "prompt_type", name="uq_pipeline_step_status_date_type"
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("pipeline_step_status")
@@ -0,0 +1,45 @@
+"""add current lookup indexes
+
+Revision ID: 8f2d4a6c1e95
+Revises: 5b1e7c9a2f40
+Create Date: 2026-10-18 15:20:07.904512
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8f2d4a6c1e95"
+down_revision: Union[str, None] = "5b1e7c9a2f40"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Partial: only live versions, one or two rows whatever the history.
+    op.create_index(
+        "ix_daily_image_version_current",
+        "daily_image_version",
+        ["prompt_type", "prompt_date"],
+        unique=False,
+        postgresql_where=sa.text(
+            "is_active = true AND status = 'COMPLETED' AND presigned_url IS NOT NULL"
+        ),
+    )
+    op.create_index(
+        "ix_prompt_type_status_date",
+        "prompt",
+        ["prompt_type", "status", "prompt_date", "id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_prompt_type_status_date", table_name="prompt")
+    op.drop_index(
+        "ix_daily_image_version_current", table_name="daily_image_version"
+    )
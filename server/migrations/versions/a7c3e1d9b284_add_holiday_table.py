@@ -0,0 +1,88 @@
+"""add holiday table
+
+Revision ID: a7c3e1d9b284
+Revises: 8f2d4a6c1e95
+Create Date: 2026-10-18 16:41:22.518309
+
+"""
+
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from openai_files.helpers import parse_holiday_list
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a7c3e1d9b284"
+down_revision: Union[str, None] = "8f2d4a6c1e95"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    holiday = op.create_table(
+        "holiday",
+        sa.Column("prompt_id", sa.Integer(), nullable=False),
+        sa.Column("holiday_date", sa.Date(), nullable=False),
+        sa.Column("position", sa.Integer(), nullable=False),
+        sa.Column("name", sa.Text(), nullable=False),
+        sa.Column("description", sa.Text(), server_default="", nullable=False),
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("created", sa.DateTime(), nullable=False),
+        sa.Column("created_ts", sa.Integer(), nullable=False),
+        sa.Column("last_modified", sa.DateTime(), nullable=False),
+        sa.Column("last_modified_ts", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["prompt_id"], ["prompt.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_holiday_prompt_id_position", "holiday", ["prompt_id", "position"]
+    )
+    op.create_index(op.f("ix_holiday_holiday_date"), "holiday", ["holiday_date"])
+
+    # Backfill: parse every completed GET_HOLIDAYS prompt once, here.
+    bind = op.get_bind()
+    prompts = bind.execute(
+        sa.text(
+            "SELECT id, prompt_date, prompt_text FROM prompt "
+            "WHERE prompt_type = 'GET_HOLIDAYS' AND status = 'COMPLETED' "
+            "ORDER BY id"
+        )
+    ).fetchall()
+    # The base columns' defaults are client-side, so fill them in here.
+    now = datetime.now()
+    timestamps = {
+        "created": now,
+        "created_ts": int(now.timestamp()),
+        "last_modified": now,
+        "last_modified_ts": int(now.timestamp()),
+    }
+    rows = []
+    for prompt_id, prompt_date, prompt_text in prompts:
+        for position, parsed in enumerate(parse_holiday_list(prompt_text or "")):
+            rows.append(
+                {
+                    "prompt_id": prompt_id,
+                    "holiday_date": prompt_date,
+                    "position": position,
+                    "name": parsed["name"],
+                    "description": parsed["description"],
+                    **timestamps,
+                }
+            )
+            if len(rows) >= BACKFILL_BATCH_SIZE:
+                op.bulk_insert(holiday, rows)
+                rows = []
+    if rows:
+        op.bulk_insert(holiday, rows)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_holiday_holiday_date"), table_name="holiday")
+    op.drop_index("ix_holiday_prompt_id_position", table_name="holiday")
+    op.drop_table("holiday")
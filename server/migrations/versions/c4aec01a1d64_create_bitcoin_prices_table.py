@@ -0,0 +1,45 @@
+"""create bitcoin_prices table
+
+Revision ID: c4aec01a1d64
+Revises: 3aab80a54bda
+Create Date: 2026-10-18 09:12:37.402118
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c4aec01a1d64"
+down_revision: Union[str, None] = "3aab80a54bda"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 3d5c42d3a6e7 was generated empty, so the table never got created.
+    op.create_table(
+        "bitcoin_prices",
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("quoted_at", sa.DateTime(), nullable=False),
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("created", sa.DateTime(), nullable=False),
+        sa.Column("created_ts", sa.Integer(), nullable=False),
+        sa.Column("last_modified", sa.DateTime(), nullable=False),
+        sa.Column("last_modified_ts", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_bitcoin_prices_quoted_at",
+        "bitcoin_prices",
+        ["quoted_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_bitcoin_prices_quoted_at", table_name="bitcoin_prices")
+    op.drop_table("bitcoin_prices")
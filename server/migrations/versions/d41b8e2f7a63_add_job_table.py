@@ -0,0 +1,63 @@
+"""add job table
+
+Revision ID: d41b8e2f7a63
+Revises: a7c3e1d9b284
+Create Date: 2026-10-18 18:02:45.771920
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+task_status_enum = postgresql.ENUM(
+    "PENDING", "PROCESSING", "COMPLETED", "FAILED", name="taskstatus", create_type=False
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d41b8e2f7a63"
+down_revision: Union[str, None] = "a7c3e1d9b284"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "job",
+        sa.Column("queue", sa.Text(), nullable=False),
+        sa.Column("task", sa.Text(), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("dedupe_key", sa.Text(), nullable=True),
+        sa.Column("status", task_status_enum, server_default="PENDING", nullable=False),
+        sa.Column("attempts", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("max_attempts", sa.Integer(), nullable=False),
+        sa.Column("run_at", sa.DateTime(), nullable=False),
+        sa.Column("locked_by", sa.Text(), nullable=True),
+        sa.Column("locked_until", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("created", sa.DateTime(), nullable=False),
+        sa.Column("created_ts", sa.Integer(), nullable=False),
+        sa.Column("last_modified", sa.DateTime(), nullable=False),
+        sa.Column("last_modified_ts", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_job_queue_status_run_at", "job", ["queue", "status", "run_at"]
+    )
+    op.create_index(
+        "uq_job_dedupe_key_unfinished",
+        "job",
+        ["dedupe_key"],
+        unique=True,
+        postgresql_where=sa.text("status IN ('PENDING', 'PROCESSING')"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("uq_job_dedupe_key_unfinished", table_name="job")
+    op.drop_index("ix_job_queue_status_run_at", table_name="job")
+    op.drop_table("job")
@@ -0,0 +1,62 @@
+"""add pipeline run table
+
+Revision ID: e6f0b3c8a915
+Revises: d41b8e2f7a63
+Create Date: 2026-10-18 16:30:12.418305
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+task_status_enum = postgresql.ENUM(
+    "PENDING", "PROCESSING", "COMPLETED", "FAILED", name="taskstatus", create_type=False
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e6f0b3c8a915"
+down_revision: Union[str, None] = "d41b8e2f7a63"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "pipeline_run",
+        sa.Column("trace_id", sa.Text(), nullable=False),
+        sa.Column("prompt_date", sa.Date(), nullable=False),
+        sa.Column("status", task_status_enum, nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=False),
+        sa.Column("duration_seconds", sa.Float(), nullable=False),
+        sa.Column("openai_retries", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("prompt_tokens", sa.Integer(), server_default="0", nullable=False),
+        sa.Column(
+            "completion_tokens", sa.Integer(), server_default="0", nullable=False
+        ),
+        sa.Column(
+            "images_generated", sa.Integer(), server_default="0", nullable=False
+        ),
+        sa.Column("image_bytes", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("s3_seconds", sa.Float(), server_default="0", nullable=False),
+        sa.Column("spans", sa.JSON(), nullable=False),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("created", sa.DateTime(), nullable=False),
+        sa.Column("created_ts", sa.Integer(), nullable=False),
+        sa.Column("last_modified", sa.DateTime(), nullable=False),
+        sa.Column("last_modified_ts", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("trace_id"),
+    )
+    op.create_index(
+        "ix_pipeline_run_prompt_date", "pipeline_run", ["prompt_date"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_pipeline_run_prompt_date", table_name="pipeline_run")
+    op.drop_table("pipeline_run")
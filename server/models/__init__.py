@@ -2,3 +2,8 @@ from .prompt import Prompt
 from .image_link import ImageLink
 from .base import Base
 from .daily_image_version import DailyImageVersion
+from .bitcoin_price import BitcoinPrice
+from .holiday import Holiday
+from .pipeline_step_status import PipelineStepStatus
+from .job import Job
+from .pipeline_run import PipelineRun
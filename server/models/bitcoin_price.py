@@ -1,9 +1,13 @@
-from sqlalchemy import Float, Column
+from sqlalchemy import Column, DateTime, Float, Index
 
 from .base import Base
 
 
 class BitcoinPrice(Base):
-  __tablename__ = 'bitcoin_prices'
-  
-  price = Column(Float, nullable=False)
+    __tablename__ = "bitcoin_prices"
+    __table_args__ = (Index("ix_bitcoin_prices_quoted_at", "quoted_at"),)
+
+    price = Column(Float, nullable=False)
+    # When the quote was fetched from CMC. Rows may be written in batches,
+    # so this (not `created`) is what orders quotes.
+    quoted_at = Column(DateTime, nullable=False)
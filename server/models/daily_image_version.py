@@ -7,8 +7,10 @@ from sqlalchemy import (
     Date,
     Enum,
     ForeignKey,
+    Index,
     Integer,
     Text,
+    text,
 )
 from sqlalchemy.orm import relationship
 
@@ -16,9 +18,22 @@ from .base import Base
 from .utils import TaskStatus
 from openai_files.utils import PromptType
 
+_CURRENT_VERSION = "status = 'COMPLETED' AND presigned_url IS NOT NULL"
+
 
 class DailyImageVersion(Base):
     __tablename__ = "daily_image_version"
+    __table_args__ = (
+        # The current image lookup (page_state.active_version_query). Only the
+        # live versions are indexed, so it stays tiny as history piles up.
+        Index(
+            "ix_daily_image_version_current",
+            "prompt_type",
+            "prompt_date",
+            postgresql_where=text(f"is_active = true AND {_CURRENT_VERSION}"),
+            sqlite_where=text(f"is_active = 1 AND {_CURRENT_VERSION}"),
+        ),
+    )
 
     image_link_id = Column(
         Integer,
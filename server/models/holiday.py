@@ -0,0 +1,40 @@
+# mypy: ignore-errors
+
+from sqlalchemy import (
+    Column,
+    Date,
+    ForeignKey,
+    Index,
+    Integer,
+    Text,
+)
+from sqlalchemy.orm import relationship
+
+from .base import Base
+
+
+class Holiday(Base):
+    """One parsed line of a GET_HOLIDAYS prompt, in the order OpenAI listed it."""
+
+    __tablename__ = "holiday"
+    __table_args__ = (Index("ix_holiday_prompt_id_position", "prompt_id", "position"),)
+
+    prompt = relationship("Prompt", back_populates="holidays")
+    prompt_id = Column(
+        Integer,
+        ForeignKey("prompt.id"),
+        nullable=False,
+    )
+
+    holiday_date = Column(Date, nullable=False, index=True)
+    position = Column(Integer, nullable=False)
+    name = Column(Text, nullable=False)
+    description = Column(
+        Text,
+        nullable=False,
+        default="",
+        server_default="",
+    )
+
+    def to_dict(self) -> dict[str, str]:
+        return {"name": self.name, "description": self.description}
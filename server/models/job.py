@@ -0,0 +1,58 @@
+# mypy: ignore-errors
+
+from sqlalchemy import (
+    JSON,
+    Column,
+    DateTime,
+    Enum,
+    Index,
+    Integer,
+    Text,
+    text,
+)
+
+from .base import Base
+from .utils import TaskStatus
+
+_UNFINISHED = "status IN ('PENDING', 'PROCESSING')"
+
+
+class Job(Base):
+    """
+    A durable job queue entry (see server/job_queue.py). PENDING jobs run
+    once run_at passes; PROCESSING ones belong to locked_by until
+    locked_until, after which another worker may take them; FAILED ones
+    have used up max_attempts and are the dead letters.
+    """
+
+    __tablename__ = "job"
+    __table_args__ = (
+        # What claim() scans: due jobs of a queue, oldest first.
+        Index("ix_job_queue_status_run_at", "queue", "status", "run_at"),
+        # At most one unfinished job per dedupe key.
+        Index(
+            "uq_job_dedupe_key_unfinished",
+            "dedupe_key",
+            unique=True,
+            postgresql_where=text(_UNFINISHED),
+            sqlite_where=text(_UNFINISHED),
+        ),
+    )
+
+    queue = Column(Text, nullable=False)
+    task = Column(Text, nullable=False)
+    payload = Column(JSON, nullable=False, default=dict)
+    dedupe_key = Column(Text, nullable=True)
+
+    status = Column(
+        Enum(TaskStatus),
+        nullable=False,
+        default=TaskStatus.PENDING,
+        server_default=TaskStatus.PENDING.name,
+    )
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    max_attempts = Column(Integer, nullable=False)
+    run_at = Column(DateTime, nullable=False)
+    locked_by = Column(Text, nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
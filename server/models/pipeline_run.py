@@ -0,0 +1,41 @@
+# mypy: ignore-errors
+
+from sqlalchemy import (
+    JSON,
+    Column,
+    Date,
+    DateTime,
+    Enum,
+    Float,
+    Integer,
+    Text,
+)
+
+from .base import Base
+from .utils import TaskStatus
+
+
+class PipelineRun(Base):
+    """
+    One daily image pipeline run (see server/pipeline_trace.py): its trace
+    id, totals for what it cost, and each step's span (name, duration,
+    attributes) in `spans`.
+    """
+
+    __tablename__ = "pipeline_run"
+
+    trace_id = Column(Text, nullable=False, unique=True)
+    prompt_date = Column(Date, nullable=False, index=True)
+    status = Column(Enum(TaskStatus), nullable=False)
+    started_at = Column(DateTime, nullable=False)
+    duration_seconds = Column(Float, nullable=False)
+
+    openai_retries = Column(Integer, nullable=False, default=0, server_default="0")
+    prompt_tokens = Column(Integer, nullable=False, default=0, server_default="0")
+    completion_tokens = Column(Integer, nullable=False, default=0, server_default="0")
+    images_generated = Column(Integer, nullable=False, default=0, server_default="0")
+    image_bytes = Column(Integer, nullable=False, default=0, server_default="0")
+    s3_seconds = Column(Float, nullable=False, default=0.0, server_default="0")
+
+    spans = Column(JSON, nullable=False, default=list)
+    error = Column(Text, nullable=True)
@@ -0,0 +1,43 @@
+# mypy: ignore-errors
+
+from sqlalchemy import (
+    Column,
+    Date,
+    Enum,
+    Text,
+    UniqueConstraint,
+)
+
+from .base import Base
+from .utils import TaskStatus
+from openai_files.utils import PromptType
+
+
+class PipelineStepStatus(Base):
+    """
+    Where the daily image pipeline is for a date and prompt type: one small
+    row, overwritten as the run moves from step to step. Batched runs only
+    write their real rows at checkpoints, so this is what shows how far a
+    crashed run got.
+    """
+
+    __tablename__ = "pipeline_step_status"
+    __table_args__ = (
+        UniqueConstraint(
+            "prompt_date", "prompt_type", name="uq_pipeline_step_status_date_type"
+        ),
+    )
+
+    prompt_date = Column(Date, nullable=False)
+    prompt_type = Column(Enum(PromptType), nullable=False)
+    step = Column(Text, nullable=False)
+    status = Column(
+        Enum(TaskStatus),
+        nullable=False,
+        default=TaskStatus.PENDING,
+        server_default=TaskStatus.PENDING.name,
+    )
+    error = Column(
+        Text,
+        nullable=True,
+    )
@@ -4,6 +4,7 @@ from sqlalchemy import (
     Column,
     Date,
     Enum,
+    Index,
     Text,
 )
 from sqlalchemy.orm import relationship
@@ -15,12 +16,28 @@ from .utils import TaskStatus
 
 class Prompt(Base):
     __tablename__ = "prompt"
+    __table_args__ = (
+        # Latest completed prompt of a type (page_state.latest_holidays_query)
+        # and the daily generator's same-date lookups.
+        Index(
+            "ix_prompt_type_status_date",
+            "prompt_type",
+            "status",
+            "prompt_date",
+            "id",
+        ),
+    )
 
     image = relationship(
         "ImageLink",
         back_populates="prompt",
         uselist=False,
     )
+    holidays = relationship(
+        "Holiday",
+        back_populates="prompt",
+        order_by="Holiday.position",
+    )
 
     prompt_text = Column(
         Text,
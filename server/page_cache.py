@@ -0,0 +1,110 @@
+"""
+Rendered Page Cache
+
+home() output only depends on its template context (price, active image,
+holidays, ...), so each distinct context is rendered once and the HTML
+reused until the context changes.
+
+Responses carry a strong ETag (hash of the body) and Last-Modified (when the
+variant became current), so conditional GETs from the 5 minute auto-reload
+are answered with a 304 and no body.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from flask import Response, make_response, render_template, request
+
+from const import (
+    PAGE_CACHE_MAX_AGE_SECONDS,
+    PAGE_CACHE_MAX_ENTRIES,
+    PAGE_CACHE_STALE_SECONDS,
+)
+from server.metrics import metrics
+
+
+@dataclass(frozen=True)
+class RenderedPage:
+    body: bytes
+    etag: str
+    last_modified: datetime
+
+
+class RenderedPageCache:
+    def __init__(self, max_entries: int = PAGE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._pages: OrderedDict[str, RenderedPage] = OrderedDict()
+        self._current_key: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(template_name: str, context: dict[str, Any]) -> str:
+        return json.dumps([template_name, context], sort_keys=True, default=str)
+
+    def get_or_render(self, template_name: str, **context: Any) -> RenderedPage:
+        key = self.make_key(template_name, context)
+
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+        metrics.record_cache("page", page is not None)
+
+        if page is None:
+            body = render_template(template_name, **context).encode("utf-8")
+            page = RenderedPage(
+                body=body,
+                etag=hashlib.sha256(body).hexdigest(),
+                last_modified=_now(),
+            )
+
+        with self._lock:
+            if key != self._current_key and self._current_key is not None:
+                # The page changed (possibly back to an older variant), so it
+                # has been modified as of now as far as clients are concerned.
+                page = RenderedPage(page.body, page.etag, _now())
+            self._current_key = key
+            self._pages[key] = page
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+
+        return page
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pages.clear()
+            self._current_key = None
+
+
+def _now() -> datetime:
+    # HTTP dates have second resolution; keep comparisons exact.
+    return datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def render_cached_page(
+    cache: RenderedPageCache, template_name: str, cacheable: bool = True, **context
+) -> Response:
+    """
+    Render (or reuse) the page for this context and answer conditional
+    requests with a 304. Non-cacheable pages (errors) still get an ETag but
+    must be revalidated every time.
+    """
+    page = cache.get_or_render(template_name, **context)
+
+    response = make_response(page.body)
+    response.set_etag(page.etag)
+    response.last_modified = page.last_modified
+    if cacheable:
+        response.cache_control.public = True
+        response.cache_control.max_age = PAGE_CACHE_MAX_AGE_SECONDS
+        response.cache_control.stale_while_revalidate = PAGE_CACHE_STALE_SECONDS
+    else:
+        response.cache_control.no_cache = True
+
+    return response.make_conditional(request)
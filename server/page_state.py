@@ -0,0 +1,308 @@
+"""
+Current Page State Snapshot
+
+Holds everything home() needs from the database (the latest polled BTC
+price, the active presigned URL per image type and the holiday rows)
+so steady-state requests do no SQL at all.
+
+The snapshot is trusted until the earlier of:
+- the recheck deadline, when one cheap query picks up the latest polled
+  price and fingerprints the image/holiday rows to decide whether a rebuild
+  is needed, or
+- the earliest presigned URL expiry, when a rebuild is forced.
+
+Only one thread rebuilds at a time; others keep serving the previous
+snapshot in the meantime.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta
+from typing import Optional, Sequence
+
+from sqlalchemy import Select, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from const import PAGE_STATE_RECHECK_SECONDS
+from openai_files.helpers import parse_holiday_list
+from openai_files.utils import PromptType
+from server.db_accessor import DBAccessor
+from server.metrics import metrics
+from server.models import BitcoinPrice, DailyImageVersion, Holiday, Prompt
+from server.models.utils import TaskStatus
+
+logger = logging.getLogger(__name__)
+
+IMAGE_PROMPT_TYPES = (PromptType.GENERATE_IMAGE_HAPPY, PromptType.GENERATE_IMAGE_SAD)
+
+# After a failed rebuild, wait this long before hitting the DB again.
+REBUILD_ERROR_BACKOFF_SECONDS = 5.0
+
+
+@dataclass(frozen=True)
+class PageState:
+    image_urls: dict[PromptType, str] = field(default_factory=dict)
+    # Earliest presigned_url_expiry among image_urls.
+    expires_at: Optional[datetime] = None
+    holidays: tuple[dict[str, str], ...] = ()
+    fingerprint: tuple = ()
+    built_at: datetime = field(default_factory=datetime.now)
+    # Newest row written by the worker's price poller.
+    btc_price: Optional[float] = None
+    btc_price_quoted_at: Optional[datetime] = None
+
+    def image_url(self, prompt_type: PromptType) -> Optional[str]:
+        return self.image_urls.get(prompt_type)
+
+    def latest_btc_price(self, max_age_seconds: float) -> Optional[float]:
+        """The polled price, or None if the poller hasn't written recently."""
+        if self.btc_price is None or self.btc_price_quoted_at is None:
+            return None
+        if self.btc_price_quoted_at <= datetime.now() - timedelta(seconds=max_age_seconds):
+            return None
+        return self.btc_price
+
+
+class PageStateCache:
+    def __init__(self, recheck_seconds: float = PAGE_STATE_RECHECK_SECONDS):
+        self.recheck_seconds = recheck_seconds
+        self._state: Optional[PageState] = None
+        self._recheck_at = 0.0  # time.monotonic()
+        self._lock = threading.Lock()
+        self._refreshing_async = False
+
+    def get(self) -> PageState:
+        state = self._state
+        if state is not None and not self._is_due(state):
+            metrics.record_cache("page_state", True)
+            return state
+
+        if state is not None and not self._lock.acquire(blocking=False):
+            # Someone else is refreshing; the current snapshot is good enough.
+            metrics.record_cache("page_state", True)
+            return state
+        if state is None:
+            self._lock.acquire()
+
+        try:
+            state = self._state
+            due = state is None or self._is_due(state)
+            metrics.record_cache("page_state", not due)
+            if due:
+                state = self._refresh(state)
+            return state
+        finally:
+            self._lock.release()
+
+    def invalidate(self) -> None:
+        self._recheck_at = 0.0
+        self._state = None
+
+    def _is_due(self, state: PageState) -> bool:
+        if time.monotonic() >= self._recheck_at:
+            return True
+        return state.expires_at is not None and datetime.now() >= state.expires_at
+
+    def _refresh(self, state: Optional[PageState]) -> PageState:
+        db_accessor = DBAccessor()
+        try:
+            row = tuple(db_accessor.execute(recheck_query(datetime.now())).one())
+            fingerprint, price = row[:-2], row[-2:]
+            if self._needs_rebuild(state, fingerprint):
+                now = datetime.now()
+                versions = [
+                    db_accessor.execute(active_version_query(prompt_type, now))
+                    .scalars()
+                    .first()
+                    for prompt_type in IMAGE_PROMPT_TYPES
+                ]
+                holiday_prompt = (
+                    db_accessor.execute(latest_holidays_query()).scalars().first()
+                )
+                holiday_rows = (
+                    db_accessor.execute(holiday_rows_query(holiday_prompt))
+                    .scalars()
+                    .all()
+                    if holiday_prompt is not None
+                    else []
+                )
+                state = build_page_state(
+                    versions, holiday_prompt, fingerprint, holiday_rows
+                )
+                logger.info("Rebuilt page state snapshot")
+            state = with_btc_price(state, *price)
+            self._recheck_at = time.monotonic() + self.recheck_seconds
+        except Exception as e:
+            logger.error(f"Error refreshing page state: {e}")
+            db_accessor.rollback()
+            state = self._after_error(state)
+
+        self._state = state
+        return state
+
+    async def get_async(self, session: AsyncSession) -> PageState:
+        """
+        get() for the ASGI app, reading through an async session. Concurrent
+        callers on the event loop share the previous snapshot while one
+        coroutine refreshes.
+        """
+        state = self._state
+        if state is not None and (not self._is_due(state) or self._refreshing_async):
+            metrics.record_cache("page_state", True)
+            return state
+        metrics.record_cache("page_state", False)
+
+        self._refreshing_async = True
+        try:
+            row = tuple((await session.execute(recheck_query(datetime.now()))).one())
+            fingerprint, price = row[:-2], row[-2:]
+            if self._needs_rebuild(state, fingerprint):
+                now = datetime.now()
+                versions = [
+                    (await session.execute(active_version_query(prompt_type, now)))
+                    .scalars()
+                    .first()
+                    for prompt_type in IMAGE_PROMPT_TYPES
+                ]
+                holiday_prompt = (
+                    (await session.execute(latest_holidays_query())).scalars().first()
+                )
+                holiday_rows = (
+                    (await session.execute(holiday_rows_query(holiday_prompt)))
+                    .scalars()
+                    .all()
+                    if holiday_prompt is not None
+                    else []
+                )
+                state = build_page_state(
+                    versions, holiday_prompt, fingerprint, holiday_rows
+                )
+                logger.info("Rebuilt page state snapshot")
+            state = with_btc_price(state, *price)
+            self._recheck_at = time.monotonic() + self.recheck_seconds
+        except Exception as e:
+            logger.error(f"Error refreshing page state: {e}")
+            await session.rollback()
+            state = self._after_error(state)
+        finally:
+            self._refreshing_async = False
+
+        self._state = state
+        return state
+
+    def _needs_rebuild(self, state: Optional[PageState], fingerprint: tuple) -> bool:
+        if state is None or state.fingerprint != fingerprint:
+            return True
+        return state.expires_at is not None and datetime.now() >= state.expires_at
+
+    def _after_error(self, state: Optional[PageState]) -> PageState:
+        self._recheck_at = time.monotonic() + REBUILD_ERROR_BACKOFF_SECONDS
+        # Nothing to fall back on; serve the local fallbacks for now.
+        return state if state is not None else PageState()
+
+
+def recheck_query(now: datetime) -> Select:
+    """
+    One round trip per recheck: the image/holiday fingerprint followed by
+    the latest polled BTC price and its quote time. The fingerprint is the
+    id and last_modified of the rows the page would serve (activating,
+    replacing or updating one moves them) plus the newest holiday row id,
+    all index lookups, so a recheck costs the same however long the
+    history gets.
+    """
+    fingerprint = []
+    for prompt_type in IMAGE_PROMPT_TYPES:
+        version = active_version_query(prompt_type, now)
+        fingerprint += [
+            version.with_only_columns(column).scalar_subquery()
+            for column in (DailyImageVersion.id, DailyImageVersion.last_modified)
+        ]
+    holidays = latest_holidays_query()
+    fingerprint += [
+        holidays.with_only_columns(Prompt.id).scalar_subquery(),
+        holidays.with_only_columns(Prompt.last_modified).scalar_subquery(),
+        # Rows added under an existing prompt, e.g. by the holiday backfill.
+        select(func.max(Holiday.id)).scalar_subquery(),
+    ]
+    latest_price = select(BitcoinPrice).order_by(BitcoinPrice.quoted_at.desc()).limit(1)
+    return select(
+        *fingerprint,
+        latest_price.with_only_columns(BitcoinPrice.price).scalar_subquery(),
+        latest_price.with_only_columns(BitcoinPrice.quoted_at).scalar_subquery(),
+    )
+
+
+def active_version_query(prompt_type: PromptType, now: datetime) -> Select:
+    return (
+        select(DailyImageVersion)
+        .where(
+            DailyImageVersion.prompt_type == prompt_type,
+            DailyImageVersion.is_active == True,
+            DailyImageVersion.status == TaskStatus.COMPLETED,
+            DailyImageVersion.presigned_url.isnot(None),
+            DailyImageVersion.presigned_url_expiry > now,
+        )
+        .order_by(DailyImageVersion.prompt_date.desc())
+        .limit(1)
+    )
+
+
+def latest_holidays_query() -> Select:
+    return (
+        select(Prompt)
+        .where(
+            Prompt.prompt_type == PromptType.GET_HOLIDAYS,
+            Prompt.status == TaskStatus.COMPLETED,
+        )
+        .order_by(Prompt.prompt_date.desc(), Prompt.id.desc())
+        .limit(1)
+    )
+
+
+def holiday_rows_query(holiday_prompt: Prompt) -> Select:
+    return (
+        select(Holiday)
+        .where(Holiday.prompt_id == holiday_prompt.id)
+        .order_by(Holiday.position)
+    )
+
+
+def build_page_state(
+    versions: list[Optional[DailyImageVersion]],
+    holiday_prompt: Optional[Prompt],
+    fingerprint: tuple,
+    holiday_rows: Sequence[Holiday] = (),
+) -> PageState:
+    image_urls: dict[PromptType, str] = {}
+    expiries: list[datetime] = []
+    for version in versions:
+        if version and version.presigned_url:
+            image_urls[version.prompt_type] = version.presigned_url
+            expiries.append(version.presigned_url_expiry)
+
+    holidays: tuple[dict[str, str], ...] = ()
+    if holiday_rows:
+        holidays = tuple(holiday.to_dict() for holiday in holiday_rows)
+    elif holiday_prompt and holiday_prompt.prompt_text:
+        # Written before holidays were stored parsed and not backfilled yet.
+        holidays = tuple(parse_holiday_list(holiday_prompt.prompt_text))
+
+    return PageState(
+        image_urls=image_urls,
+        expires_at=min(expiries) if expiries else None,
+        holidays=holidays,
+        fingerprint=fingerprint,
+    )
+
+
+def with_btc_price(
+    state: PageState, price: Optional[float], quoted_at: Optional[datetime]
+) -> PageState:
+    if state.btc_price == price and state.btc_price_quoted_at == quoted_at:
+        return state
+    return replace(state, btc_price=price, btc_price_quoted_at=quoted_at)
+
+
+page_state_cache = PageStateCache()
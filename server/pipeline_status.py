@@ -0,0 +1,55 @@
+"""
+Pipeline Step Status
+
+Optional crash visibility for the daily image pipeline. Each transition is
+one UPDATE (an INSERT the first time) of a single pipeline_step_status row
+per date and prompt type, in its own short transaction.
+"""
+
+import logging
+from datetime import date, datetime
+from typing import Optional
+
+from openai_files.utils import PromptType
+from server.db_accessor import DBAccessor
+from server.models import PipelineStepStatus
+from server.models.utils import TaskStatus
+
+logger = logging.getLogger(__name__)
+
+
+class StepStatusRecorder:
+    def __init__(self, db_accessor: DBAccessor):
+        self.db_accessor = db_accessor
+
+    def record(
+        self,
+        target_date: datetime | date,
+        prompt_type: PromptType,
+        step: str,
+        status: TaskStatus,
+        error: Optional[str] = None,
+    ) -> None:
+        prompt_date = (
+            target_date.date() if isinstance(target_date, datetime) else target_date
+        )
+        values = {"step": step, "status": status, "error": error}
+        try:
+            with self.db_accessor.session_scope() as session:
+                updated = (
+                    session.query(PipelineStepStatus)
+                    .filter(
+                        PipelineStepStatus.prompt_date == prompt_date,
+                        PipelineStepStatus.prompt_type == prompt_type,
+                    )
+                    .update(values, synchronize_session=False)
+                )
+                if not updated:
+                    session.add(
+                        PipelineStepStatus(
+                            prompt_date=prompt_date, prompt_type=prompt_type, **values
+                        )
+                    )
+        except Exception as e:
+            # Visibility only: never fail the run over it.
+            logger.warning(f"Could not record pipeline step {step}: {e}")
@@ -0,0 +1,282 @@
+"""
+Pipeline Tracing
+
+Spans over the daily image pipeline's steps, to see where a run's time and
+money go. Each span records its wall time, and the clients add what they
+know to whichever span is current on their thread:
+
+- openai.retries, openai.prompt_tokens, openai.completion_tokens and
+  openai.images from OpenAIClient,
+- image.bytes, s3.upload_seconds and s3.head_seconds from S3ClientFactory.
+
+When a run ends it's saved as one pipeline_run row (totals plus every span)
+and, if an export path is set, appended to that file as a line of OTLP JSON
+that an OpenTelemetry collector or Jaeger can load. Like the step status
+table this is visibility only: failing to record never fails the run.
+"""
+
+import json
+import logging
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Any, Iterator, Optional
+
+from const import PIPELINE_TRACE_EXPORT_PATH
+from server.db_accessor import DBAccessor
+from server.models import PipelineRun
+from server.models.utils import TaskStatus
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "btc100k-pipeline"
+# OTLP enums
+SPAN_KIND_INTERNAL = 1
+STATUS_CODE_OK = 1
+STATUS_CODE_ERROR = 2
+
+_local = threading.local()
+
+
+class Span:
+    def __init__(
+        self,
+        name: str,
+        trace: "Trace",
+        parent: Optional["Span"] = None,
+        attributes: Optional[dict[str, Any]] = None,
+    ):
+        self.name = name
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent.span_id if parent else None
+        self.attributes: dict[str, Any] = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+        self._started = time.perf_counter()
+        self.duration_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self.attributes[key] = value
+
+    def add(self, key: str, amount: float) -> None:
+        with self._lock:
+            self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        self.duration_seconds = time.perf_counter() - self._started
+        self.end_ns = self.start_ns + int(self.duration_seconds * 1e9)
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    def summary(self) -> dict:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "duration_seconds": self.duration_seconds,
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+            "attributes": dict(self.attributes),
+        }
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in sorted(self.attributes.items())
+            ],
+            "status": (
+                {"code": STATUS_CODE_ERROR, "message": self.error}
+                if self.error
+                else {"code": STATUS_CODE_OK}
+            ),
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+class Trace:
+    """The spans of one pipeline run."""
+
+    def __init__(self, prompt_date: date):
+        self.trace_id = secrets.token_hex(16)
+        self.prompt_date = prompt_date
+        self.started_at = datetime.now()
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def start_span(
+        self, name: str, parent: Optional[Span], attributes: dict[str, Any]
+    ) -> Span:
+        span = Span(name, self, parent, attributes)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def total(self, key: str) -> float:
+        return sum(span.attributes.get(key, 0) for span in self.spans)
+
+    def to_otlp(self) -> dict:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": {"stringValue": SERVICE_NAME},
+                            }
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": __name__},
+                            "spans": [span.to_otlp() for span in self.spans],
+                        }
+                    ],
+                }
+            ]
+        }
+
+
+def current_span() -> Optional[Span]:
+    """The innermost span open on this thread, if a run is being traced."""
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else None
+
+
+def add_to_span(key: str, amount: float) -> None:
+    """Count amount towards key on the current span; no-op when untraced."""
+    span = current_span()
+    if span is not None:
+        span.add(key, amount)
+
+
+@contextmanager
+def activate_span(span: Optional[Span]) -> Iterator[None]:
+    """Make span the parent of spans started on this thread (e.g. a worker)."""
+    if span is None:
+        yield
+        return
+    stack = _local.__dict__.setdefault("stack", [])
+    stack.append(span)
+    try:
+        yield
+    finally:
+        stack.pop()
+
+
+class PipelineTracer:
+    def __init__(
+        self,
+        db_accessor: Optional[DBAccessor] = None,
+        export_path: str = PIPELINE_TRACE_EXPORT_PATH,
+    ):
+        self.db_accessor = db_accessor
+        self.export_path = export_path
+        self._export_lock = threading.Lock()
+
+    @contextmanager
+    def run(
+        self, name: str, prompt_date: datetime | date, **attributes: Any
+    ) -> Iterator[Span]:
+        """Trace one run under a root span; save and export it at the end."""
+        if isinstance(prompt_date, datetime):
+            prompt_date = prompt_date.date()
+        trace = Trace(prompt_date)
+        root = trace.start_span(name, None, attributes)
+        try:
+            with self._active(root):
+                yield root
+        finally:
+            # After the root span has ended, so failed runs are saved too.
+            self._record(trace, root)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+        """A child of the current span; nothing at all outside a run."""
+        parent = current_span()
+        if parent is None:
+            yield None
+            return
+        span = parent.trace.start_span(name, parent, attributes)
+        with self._active(span):
+            yield span
+
+    @staticmethod
+    @contextmanager
+    def _active(span: Span) -> Iterator[None]:
+        """Span is current for the block and ends with it."""
+        error: Optional[BaseException] = None
+        try:
+            with activate_span(span):
+                yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            span.end(error)
+
+    def _record(self, trace: Trace, root: Span) -> None:
+        if self.db_accessor is not None:
+            try:
+                with self.db_accessor.session_scope() as session:
+                    session.add(run_summary(trace, root))
+            except Exception as e:
+                logger.warning(f"Could not save pipeline run {trace.trace_id}: {e}")
+        if self.export_path:
+            try:
+                line = json.dumps(trace.to_otlp(), separators=(",", ":"))
+                with self._export_lock, open(self.export_path, "a") as f:
+                    f.write(line + "\n")
+            except OSError as e:
+                logger.warning(f"Could not export pipeline trace: {e}")
+        logger.info(
+            f"Pipeline run {trace.trace_id} took {root.duration_seconds:.1f}s: "
+            + ", ".join(
+                f"{span.name} {span.duration_seconds:.2f}s"
+                for span in trace.spans
+                if span is not root
+            )
+        )
+
+
+def run_summary(trace: Trace, root: Span) -> PipelineRun:
+    return PipelineRun(
+        trace_id=trace.trace_id,
+        prompt_date=trace.prompt_date,
+        status=TaskStatus.FAILED if root.error else TaskStatus.COMPLETED,
+        started_at=trace.started_at,
+        duration_seconds=root.duration_seconds,
+        openai_retries=int(trace.total("openai.retries")),
+        prompt_tokens=int(trace.total("openai.prompt_tokens")),
+        completion_tokens=int(trace.total("openai.completion_tokens")),
+        images_generated=int(trace.total("openai.images")),
+        image_bytes=int(trace.total("image.bytes")),
+        s3_seconds=trace.total("s3.upload_seconds") + trace.total("s3.head_seconds"),
+        spans=[span.summary() for span in trace.spans],
+        error=root.error,
+    )
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
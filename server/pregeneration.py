@@ -0,0 +1,126 @@
+"""
+Image Pre-generation
+
+Keeps a rolling buffer of the next few days' images generated ahead of
+time, so the date boundary is a flag flip instead of the OpenAI pipeline.
+
+- missing_dates() finds the dates in the window that still lack a
+  finished version of some prompt type.
+- Pre-generated versions are finalized inactive.
+- activate_versions() makes a date's versions the active ones in a single
+  transaction, re-signing their URLs first (signing is local) since they
+  were signed when generated, possibly days before.
+
+If a date has nothing ready at its boundary, the previous versions stay
+active rather than leaving the page on the fallback images.
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from typing import Iterable
+
+from const import AWS_PRESIGNED_URL_EXPIRATION_SECONDS
+from openai_files.utils import PromptType
+from server.db_accessor import DBAccessor
+from server.models import DailyImageVersion, ImageLink
+from server.models.utils import TaskStatus
+from server.presigner import Presigner, s3_key_from_url
+
+logger = logging.getLogger(__name__)
+
+IMAGE_PROMPT_TYPES = (PromptType.GENERATE_IMAGE_HAPPY, PromptType.GENERATE_IMAGE_SAD)
+
+
+def _ready_versions_query(session, target_date: date):
+    return (
+        session.query(DailyImageVersion)
+        .join(ImageLink, DailyImageVersion.image_link_id == ImageLink.id)
+        .filter(
+            DailyImageVersion.prompt_date == target_date,
+            DailyImageVersion.status == TaskStatus.COMPLETED,
+            ImageLink.s3_image_url.isnot(None),
+        )
+    )
+
+
+def missing_dates(
+    db_accessor: DBAccessor,
+    start: date,
+    days: int,
+    prompt_types: Iterable[PromptType] = IMAGE_PROMPT_TYPES,
+) -> list[date]:
+    """Dates in [start, start + days) without a finished version of every type."""
+    prompt_types = set(prompt_types)
+    window = [start + timedelta(days=n) for n in range(days)]
+    with db_accessor.session_scope() as session:
+        ready = (
+            session.query(DailyImageVersion.prompt_date, DailyImageVersion.prompt_type)
+            .join(ImageLink, DailyImageVersion.image_link_id == ImageLink.id)
+            .filter(
+                DailyImageVersion.prompt_date.in_(window),
+                DailyImageVersion.status == TaskStatus.COMPLETED,
+                ImageLink.s3_image_url.isnot(None),
+            )
+            .distinct()
+            .all()
+        )
+    done: dict[date, set[PromptType]] = {}
+    for prompt_date, prompt_type in ready:
+        done.setdefault(prompt_date, set()).add(prompt_type)
+    return [day for day in window if not prompt_types <= done.get(day, set())]
+
+
+def activate_versions(
+    db_accessor: DBAccessor,
+    presigner: Presigner,
+    target_date: date,
+    prompt_types: Iterable[PromptType] = IMAGE_PROMPT_TYPES,
+    expires_in: int = AWS_PRESIGNED_URL_EXPIRATION_SECONDS,
+) -> list[DailyImageVersion]:
+    """
+    Make target_date's newest finished version of each type the active one.
+    Types with nothing ready keep their current version. Returns the
+    versions switched on (already-active ones are left alone).
+    """
+    with db_accessor.session_scope() as session:
+        versions = []
+        for prompt_type in prompt_types:
+            version = (
+                _ready_versions_query(session, target_date)
+                .filter(DailyImageVersion.prompt_type == prompt_type)
+                .order_by(DailyImageVersion.id.desc())
+                .first()
+            )
+            if version is None:
+                logger.warning(
+                    f"No {prompt_type.value} image ready for {target_date}; "
+                    "keeping the current one"
+                )
+            elif not version.is_active:
+                versions.append(version)
+        if not versions:
+            return []
+
+        keys = {
+            version.id: s3_key_from_url(version.image_link.s3_image_url)
+            for version in versions
+        }
+        signed = presigner.presign_many(keys.values(), expires_in)
+        for version in versions:
+            session.query(DailyImageVersion).filter(
+                DailyImageVersion.prompt_type == version.prompt_type,
+                DailyImageVersion.is_active,
+                DailyImageVersion.id != version.id,
+            ).update({DailyImageVersion.is_active: False})
+            url = signed[keys[version.id]]
+            version.presigned_url = url.url
+            version.presigned_url_expiry = url.expires_at
+            version.is_active = True
+
+    logger.info(f"Activated {len(versions)} image(s) for {target_date}")
+    return versions
+
+
+def target_datetime(day: date) -> datetime:
+    # DailyImageGenerator takes a datetime for the date it generates.
+    return datetime(day.year, day.month, day.day)
@@ -0,0 +1,153 @@
+"""
+Presigned URL Service
+
+Presigning is a local HMAC over the request with the client's cached
+credentials - no S3 round trip - so URLs can be minted in bulk and rotated
+as often as we like.
+
+- presign_many() signs any number of keys with one client lookup.
+- Signed URLs are remembered until they get within refresh_ahead_seconds of
+  expiring, so repeated calls for the same key and lifetime don't re-sign.
+- rotate_presigned_urls() replaces the active images' URLs before they
+  expire, so the page never serves a dead link between daily runs.
+
+Note a URL never outlives the credentials that signed it; with temporary
+(STS) credentials keep the expiry within the session lifetime.
+"""
+
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Optional
+from urllib.parse import unquote, urlparse
+
+from const import (
+    AWS_PRESIGNED_URL_EXPIRATION_SECONDS,
+    AWS_S3_BUCKET,
+    PRESIGNED_URL_REFRESH_AHEAD_SECONDS,
+)
+from server.models import DailyImageVersion, ImageLink
+from server.models.utils import TaskStatus
+from server.s3_client import S3ClientFactory
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PresignedUrl:
+    key: str
+    url: str
+    expires_at: datetime
+
+
+class Presigner:
+    def __init__(
+        self,
+        s3_client: Optional[S3ClientFactory] = None,
+        bucket: Optional[str] = AWS_S3_BUCKET,
+        refresh_ahead_seconds: float = PRESIGNED_URL_REFRESH_AHEAD_SECONDS,
+        clock: Callable[[], datetime] = datetime.now,
+    ):
+        self.s3_client = s3_client or S3ClientFactory()
+        self.bucket = bucket
+        self.refresh_ahead = timedelta(seconds=refresh_ahead_seconds)
+        self.clock = clock
+        # Keyed by (key, expires_in): a caller asking for a day-long URL
+        # mustn't get one signed for ten minutes, or the reverse.
+        self._urls: dict[tuple[str, int], PresignedUrl] = {}
+        self._lock = threading.Lock()
+
+    def presign(
+        self, key: str, expires_in: int = AWS_PRESIGNED_URL_EXPIRATION_SECONDS
+    ) -> PresignedUrl:
+        return self.presign_many([key], expires_in)[key]
+
+    def presign_many(
+        self,
+        keys: Iterable[str],
+        expires_in: int = AWS_PRESIGNED_URL_EXPIRATION_SECONDS,
+    ) -> dict[str, PresignedUrl]:
+        now = self.clock()
+        keys = list(dict.fromkeys(keys))
+        signed: dict[str, PresignedUrl] = {}
+
+        with self._lock:
+            # Forget URLs nobody can use any more.
+            for entry in [e for e, u in self._urls.items() if u.expires_at <= now]:
+                del self._urls[entry]
+            for key in keys:
+                cached = self._urls.get((key, expires_in))
+                if cached is not None and cached.expires_at - now > self.refresh_ahead:
+                    signed[key] = cached
+
+        missing = [key for key in keys if key not in signed]
+        if missing:
+            expires_at = now + timedelta(seconds=expires_in)
+            urls = self.s3_client.call_with_refresh(
+                lambda s3: [
+                    s3.generate_presigned_url(
+                        "get_object",
+                        Params={"Bucket": self.bucket, "Key": key},
+                        ExpiresIn=expires_in,
+                    )
+                    for key in missing
+                ]
+            )
+            fresh = {
+                key: PresignedUrl(key=key, url=url, expires_at=expires_at)
+                for key, url in zip(missing, urls)
+            }
+            with self._lock:
+                self._urls.update(
+                    ((key, expires_in), url) for key, url in fresh.items()
+                )
+            signed.update(fresh)
+
+        return {key: signed[key] for key in keys}
+
+
+def s3_key_from_url(s3_url: str) -> str:
+    # https://<bucket>.s3.<region>.amazonaws.com/<key>, as save_image_to_s3 writes
+    return unquote(urlparse(s3_url).path.lstrip("/"))
+
+
+def rotate_presigned_urls(
+    db_accessor,
+    presigner: Presigner,
+    refresh_ahead_seconds: float = PRESIGNED_URL_REFRESH_AHEAD_SECONDS,
+    expires_in: int = AWS_PRESIGNED_URL_EXPIRATION_SECONDS,
+) -> int:
+    """
+    Re-sign every active image whose URL expires within refresh_ahead_seconds.
+    Returns the number of versions updated.
+    """
+    now = datetime.now()
+    with db_accessor.session_scope() as session:
+        versions = (
+            session.query(DailyImageVersion)
+            .join(ImageLink, DailyImageVersion.image_link_id == ImageLink.id)
+            .filter(
+                DailyImageVersion.is_active == True,
+                DailyImageVersion.status == TaskStatus.COMPLETED,
+                ImageLink.s3_image_url.isnot(None),
+                DailyImageVersion.presigned_url_expiry
+                < now + timedelta(seconds=refresh_ahead_seconds),
+            )
+            .all()
+        )
+        if not versions:
+            return 0
+
+        keys = {
+            version.id: s3_key_from_url(version.image_link.s3_image_url)
+            for version in versions
+        }
+        signed = presigner.presign_many(keys.values(), expires_in)
+        for version in versions:
+            url = signed[keys[version.id]]
+            version.presigned_url = url.url
+            version.presigned_url_expiry = url.expires_at
+
+    logger.info(f"Rotated {len(versions)} presigned URL(s)")
+    return len(versions)
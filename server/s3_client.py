@@ -1,17 +1,28 @@
 """
 S3 Singleton Factory
 
-Keeps overhead low by keeping at most one S3 client alive, refreshing
-the client if credentials are invalid or expire.
+Keeps overhead low by keeping at most one S3 client alive, shared by all
+threads (boto3 clients are thread-safe). Credentials aren't checked up front;
+the client is reused until S3 actually rejects them, then rebuilt and the
+operation retried once.
 
-Get client when needed; don't hold onto it too long or we won't be able
-to guarantee a valid connection.
+Images are streamed from their source URL straight into S3 (multipart for
+anything over one chunk), so a transfer holds at most
+S3_TRANSFER_CHUNK_BYTES x S3_TRANSFER_MAX_CONCURRENCY in memory however
+large the image is.
 """
 
-import io
+import base64
+import hashlib
+import logging
+import threading
+import time
+from typing import Callable, NoReturn, Optional, TypeVar
+
 import requests  # type: ignore
 
 import boto3  # type: ignore
+from boto3.s3.transfer import TransferConfig  # type: ignore
 from botocore.config import Config  # type: ignore
 from botocore.exceptions import (  # type: ignore
     NoCredentialsError,
@@ -24,12 +35,28 @@ from const import (
     AWS_REGION,
     AWS_S3_BUCKET,
     AWS_SECRET_ACCESS_KEY,
+    IMAGE_DOWNLOAD_CONNECT_TIMEOUT_SECONDS,
+    IMAGE_DOWNLOAD_READ_TIMEOUT_SECONDS,
+    S3_TRANSFER_CHUNK_BYTES,
+    S3_TRANSFER_MAX_CONCURRENCY,
+)
+from server.metrics import metrics
+from server.pipeline_trace import add_to_span
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Error codes meaning the client's credentials, not the request, are bad.
+AUTH_ERROR_CODES = frozenset(
+    {"ExpiredToken", "ExpiredTokenException", "InvalidToken", "TokenRefreshRequired"}
 )
 
 
 class S3ClientFactory:
     _s3_client = None
     _instance = None
+    _lock = threading.Lock()
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
@@ -47,6 +74,7 @@ class S3ClientFactory:
         )
 
     def is_s3_session_valid(self) -> bool:
+        # Costs a list_buckets round trip; not used on the request path.
         try:
             if self._s3_client is None:
                 return False
@@ -64,36 +92,111 @@ class S3ClientFactory:
             return False
 
     def save_image_to_s3(self, image_url: str, unique_file_name: str) -> str:
-        response = requests.get(image_url)
-        if response.status_code == 200:
-            s3 = self.get_s3_client()
-            image_data = response.content
-            s3.upload_fileobj(
-                io.BytesIO(image_data),
-                AWS_S3_BUCKET,
+        # A retry after a credentials refresh downloads the image again;
+        # a half-consumed stream can't be replayed.
+        self.call_with_refresh(
+            lambda s3: self._stream_to_s3(s3, image_url, unique_file_name)
+        )
+
+        s3_url = f"https://{AWS_S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/{unique_file_name}"
+
+        return s3_url
+
+    def _stream_to_s3(self, s3, image_url: str, unique_file_name: str) -> str:
+        with requests.get(
+            image_url,
+            stream=True,
+            timeout=(
+                IMAGE_DOWNLOAD_CONNECT_TIMEOUT_SECONDS,
+                IMAGE_DOWNLOAD_READ_TIMEOUT_SECONDS,
+            ),
+        ) as response:
+            if response.status_code != 200:
+                raise Exception(
+                    f"Failed to retrieve image. Status code: {response.status_code}"
+                )
+
+            # Content-Length counts encoded bytes; we count decoded ones.
+            expected_length = None
+            if "Content-Encoding" not in response.headers:
+                expected_length = response.headers.get("Content-Length")
+            body = HashingReader(response.raw, part_size=S3_TRANSFER_CHUNK_BYTES)
+            # Includes streaming the image down from its source URL.
+            started = time.perf_counter()
+            with metrics.upstream("s3", "upload"):
+                s3.upload_fileobj(
+                    body,
+                    AWS_S3_BUCKET,
+                    unique_file_name,
+                    # S3 verifies each part against its SHA-256 as it arrives.
+                    ExtraArgs={
+                        "ContentType": response.headers.get(
+                            "Content-Type", "image/png"
+                        ),
+                        "ChecksumAlgorithm": "SHA256",
+                    },
+                    Config=transfer_config(),
+                )
+            add_to_span("s3.upload_seconds", time.perf_counter() - started)
+
+        if expected_length is not None and body.bytes_read != int(expected_length):
+            self._discard(
+                s3,
                 unique_file_name,
-                ExtraArgs={"ContentType": "image/png"},
+                f"Image download truncated: got {body.bytes_read} of "
+                f"{expected_length} bytes",
+            )
+        started = time.perf_counter()
+        with metrics.upstream("s3", "head_object"):
+            stored = s3.head_object(
+                Bucket=AWS_S3_BUCKET, Key=unique_file_name, ChecksumMode="ENABLED"
+            )
+        add_to_span("s3.head_seconds", time.perf_counter() - started)
+        if stored["ContentLength"] != body.bytes_read:
+            self._discard(
+                s3,
+                unique_file_name,
+                f"S3 object size {stored['ContentLength']} does not match the "
+                f"{body.bytes_read} bytes uploaded",
+            )
+        checksum = stored.get("ChecksumSHA256")
+        if checksum is None:
+            logger.warning(f"S3 returned no SHA-256 for {unique_file_name}")
+        elif checksum != body.s3_checksum(multipart="-" in checksum):
+            self._discard(
+                s3,
+                unique_file_name,
+                f"S3 object checksum {checksum} does not match the bytes uploaded",
             )
 
-            s3_url = f"https://{AWS_S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/{unique_file_name}"
+        add_to_span("image.bytes", body.bytes_read)
+        logger.info(
+            f"Streamed {body.bytes_read} bytes to s3://{AWS_S3_BUCKET}/"
+            f"{unique_file_name} (sha256 {body.hexdigest()})"
+        )
+        return body.hexdigest()
 
-            return s3_url
-        else:
-            raise Exception(
-                f"Failed to retrieve image. Status code: {response.status_code}"
-            )
+    @staticmethod
+    def _discard(s3, unique_file_name: str, reason: str) -> NoReturn:
+        """Delete a bad upload so nothing reads it under its final key, then fail."""
+        try:
+            s3.delete_object(Bucket=AWS_S3_BUCKET, Key=unique_file_name)
+        except Exception as e:
+            logger.error(f"Could not delete bad upload {unique_file_name}: {e}")
+        raise Exception(reason)
 
     def fetch_presigned_url(
         self,
         unique_file_name: str,
         expiration: int,
     ) -> str:
-        s3 = self.get_s3_client()
         try:
-            url = s3.generate_presigned_url(
-                "get_object",
-                Params={"Bucket": AWS_S3_BUCKET, "Key": unique_file_name},
-                ExpiresIn=expiration,
+            url = self.call_with_refresh(
+                lambda s3: s3.generate_presigned_url(
+                    "get_object",
+                    Params={"Bucket": AWS_S3_BUCKET, "Key": unique_file_name},
+                    ExpiresIn=expiration,
+                )
             )
 
             return url
@@ -102,7 +205,108 @@ class S3ClientFactory:
             raise
 
     def get_s3_client(self) -> boto3:
-        if self._s3_client is None or not self.is_s3_session_valid():
-            self._s3_client = self._create_s3_client()
+        client = self._s3_client
+        if client is not None:
+            return client
+
+        with self._lock:
+            if self._s3_client is None:
+                self._s3_client = self._create_s3_client()
+            return self._s3_client
+
+    def invalidate_s3_client(self, client) -> None:
+        # Only drop the client the caller saw fail; another thread may
+        # already have replaced it.
+        with self._lock:
+            if self._s3_client is client:
+                self._s3_client = None
+
+    def call_with_refresh(self, operation: Callable[[boto3], T]) -> T:
+        """
+        Run operation(client), rebuilding the client and retrying once if S3
+        rejects its credentials.
+        """
+        client = self.get_s3_client()
+        try:
+            return operation(client)
+        except (NoCredentialsError, PartialCredentialsError, ClientError) as e:
+            if not is_auth_error(e):
+                raise
+            logger.warning(f"S3 credentials rejected ({e}); refreshing client")
+            self.invalidate_s3_client(client)
+
+        return operation(self.get_s3_client())
+
+
+def transfer_config() -> TransferConfig:
+    config = TransferConfig(
+        multipart_threshold=S3_TRANSFER_CHUNK_BYTES,
+        multipart_chunksize=S3_TRANSFER_CHUNK_BYTES,
+        max_concurrency=S3_TRANSFER_MAX_CONCURRENCY,
+    )
+    # Parts read ahead of the uploader threads; this is what bounds memory
+    # for a non-seekable stream.
+    config.max_in_memory_upload_chunks = S3_TRANSFER_MAX_CONCURRENCY
+    return config
+
+
+class HashingReader:
+    """
+    File-like view of a download stream that hashes and counts as it's read.
+    With part_size it also hashes each part_size slice, the parts a
+    multipart upload splits a non-seekable stream into, to check S3's
+    checksum-of-checksums against.
+    """
+
+    def __init__(self, raw, part_size: Optional[int] = None):
+        self.raw = raw
+        self.part_size = part_size
+        self.bytes_read = 0
+        self._sha256 = hashlib.sha256()
+        self._part_digests: list[bytes] = []
+        self._part = hashlib.sha256()
+        self._part_bytes = 0
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        if size is None or size < 0:
+            data = self.raw.read(decode_content=True)
+        else:
+            data = self.raw.read(size, decode_content=True)
+        self._sha256.update(data)
+        self.bytes_read += len(data)
+        if self.part_size:
+            self._update_parts(data)
+        return data
+
+    def _update_parts(self, data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            take = min(len(view), self.part_size - self._part_bytes)
+            self._part.update(view[:take])
+            self._part_bytes += take
+            view = view[take:]
+            if self._part_bytes == self.part_size:
+                self._part_digests.append(self._part.digest())
+                self._part = hashlib.sha256()
+                self._part_bytes = 0
+
+    def hexdigest(self) -> str:
+        return self._sha256.hexdigest()
+
+    def s3_checksum(self, multipart: bool) -> str:
+        """The ChecksumSHA256 S3 reports for these bytes."""
+        if not multipart:
+            return base64.b64encode(self._sha256.digest()).decode()
+        digests = list(self._part_digests)
+        if self._part_bytes:
+            digests.append(self._part.digest())
+        combined = hashlib.sha256(b"".join(digests)).digest()
+        return f"{base64.b64encode(combined).decode()}-{len(digests)}"
+
 
-        return self._s3_client
+def is_auth_error(error: Exception) -> bool:
+    if isinstance(error, (NoCredentialsError, PartialCredentialsError)):
+        return True
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code") in AUTH_ERROR_CODES
+    return False
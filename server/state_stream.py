@@ -0,0 +1,182 @@
+"""
+Server-Sent Events for the home page state
+
+One StatePublisher per process polls the (cheap, cached) page state on a
+background thread and fans each change out to every open stream, so N tabs
+cost one state build per poll rather than N. Streams only get an event when
+the state actually changes; comment heartbeats keep proxies from closing
+idle connections. The poller only runs while someone is subscribed.
+
+subscribe() parks a thread per stream, so under gthread it is only suitable
+for a handful of tabs; the ASGI app uses subscribe_async(), where an open
+stream is just a coroutine waiting on an asyncio.Event.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import AsyncIterator, Callable, Iterator, Optional
+
+from const import (
+    STATE_STREAM_HEARTBEAT_SECONDS,
+    STATE_STREAM_MAX_SECONDS,
+    STATE_STREAM_POLL_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def format_event(data: dict, event: str = "state") -> str:
+    return f"event: {event}\ndata: {json.dumps(data, sort_keys=True)}\n\n"
+
+
+class StatePublisher:
+    def __init__(
+        self,
+        get_state: Callable[[], Optional[dict]],
+        poll_seconds: float = STATE_STREAM_POLL_SECONDS,
+    ):
+        self.get_state = get_state
+        self.poll_seconds = poll_seconds
+        self._condition = threading.Condition()
+        self._state: Optional[dict] = None
+        self._version = 0
+        self._subscribers = 0
+        self._poller: Optional[threading.Thread] = None
+        self._async_waiters: set[tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+
+    @property
+    def subscribers(self) -> int:
+        return self._subscribers
+
+    def poll(self) -> None:
+        """Build the state once and wake every stream if it changed."""
+        try:
+            state = self.get_state()
+        except Exception as e:
+            logger.error(f"Error building state for stream: {e}")
+            return
+
+        if state is None:
+            return
+        with self._condition:
+            if state != self._state:
+                self._state = state
+                self._version += 1
+                self._condition.notify_all()
+                for loop, changed in self._async_waiters:
+                    try:
+                        loop.call_soon_threadsafe(changed.set)
+                    except RuntimeError:
+                        pass  # loop already closed
+
+    def subscribe(
+        self,
+        heartbeat_seconds: float = STATE_STREAM_HEARTBEAT_SECONDS,
+        max_seconds: float = STATE_STREAM_MAX_SECONDS,
+    ) -> Iterator[str]:
+        # Tell EventSource how long to wait before reconnecting once we close.
+        yield f"retry: {int(self.poll_seconds * 1000)}\n\n"
+
+        with self._condition:
+            self._subscribers += 1
+            self._ensure_poller()
+        try:
+            started = last_sent = time.monotonic()
+            seen = 0
+            while True:
+                remaining = max_seconds - (time.monotonic() - started)
+                if remaining <= 0:
+                    return
+
+                with self._condition:
+                    if self._version == seen:
+                        wait = heartbeat_seconds - (time.monotonic() - last_sent)
+                        self._condition.wait(max(0.0, min(wait, remaining)))
+                    version, state = self._version, self._state
+
+                if version != seen and state is not None:
+                    seen = version
+                    yield format_event(state)
+                    last_sent = time.monotonic()
+                elif time.monotonic() - last_sent >= heartbeat_seconds:
+                    yield ": keepalive\n\n"
+                    last_sent = time.monotonic()
+        finally:
+            with self._condition:
+                self._subscribers -= 1
+                if self._subscribers == 0:
+                    # Let the poller stop now rather than after its sleep.
+                    self._condition.notify_all()
+
+    async def subscribe_async(
+        self,
+        heartbeat_seconds: float = STATE_STREAM_HEARTBEAT_SECONDS,
+        max_seconds: float = STATE_STREAM_MAX_SECONDS,
+    ) -> AsyncIterator[str]:
+        """subscribe() for the event loop; holds no thread while waiting."""
+        yield f"retry: {int(self.poll_seconds * 1000)}\n\n"
+
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        changed = waiter[1]
+        with self._condition:
+            self._subscribers += 1
+            self._async_waiters.add(waiter)
+            self._ensure_poller()
+        try:
+            started = last_sent = time.monotonic()
+            seen = 0
+            while True:
+                remaining = max_seconds - (time.monotonic() - started)
+                if remaining <= 0:
+                    return
+
+                if self._version == seen:
+                    wait = heartbeat_seconds - (time.monotonic() - last_sent)
+                    try:
+                        await asyncio.wait_for(
+                            changed.wait(), max(0.0, min(wait, remaining))
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+                    changed.clear()
+                with self._condition:
+                    version, state = self._version, self._state
+
+                if version != seen and state is not None:
+                    seen = version
+                    yield format_event(state)
+                    last_sent = time.monotonic()
+                elif time.monotonic() - last_sent >= heartbeat_seconds:
+                    yield ": keepalive\n\n"
+                    last_sent = time.monotonic()
+        finally:
+            with self._condition:
+                self._async_waiters.discard(waiter)
+                self._subscribers -= 1
+                if self._subscribers == 0:
+                    self._condition.notify_all()
+
+    def _ensure_poller(self) -> None:
+        # Called with the condition held. A poller inherited across a fork
+        # is not alive in the child, so each worker starts its own.
+        if self._poller is None or not self._poller.is_alive():
+            self._poller = threading.Thread(
+                target=self._run, name="state-publisher", daemon=True
+            )
+            self._poller.start()
+
+    def _run(self) -> None:
+        while True:
+            self.poll()
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._subscribers == 0, timeout=self.poll_seconds
+                )
+                if self._subscribers == 0:
+                    # Don't hand a stale state to the next subscriber.
+                    self._state = None
+                    self._poller = None
+                    return
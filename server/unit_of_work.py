@@ -0,0 +1,48 @@
+"""
+Unit of Work
+
+Collects inserts and updates and writes them together: one transaction, one
+flush (SQLAlchemy batches same-table INSERTs), instead of a commit per change.
+
+Objects handed to add() stay out of the session until commit(), so setting
+attributes on them in the meantime costs nothing: a row created and updated
+three times before a commit is a single INSERT with its final values.
+"""
+
+from typing import Any, Callable
+
+from sqlalchemy.orm import Session
+
+from server.db_accessor import DBAccessor
+from server.models import Base
+
+
+class UnitOfWork:
+    def __init__(self, db_accessor: DBAccessor):
+        self.db_accessor = db_accessor
+        self._instances: list[Base] = []
+        self._statements: list[Callable[[Session], Any]] = []
+
+    def add(self, instance: Base) -> None:
+        if not any(pending is instance for pending in self._instances):
+            self._instances.append(instance)
+
+    def merge(self, instance: Base) -> Base:
+        # Same call shape as Session.merge, but the caller keeps its object.
+        self.add(instance)
+        return instance
+
+    def defer(self, statement: Callable[[Session], Any]) -> None:
+        """Run statement(session) in the commit's transaction, after the flush."""
+        self._statements.append(statement)
+
+    def commit(self) -> None:
+        if not self._instances and not self._statements:
+            return
+        instances, self._instances = self._instances, []
+        statements, self._statements = self._statements, []
+        with self.db_accessor.session_scope() as session:
+            session.add_all(instances)
+            session.flush()
+            for statement in statements:
+                statement(session)
@@ -0,0 +1,100 @@
+"""
+Backfill images for a date range.
+
+    python -m server.workers.backfill 2026-01-01 2026-03-31
+    python -m server.workers.backfill 2026-01-01 2026-03-31 --workers 4 --per-minute 6
+    python -m server.workers.backfill 2026-01-01 2026-03-31 --enqueue
+
+Dates that already have every image are skipped, so it can be stopped
+(Ctrl-C) and rerun. --enqueue hands the dates to the job queue workers
+instead of generating them here.
+"""
+
+import argparse
+import logging
+import sys
+from datetime import date
+
+from app import create_app
+from server.backfill import Backfill, date_range
+from server.db_accessor import DBAccessor
+from server.job_queue import JobQueue
+from server.pregeneration import activate_versions, missing_dates
+from server.presigner import Presigner
+from server.workers import daily_task
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("start", type=date.fromisoformat)
+    parser.add_argument("end", type=date.fromisoformat)
+    parser.add_argument("--workers", type=int, default=2, help="dates at a time")
+    parser.add_argument(
+        "--per-minute",
+        type=float,
+        default=0,
+        help="start at most this many dates a minute (0: no limit)",
+    )
+    parser.add_argument(
+        "--enqueue", action="store_true", help="queue jobs instead of running here"
+    )
+    args = parser.parse_args(argv)
+    if args.end < args.start:
+        parser.error("end is before start")
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    app = create_app()
+    with app.app_context():
+        db_accessor = DBAccessor()
+        days = len(date_range(args.start, args.end))
+        dates = missing_dates(db_accessor, args.start, days, daily_task.PROMPT_TYPES)
+        logger.info(
+            f"Backfill {args.start} to {args.end}: {len(dates)} of {days} dates missing"
+        )
+
+        if args.enqueue:
+            job_queue = JobQueue(db_accessor)
+            for day in dates:
+                job_queue.enqueue(
+                    daily_task.GENERATE_IMAGES_TASK,
+                    {"date": day.isoformat()},
+                    dedupe_key=f"{daily_task.GENERATE_IMAGES_TASK}:{day}",
+                )
+            return 0
+
+        backfill = Backfill(
+            lambda day: daily_task.generate_day(DBAccessor(), day),
+            max_workers=args.workers,
+            min_interval_seconds=60 / args.per_minute if args.per_minute else 0,
+            app=app,
+        )
+        result = backfill.run(dates)
+
+        # Backfilled versions are finished inactive; today's still needs to
+        # become the live one if it was in the range.
+        today = daily_task.today()
+        if today in result.completed:
+            activate_versions(
+                db_accessor, Presigner(), today, daily_task.PROMPT_TYPES
+            )
+
+    if result.failed:
+        logger.error(f"Backfill failed for {len(result.failed)} dates: rerun it")
+        return 1
+    if result.skipped:
+        logger.warning(
+            f"Backfill stopped with {len(result.skipped)} dates not started: "
+            "rerun it to pick them up"
+        )
+    logger.info(f"Backfill completed {len(result.completed)} dates")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,45 +1,150 @@
 import sys
 import logging
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
 from server.s3_client import S3ClientFactory
 from server.db_accessor import DBAccessor
 from openai_files.utils import PromptType
 from app import create_app
-from server.daily_image_generator import DailyImageGenerator
+from server.daily_image_generator import DailyImageGenerator, DailyImageGenerationError
+from server.pipeline_status import StepStatusRecorder
+from server.pipeline_trace import PipelineTracer
+from server.pregeneration import (
+    activate_versions,
+    missing_dates,
+    target_datetime,
+)
+from server.presigner import Presigner
 from openai_files.openai_client import OpenAIClient
-from const import AWS_PRESIGNED_URL_EXPIRATION_SECONDS
+from const import (
+    AWS_PRESIGNED_URL_EXPIRATION_SECONDS,
+    IMAGE_PREGENERATION_DAYS,
+    IMAGE_TIMEZONE,
+    JOB_QUEUE_ENABLED,
+    PIPELINE_STEP_STATUS_ENABLED,
+    PIPELINE_TRACING_ENABLED,
+)
+from server.job_queue import JobQueue
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+PROMPT_TYPES = [PromptType.GENERATE_IMAGE_HAPPY, PromptType.GENERATE_IMAGE_SAD]
+
+GENERATE_IMAGES_TASK = "generate_images"
+ACTIVATE_IMAGES_TASK = "activate_images"
+
+
+def today() -> date:
+    return datetime.now(ZoneInfo(IMAGE_TIMEZONE)).date()
+
+
+def build_generator(db_accessor: DBAccessor) -> DailyImageGenerator:
+    return DailyImageGenerator(
+        openai_client=OpenAIClient(),
+        s3_client=S3ClientFactory(),
+        db_accessor=db_accessor,
+        step_status=(
+            StepStatusRecorder(db_accessor) if PIPELINE_STEP_STATUS_ENABLED else None
+        ),
+        tracer=PipelineTracer(db_accessor) if PIPELINE_TRACING_ENABLED else None,
+    )
+
 
 def run():
     logger.info("Starting daily task")
     app = create_app()
     with app.app_context():
-        s3_client = S3ClientFactory()
-        db_accessor = DBAccessor()
-
-        client = OpenAIClient()
+        daily_image_generator = build_generator(DBAccessor())
 
-        # This returns a list of holidays for the current date.
-        current_date = datetime.now()
-
-        daily_image_generator = DailyImageGenerator(
-            openai_client=client,
-            s3_client=s3_client,
-            db_accessor=db_accessor,
-        )
+        # Today in IMAGE_TIMEZONE, the calendar the 00:01 run is scheduled
+        # on, not the server's local date.
+        current_date = target_datetime(today())
 
         daily_image_generator.generate_daily_images(
-            [PromptType.GENERATE_IMAGE_HAPPY, PromptType.GENERATE_IMAGE_SAD],
+            PROMPT_TYPES,
             current_date,
-            current_date + timedelta(seconds=int(AWS_PRESIGNED_URL_EXPIRATION_SECONDS)),
+            datetime.now()
+            + timedelta(seconds=int(AWS_PRESIGNED_URL_EXPIRATION_SECONDS)),
         )
 
         logger.info("Daily task completed successfully")
 
 
+def generate_day(db_accessor: DBAccessor, day: date, activate: bool = False) -> None:
+    logger.info(f"Generating images for {day}")
+    # Pre-generated URLs are re-signed on activation; this covers the meantime.
+    expiry = datetime.now() + timedelta(seconds=AWS_PRESIGNED_URL_EXPIRATION_SECONDS)
+    build_generator(db_accessor).generate_daily_images(
+        PROMPT_TYPES, target_datetime(day), expiry, activate=activate
+    )
+
+
+def pregenerate(days: int = IMAGE_PREGENERATION_DAYS) -> list[date]:
+    """
+    Fill in whatever is missing of the next `days` days (today first), then
+    make sure today's images are the active ones. Returns the dates still
+    missing afterwards; the next run retries them.
+
+    With JOB_QUEUE_ENABLED the missing dates are queued for the job workers
+    instead (one job per date, deduplicated) and nothing is returned.
+    """
+    db_accessor = DBAccessor()
+    start = today()
+    missing = missing_dates(db_accessor, start, days, PROMPT_TYPES)
+    if JOB_QUEUE_ENABLED:
+        job_queue = JobQueue(db_accessor)
+        for day in missing:
+            job_queue.enqueue(
+                GENERATE_IMAGES_TASK,
+                {"date": day.isoformat()},
+                dedupe_key=f"{GENERATE_IMAGES_TASK}:{day}",
+            )
+        missing = []
+
+    failed = []
+    for day in missing:
+        try:
+            generate_day(db_accessor, day)
+        except DailyImageGenerationError as e:
+            logger.error(f"Pre-generation for {day} incomplete: {e}")
+            failed.append(day)
+        except Exception:
+            logger.error(f"Pre-generation for {day} failed", exc_info=True)
+            failed.append(day)
+
+    # A no-op once midnight's activation has run; covers a late today.
+    activate_versions(db_accessor, Presigner(), start, PROMPT_TYPES)
+    return failed
+
+
+def activate_today() -> None:
+    activate_versions(DBAccessor(), Presigner(), today(), PROMPT_TYPES)
+
+
+# Job queue handlers, keyed by task name. Payloads are JSON.
+
+def handle_generate_images(payload: dict) -> None:
+    # Raising hands the job back to the queue to retry with backoff; the
+    # generator resumes from the steps that already finished.
+    generate_day(
+        DBAccessor(),
+        date.fromisoformat(payload["date"]),
+        activate=payload.get("activate", False),
+    )
+
+
+def handle_activate_images(payload: dict) -> None:
+    day = date.fromisoformat(payload["date"]) if "date" in payload else today()
+    activate_versions(DBAccessor(), Presigner(), day, PROMPT_TYPES)
+
+
+JOB_HANDLERS = {
+    GENERATE_IMAGES_TASK: handle_generate_images,
+    ACTIVATE_IMAGES_TASK: handle_activate_images,
+}
+
+
 if __name__ == "__main__":
     try:
         run()
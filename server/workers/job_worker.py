@@ -0,0 +1,26 @@
+"""
+Standalone job queue worker. Optional: with JOB_QUEUE_ENABLED the `worker`
+process already runs the job threads. Add a process type running this
+module only when the queue needs more capacity than that.
+"""
+
+import logging
+
+from app import create_app
+from const import METRICS_PORT
+from server.db_accessor import DBAccessor
+from server.job_queue import JobQueue, JobWorker
+from server.metrics import start_metrics_server
+from server.workers.daily_task import JOB_HANDLERS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    app = create_app()
+    with app.app_context():
+        job_queue = JobQueue(DBAccessor())
+    logger.info("Starting job worker")
+    start_metrics_server(METRICS_PORT)
+    JobWorker(job_queue, JOB_HANDLERS, app=app).run_forever()
@@ -1,36 +1,73 @@
 """ Generic worker because we don't want to pay for additional dynos we don't need """
 
-from apscheduler.schedulers.blocking import BlockingScheduler  # type: ignore
+import logging
 from datetime import datetime
 
-from facades.cmc_facade import get_btc_price
-from openai_files.helpers import get_prompt, get_system_message
-from openai_files.openai_client import OpenAIClient
-from openai_files.utils import PromptType
-from server.s3_client import S3ClientFactory
+from apscheduler.schedulers.blocking import BlockingScheduler  # type: ignore
+
+from app import create_app
+from const import (
+    BTC_PRICE_POLL_INTERVAL_SECONDS,
+    IMAGE_PREGENERATION_DAYS,
+    IMAGE_PREGENERATION_INTERVAL_SECONDS,
+    IMAGE_TIMEZONE,
+    JOB_QUEUE_ENABLED,
+    METRICS_PORT,
+    PRESIGNED_URL_ROTATION_INTERVAL_SECONDS,
+)
+from server.bitcoin_price_poller import BitcoinPricePoller
+from server.db_accessor import DBAccessor
+from server.job_queue import JobQueue, JobWorker
+from server.metrics import start_metrics_server
+from server.presigner import Presigner, rotate_presigned_urls
+from server.workers import daily_task
+
+logger = logging.getLogger(__name__)
 
 SESSION_BATCH_SIZE = 10
 
 scheduler = BlockingScheduler()
+app = create_app()
 
+_price_poller: BitcoinPricePoller | None = None
+_presigner: Presigner | None = None
 
-# 5 - minute worker
-# check to see if there is a task in the queue
-# tasks:
-# check price of bitcoin and write
-# @scheduler.scheduled_job("interval", minutes=5)
-# def check_bitcoin_price() -> None:
-#     # get API credentials or API client
-#     # get_btc_price
-#     price = get_btc_price()
-#     if price <= 0:
-#         raise ValueError("Invalid Bitcoin price: must be greater than 0")
 
-#     new_price = BitcoinPrice(price=price)
-#     db.session.add(new_price)
-#     db.session.commit()
+# Price worker
+# check price of bitcoin and write it so home() can read it from the DB.
+# Quotes that fail to write stay buffered in the poller and go out with
+# the next successful flush, SESSION_BATCH_SIZE rows per insert.
+@scheduler.scheduled_job(
+    "interval",
+    seconds=BTC_PRICE_POLL_INTERVAL_SECONDS,
+    max_instances=1,
+    coalesce=True,
+)
+def check_bitcoin_price() -> float:
+    global _price_poller
+    with app.app_context():
+        if _price_poller is None:
+            _price_poller = BitcoinPricePoller(
+                DBAccessor(), batch_size=SESSION_BATCH_SIZE
+            )
+        return _price_poller.poll()
 
-#     return price
+
+# Presigned URL rotation
+# signing is local and cheap, so keep the active images' URLs topped up
+# well before they expire instead of relying on the once-a-day run.
+@scheduler.scheduled_job(
+    "interval",
+    seconds=PRESIGNED_URL_ROTATION_INTERVAL_SECONDS,
+    max_instances=1,
+    coalesce=True,
+)
+def rotate_image_urls() -> int:
+    global _presigner
+    with app.app_context():
+        if _presigner is None:
+            _presigner = Presigner()
+        return rotate_presigned_urls(DBAccessor(), _presigner)
 
 
 # Daily worker
@@ -41,30 +78,58 @@ scheduler = BlockingScheduler()
 # save the images to S3
 # generate pre-signed URLs that expire in 25 hours.
 # save pre-signed URLs
-@scheduler.scheduled_job("cron", hour=0, minute=1, timezone="America/Los_Angeles")
 def daily_image_generation() -> None:
-    s3_client = S3ClientFactory()
-    client = OpenAIClient()
-
-    holiday_list = client.fetch_holiday_list()
-    holiday_image_prompt = get_prompt(PromptType.GENERATE_IMAGE_HAPPY, holiday_list)
-    print(holiday_image_prompt)
-    holiday_image_url = client.fetch_generated_image_url(holiday_image_prompt)
-    print(holiday_image_url)
-    curr_date_str = datetime.now().strftime("%d-%b-%Y").upper()
-    file_name = f"{PromptType.GENERATE_IMAGE_HAPPY.value}-{curr_date_str}"
-    u_file_name = client.generate_unique_file_name(file_name)
-    s3_image_url = s3_client.save_image_to_s3(holiday_image_url, u_file_name)
-    print(f"{s3_image_url=}")
-    pre_signed_url = s3_client.fetch_presigned_url(u_file_name)
-    print(f"{pre_signed_url=}")
-    # write pre_signed_url x 2 to DB.
-
-    # image table will be like:
-    # date, type, prompt_id, s3_url, pre_signed_url (this may change)
-
-    # process could be, check latest btc price from db, if > 100k, get latest image where type == 'happy'
-
-    # alternate thought: daily_version table: date, image_happy_id, image_sad_id, active (bool)
-    # process is check for latest active daily_version and serve appropriate image.
-    ...
+    daily_task.run()
+
+
+# Pre-generation
+# keep the next IMAGE_PREGENERATION_DAYS days generated (retrying anything
+# that failed every interval) and switch to the new day's images at
+# midnight, which is only a flag flip and a local re-sign.
+def pregenerate_images() -> list:
+    with app.app_context():
+        return daily_task.pregenerate(IMAGE_PREGENERATION_DAYS)
+
+
+def activate_todays_images() -> None:
+    with app.app_context():
+        daily_task.activate_today()
+
+
+if IMAGE_PREGENERATION_DAYS > 0:
+    scheduler.add_job(
+        pregenerate_images,
+        "interval",
+        seconds=IMAGE_PREGENERATION_INTERVAL_SECONDS,
+        next_run_time=datetime.now(),
+        max_instances=1,
+        coalesce=True,
+    )
+    scheduler.add_job(
+        activate_todays_images, "cron", hour=0, minute=0, timezone=IMAGE_TIMEZONE
+    )
+else:
+    scheduler.add_job(
+        daily_image_generation, "cron", hour=0, minute=1, timezone=IMAGE_TIMEZONE
+    )
+
+
+# Job queue
+# with JOB_QUEUE_ENABLED the queued jobs run on threads in this process, so
+# the queue needs no dyno of its own. server.workers.job_worker runs the
+# same thing standalone, for scaling out past one worker.
+def start_job_worker() -> JobWorker:
+    with app.app_context():
+        job_queue = JobQueue(DBAccessor())
+    job_worker = JobWorker(job_queue, daily_task.JOB_HANDLERS, app=app)
+    job_worker.start()
+    return job_worker
+
+
+if __name__ == "__main__":
+    logger.info("Starting worker scheduler")
+    start_metrics_server(METRICS_PORT)
+    if JOB_QUEUE_ENABLED:
+        logger.info("Starting job worker threads")
+        start_job_worker()
+    scheduler.start()
@@ -1,7 +1,25 @@
 import pytest
 import requests
-from unittest.mock import patch
-from facades.cmc_facade import get_btc_price, CMCApiError, CMCConnectionError, CMCResponseError
+from unittest.mock import MagicMock, patch
+from facades import cmc_facade
+from facades.cmc_facade import (
+    get_btc_price,
+    get_cmc_health,
+    CircuitBreaker,
+    CMCApiError,
+    CMCCircuitOpenError,
+    CMCConnectionError,
+    CMCResponseError,
+)
+
+@pytest.fixture(autouse=True)
+def reset_cmc(monkeypatch):
+    monkeypatch.setenv("CMC_API_KEY", "test-key")
+    # No real sleeping between retries
+    monkeypatch.setattr(cmc_facade, "CMC_BACKOFF_BASE_SECONDS", 0)
+    cmc_facade.reset_cmc_state()
+    yield
+    cmc_facade.reset_cmc_state()
 
 @pytest.fixture
 def mock_btc_response():
@@ -17,35 +35,110 @@ def mock_btc_response():
         }
     }
 
-def test_get_btc_price_success(mock_btc_response):
-    with patch('requests.get') as mock_get:
-        mock_get.return_value.json.return_value = mock_btc_response
-        price = get_btc_price()
-        assert price == 45000.00
-        mock_get.assert_called_once()
+@pytest.fixture
+def mock_session():
+    session = MagicMock()
+    with patch('facades.cmc_facade.get_session', return_value=session):
+        yield session
 
-def test_get_btc_price_connection_error():
-    with patch('facades.cmc_facade.requests.get') as mock_get:
-        mock_get.side_effect = requests.exceptions.ConnectionError()
-        with pytest.raises(CMCConnectionError):
-            get_btc_price()
+def ok_response(data):
+    response = MagicMock(status_code=200)
+    response.json.return_value = data
+    return response
 
-def test_get_btc_price_timeout():
-    with patch('facades.cmc_facade.requests.get') as mock_get:
-        mock_get.side_effect = requests.exceptions.Timeout()
-        with pytest.raises(CMCConnectionError):
-            get_btc_price()
+def test_get_btc_price_success(mock_session, mock_btc_response):
+    mock_session.get.return_value = ok_response(mock_btc_response)
+    price = get_btc_price()
+    assert price == 45000.00
+    mock_session.get.assert_called_once()
 
-def test_get_btc_price_invalid_response():
-    with patch('facades.cmc_facade.requests.get') as mock_get:
-        mock_get.return_value.status_code = 200
-        mock_get.return_value.json.return_value = {"data": {}}
-        mock_get.return_value.raise_for_status.return_value = None
-        # Change the expected error message to match the actual one
-        with pytest.raises(CMCResponseError, match="Invalid API response structure"):
-            get_btc_price()
+def test_session_is_reused():
+    assert cmc_facade.get_session() is cmc_facade.get_session()
+
+def test_get_btc_price_connection_error(mock_session):
+    mock_session.get.side_effect = requests.exceptions.ConnectionError()
+    with pytest.raises(CMCConnectionError):
+        get_btc_price()
+    # First attempt plus the retries
+    assert mock_session.get.call_count == cmc_facade.CMC_MAX_RETRIES + 1
+
+def test_get_btc_price_timeout(mock_session):
+    mock_session.get.side_effect = requests.exceptions.Timeout()
+    with pytest.raises(CMCConnectionError):
+        get_btc_price()
+
+def test_retries_transient_failure(mock_session, mock_btc_response):
+    mock_session.get.side_effect = [
+        requests.exceptions.Timeout(),
+        MagicMock(status_code=503),
+        ok_response(mock_btc_response),
+    ]
+    assert get_btc_price() == 45000.00
+    assert get_cmc_health()["retries"] == 2
+    assert get_cmc_health()["state"] == CircuitBreaker.CLOSED
+
+def test_get_btc_price_invalid_response(mock_session):
+    mock_session.get.return_value = ok_response({"data": {}})
+    # Change the expected error message to match the actual one
+    with pytest.raises(CMCResponseError, match="Invalid API response structure"):
+        get_btc_price()
+    # Not worth retrying
+    mock_session.get.assert_called_once()
 
 def test_get_btc_price_missing_api_key():
     with patch.dict('os.environ', clear=True):
         with pytest.raises(CMCApiError):
-            get_btc_price()
\ No newline at end of file
+            get_btc_price()
+
+def test_breaker_opens_and_serves_last_known_price(mock_session, mock_btc_response):
+    mock_session.get.return_value = ok_response(mock_btc_response)
+    assert get_btc_price() == 45000.00
+
+    mock_session.get.reset_mock()
+    mock_session.get.return_value = None
+    mock_session.get.side_effect = requests.exceptions.ConnectionError()
+    for _ in range(cmc_facade.CMC_BREAKER_FAILURE_THRESHOLD):
+        assert get_btc_price() == 45000.00
+    calls = mock_session.get.call_count
+
+    # Open: no call to CMC at all, still the last known price
+    assert get_cmc_health()["state"] == CircuitBreaker.OPEN
+    assert get_btc_price() == 45000.00
+    assert mock_session.get.call_count == calls
+    assert get_cmc_health()["short_circuited"] == 1
+
+    with pytest.raises(CMCCircuitOpenError):
+        get_btc_price(serve_last_known=False)
+
+def test_breaker_open_without_last_known_price_fails_fast(mock_session):
+    mock_session.get.side_effect = requests.exceptions.ConnectionError()
+    for _ in range(cmc_facade.CMC_BREAKER_FAILURE_THRESHOLD):
+        with pytest.raises(CMCConnectionError):
+            get_btc_price()
+
+    with pytest.raises(CMCCircuitOpenError):
+        get_btc_price()
+
+def test_breaker_half_open_probe():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    now[0] = 10.0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Exactly one probe
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    now[0] = 20.0
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
@@ -3,6 +3,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from server.models.base import Base
+from tests.helpers import ThreadSessionAccessor
 
 
 @pytest.fixture(scope="function")
@@ -27,3 +28,14 @@ def session(engine):
     session.close()
     transaction.rollback()
     connection.close()
+
+
+@pytest.fixture(scope="function")
+def thread_db(tmp_path):
+    # A file database, so sessions on different threads see each other's commits
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(bind=engine)
+    accessor = ThreadSessionAccessor(engine)
+    yield accessor
+    accessor.session.remove()
+    engine.dispose()
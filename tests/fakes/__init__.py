@@ -0,0 +1,103 @@
+"""
+Fake backends for running the pipeline and the page with no network.
+
+- FakeOpenAIServer: a local OpenAI-compatible server (chat, images and the
+  image downloads). It can replay a Cassette recorded from live calls with
+  RecordingTransport.
+- FakeCMCServer: CoinMarketCap's quotes endpoint.
+- FakeS3: an in-process S3, kept in memory or in a directory.
+
+Every fake takes a FaultInjector for latency and errors. OfflineBackends
+starts all three and points the app's clients at them:
+
+    with OfflineBackends(openai_faults=FaultInjector(latency_seconds=2)) as b:
+        DailyImageGenerator(b.openai_client(), b.s3_client, db_accessor)...
+        app.test_client().get("/")
+
+`python -m tests.fakes` serves the OpenAI and CMC stubs for a manual run.
+"""
+
+import os
+from contextlib import ExitStack
+from typing import Optional
+from unittest.mock import patch
+
+from openai import OpenAI
+
+from tests.fakes.cmc_server import FakeCMCServer
+from tests.fakes.openai_server import Cassette, FakeOpenAIServer, RecordingTransport
+from tests.fakes.s3 import FakeS3
+from tests.fakes.stub_server import FaultInjector
+
+__all__ = [
+    "Cassette",
+    "FakeCMCServer",
+    "FakeOpenAIServer",
+    "FakeS3",
+    "FaultInjector",
+    "OfflineBackends",
+    "RecordingTransport",
+]
+
+
+class OfflineBackends:
+    def __init__(
+        self,
+        openai_faults: Optional[FaultInjector] = None,
+        cmc_faults: Optional[FaultInjector] = None,
+        s3_faults: Optional[FaultInjector] = None,
+        btc_price: float = 101000.0,
+        s3_root: Optional[str] = None,
+        cassette: Optional[Cassette] = None,
+        image_bytes: int = 256 * 1024,
+    ):
+        self.openai = FakeOpenAIServer(
+            openai_faults, cassette=cassette, image_bytes=image_bytes
+        )
+        self.cmc = FakeCMCServer(btc_price, cmc_faults)
+        self.s3 = FakeS3(root=s3_root, faults=s3_faults)
+        self._stack = ExitStack()
+
+    def __enter__(self) -> "OfflineBackends":
+        # Imported here: the app modules read their config on import.
+        from facades import cmc_facade, price_cache
+        from server import s3_client as s3_module
+        from server.s3_client import S3ClientFactory
+
+        stack = self._stack
+        stack.enter_context(self.openai)
+        stack.enter_context(self.cmc)
+        stack.enter_context(
+            patch.dict(os.environ, {"CMC_API_KEY": os.getenv("CMC_API_KEY", "offline")})
+        )
+        stack.enter_context(
+            patch.object(cmc_facade, "CMC_QUOTES_URL", self.cmc.quotes_url)
+        )
+        # No quote left over from before, in this process or the breaker.
+        stack.enter_context(patch.object(price_cache, "_default_cache", None))
+        cmc_facade.reset_cmc_state()
+        stack.callback(cmc_facade.reset_cmc_state)
+
+        stack.enter_context(patch.object(s3_module, "AWS_S3_BUCKET", self.s3.bucket))
+        self.s3_client = S3ClientFactory()
+        stack.enter_context(
+            patch.object(self.s3_client, "_s3_client", self.s3.client())
+        )
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stack.close()
+
+    def openai_client(self, **kwargs):
+        """An OpenAIClient talking to the fake server, uncached by default."""
+        from openai_files.openai_client import OpenAIClient
+        from openai_files.rate_limiter import RateLimiter
+
+        kwargs.setdefault("use_cache", False)
+        kwargs.setdefault("rate_limiter", RateLimiter())
+        return OpenAIClient(
+            client=OpenAI(
+                base_url=self.openai.url + "/v1", api_key="offline", max_retries=0
+            ),
+            **kwargs,
+        )
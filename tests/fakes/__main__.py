@@ -0,0 +1,54 @@
+"""
+Serve the fake OpenAI and CMC backends until interrupted.
+
+    python -m tests.fakes --latency-ms 2000 --error-rate 0.1
+
+then run the app or a worker with the printed environment, e.g.
+
+    OPENAI_BASE_URL=... CMC_API_URL=... python -m server.workers.daily_task
+
+S3 has no server here; FakeS3 patches boto3 in-process (see OfflineBackends).
+"""
+
+import argparse
+import time
+
+from tests.fakes.cmc_server import FakeCMCServer
+from tests.fakes.openai_server import Cassette, FakeOpenAIServer
+from tests.fakes.stub_server import FaultInjector
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--btc-price", type=float, default=101000.0)
+    parser.add_argument("--cassette", help="replay recorded OpenAI responses")
+    args = parser.parse_args()
+
+    def faults():
+        return FaultInjector(
+            latency_seconds=args.latency_ms / 1000,
+            jitter_seconds=args.jitter_ms / 1000,
+            error_rate=args.error_rate,
+        )
+
+    cassette = Cassette(args.cassette) if args.cassette else None
+    with FakeOpenAIServer(faults(), cassette=cassette) as openai, FakeCMCServer(
+        args.btc_price, faults()
+    ) as cmc:
+        print(f"OPENAI_BASE_URL={openai.url}/v1")
+        print("OPENAI_API_KEY=offline")
+        print("OPENAI_CACHE_ENABLED=true")
+        print(f"CMC_API_URL={cmc.url}")
+        print("CMC_API_KEY=offline")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
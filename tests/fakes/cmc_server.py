@@ -0,0 +1,43 @@
+from typing import Optional
+
+from tests.fakes.stub_server import (
+    FaultInjector,
+    StubRequest,
+    StubResponse,
+    StubServer,
+)
+
+QUOTES_PATH = "/v2/cryptocurrency/quotes/latest"
+
+
+class FakeCMCServer(StubServer):
+    """
+    CoinMarketCap's BTC quote endpoint. Point the facade at it with
+    CMC_API_URL=server.url (or by patching cmc_facade.CMC_QUOTES_URL).
+    """
+
+    def __init__(self, price: float = 101000.0, faults: Optional[FaultInjector] = None):
+        super().__init__(faults)
+        self.price = price
+
+    @property
+    def quotes_url(self) -> str:
+        return self.url + QUOTES_PATH
+
+    def handle(self, request: StubRequest) -> StubResponse:
+        if request.path != QUOTES_PATH:
+            return StubResponse.json(404, {"status": {"error_code": 404}})
+        if not request.headers.get("X-CMC_PRO_API_KEY"):
+            return StubResponse.json(401, {"status": {"error_code": 1002}})
+        symbol = request.query.get("symbol", ["BTC"])[0]
+        return StubResponse.json(
+            200,
+            {
+                "status": {"error_code": 0},
+                "data": {
+                    symbol: [
+                        {"symbol": symbol, "quote": {"USD": {"price": self.price}}}
+                    ]
+                },
+            },
+        )
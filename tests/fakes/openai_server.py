@@ -0,0 +1,188 @@
+import copy
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import httpx
+
+from tests.fakes.stub_server import (
+    FaultInjector,
+    StubRequest,
+    StubResponse,
+    StubServer,
+)
+
+DEFAULT_HOLIDAYS = "Pizza Day - Eat pizza\nCat Day - Pet a cat"
+RECORDED_PATHS = ("/v1/chat/completions", "/v1/images/generations")
+# A fake image is the PNG signature followed by random bytes.
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+
+def endpoint(path: str) -> Optional[str]:
+    """The recorded endpoint a request path is for, whatever the base URL."""
+    for recorded in RECORDED_PATHS:
+        if path.endswith(recorded.removeprefix("/v1")):
+            return recorded
+    return None
+
+
+def request_key(path: str, body: bytes) -> str:
+    """What a recorded response is looked up by: the endpoint and payload."""
+    try:
+        payload = json.dumps(json.loads(body or b"{}"), sort_keys=True)
+    except ValueError:
+        payload = body.decode(errors="replace")
+    return hashlib.sha256(f"{path}\n{payload}".encode()).hexdigest()
+
+
+class Cassette:
+    """Recorded OpenAI responses, kept in a JSON file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.responses: dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.responses = json.load(f)
+
+    def lookup(self, path: str, body: bytes) -> Optional[dict]:
+        return self.responses.get(request_key(path, body))
+
+    def record(self, path: str, body: bytes, status: int, response: bytes) -> None:
+        with self._lock:
+            self.responses[request_key(path, body)] = {
+                "status": status,
+                "body": json.loads(response),
+            }
+            with open(self.path, "w") as f:
+                json.dump(self.responses, f, indent=2, sort_keys=True)
+
+
+class RecordingTransport(httpx.BaseTransport):
+    """
+    Wraps the transport an OpenAI client sends through and saves every
+    chat and image response to a cassette, so a live run can be replayed
+    later by FakeOpenAIServer:
+
+        transport = RecordingTransport(httpx.HTTPTransport(), Cassette(path))
+        OpenAI(http_client=httpx.Client(transport=transport))
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, cassette: Cassette):
+        self.transport = transport
+        self.cassette = cassette
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        response = self.transport.handle_request(request)
+        path = endpoint(request.url.path)
+        if path is not None and response.status_code == 200:
+            body = response.read()
+            self.cassette.record(path, request.content, response.status_code, body)
+        return response
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class FakeOpenAIServer(StubServer):
+    """
+    Speaks enough of the OpenAI API for OpenAIClient: chat completions,
+    image generations, and the generated images themselves. Point a client
+    at it with OpenAI(base_url=server.url + "/v1").
+
+    With a cassette, recorded answers are replayed for matching requests.
+    Recorded image URLs are swapped for the server's own, because OpenAI's
+    expire an hour after generation.
+    """
+
+    def __init__(
+        self,
+        faults: Optional[FaultInjector] = None,
+        holidays: str = DEFAULT_HOLIDAYS,
+        image_bytes: int = 256 * 1024,
+        cassette: Optional[Cassette] = None,
+    ):
+        super().__init__(faults)
+        self.holidays = holidays
+        self.image = PNG_HEADER + os.urandom(image_bytes - len(PNG_HEADER))
+        self.cassette = cassette
+        self._image_ids = itertools.count(1)
+
+    def handle(self, request: StubRequest) -> StubResponse:
+        if request.method == "GET" and request.path.startswith("/images/"):
+            return StubResponse(200, self.image, {"Content-Type": "image/png"})
+        if request.method != "POST" or request.path not in RECORDED_PATHS:
+            return StubResponse.json(404, {"error": {"message": "not found"}})
+
+        recorded = self.cassette and self.cassette.lookup(request.path, request.body)
+        if recorded:
+            body = copy.deepcopy(recorded["body"])
+            if request.path.endswith("/generations"):
+                for image in body.get("data", []):
+                    image["url"] = self._image_url()
+            return StubResponse.json(recorded["status"], body, self._limit_headers())
+
+        if request.path.endswith("/completions"):
+            body = self._completion(request.json())
+        else:
+            body = {"created": int(time.time()), "data": [{"url": self._image_url()}]}
+        return StubResponse.json(200, body, self._limit_headers())
+
+    def error_response(self, status: int) -> StubResponse:
+        error = {"message": "injected fault", "type": "server_error", "code": None}
+        headers = {"retry-after-ms": "0"} if status == 429 else {}
+        return StubResponse.json(status, {"error": error}, headers)
+
+    @property
+    def chat_requests(self) -> list[StubRequest]:
+        return [r for r in self.requests if r.path == "/v1/chat/completions"]
+
+    @property
+    def image_requests(self) -> list[StubRequest]:
+        return [r for r in self.requests if r.path == "/v1/images/generations"]
+
+    def _completion(self, payload: dict) -> dict:
+        prompt_tokens = sum(
+            len(str(message.get("content", ""))) // 4
+            for message in payload.get("messages", [])
+        )
+        completion_tokens = len(self.holidays) // 4
+        return {
+            "id": f"chatcmpl-fake-{len(self.requests)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "gpt-4o-mini"),
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": self.holidays},
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def _image_url(self) -> str:
+        # Signed like OpenAI's, with the expiry in the `se` parameter.
+        expiry = datetime.now(timezone.utc) + timedelta(hours=1)
+        return (
+            f"{self.url}/images/{next(self._image_ids)}.png"
+            f"?se={expiry:%Y-%m-%dT%H:%M:%SZ}"
+        )
+
+    @staticmethod
+    def _limit_headers() -> dict:
+        return {
+            "x-ratelimit-remaining-requests": "10000",
+            "x-ratelimit-remaining-tokens": "10000000",
+        }
@@ -0,0 +1,176 @@
+import base64
+import hashlib
+import os
+import threading
+from collections.abc import MutableMapping
+from typing import Callable, Iterator, Optional
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+import boto3
+from botocore.awsrequest import AWSResponse
+
+from tests.fakes.stub_server import FaultInjector
+
+
+def sha256_b64(body: bytes) -> str:
+    return base64.b64encode(hashlib.sha256(body).digest()).decode()
+
+
+class FakeRaw:
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+class DirectoryObjects(MutableMapping):
+    """Object bodies as files under root, one per key."""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, quote(key, safe=""))
+
+    def __getitem__(self, key: str) -> bytes:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: str, body: bytes) -> None:
+        with open(self._path(key), "wb") as f:
+            f.write(body)
+
+    def __delitem__(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            raise KeyError(key) from None
+
+    def __iter__(self) -> Iterator[str]:
+        return (unquote(name) for name in sorted(os.listdir(self.root)))
+
+    def __len__(self) -> int:
+        return len(os.listdir(self.root))
+
+
+class FakeS3:
+    """
+    Answers boto3's S3 requests via the before-send hook, so the real
+    s3transfer multipart machinery runs with no network. Like S3, it
+    rejects any part whose x-amz-checksum-sha256 doesn't match its body.
+
+    Objects are kept in memory, or as files under `root` so a run's
+    uploads can be inspected afterwards. Faults apply to every request.
+    HEAD reports each object's ChecksumSHA256 as S3 does (a checksum of
+    the part checksums for multipart uploads); set `corrupt` to change
+    what gets stored after the part checks pass.
+    """
+
+    def __init__(
+        self,
+        bucket: str = "test-bucket",
+        root: Optional[str] = None,
+        faults: Optional[FaultInjector] = None,
+    ):
+        self.bucket = bucket
+        self.objects: MutableMapping = DirectoryObjects(root) if root else {}
+        self.faults = faults or FaultInjector()
+        self.uploads: dict[str, dict[int, bytes]] = {}
+        self.part_sizes: list[int] = []
+        self.checksums: dict[str, str] = {}
+        self.corrupt: Optional[Callable[[bytes], bytes]] = None
+        self.lock = threading.Lock()
+
+    def client(self):
+        """A boto3 S3 client whose requests this fake answers."""
+        client = boto3.client(
+            "s3",
+            region_name="us-east-1",
+            aws_access_key_id="test",
+            aws_secret_access_key="test",
+            endpoint_url="http://s3.test",
+            config=boto3.session.Config(s3={"addressing_style": "path"}),
+        )
+        client.meta.events.register("before-send.s3", self)
+        return client
+
+    def __call__(self, request, **kwargs):
+        status = self.faults()
+        if status is not None:
+            return self.response(status, b"<Error><Code>InternalError</Code></Error>")
+
+        url = urlparse(request.url)
+        key = unquote(url.path.split("/", 2)[2])
+        query = parse_qs(url.query, keep_blank_values=True)
+        body = request.body or b""
+        if hasattr(body, "read"):
+            body = body.read()
+
+        if request.method in ("PUT",) and body:
+            checksum = request.headers.get("x-amz-checksum-sha256")
+            if isinstance(checksum, bytes):
+                checksum = checksum.decode()
+            expected = base64.b64encode(hashlib.sha256(body).digest()).decode()
+            if checksum is not None and checksum != expected:
+                return self.response(400, b"<Error><Code>BadDigest</Code></Error>")
+
+        with self.lock:
+            if request.method == "POST" and "uploads" in query:
+                upload_id = f"upload-{len(self.uploads)}"
+                self.uploads[upload_id] = {}
+                return self.response(
+                    200,
+                    f"<InitiateMultipartUploadResult><Bucket>{self.bucket}</Bucket>"
+                    f"<Key>{key}</Key><UploadId>{upload_id}</UploadId>"
+                    f"</InitiateMultipartUploadResult>".encode(),
+                )
+            if request.method == "PUT" and "partNumber" in query:
+                part = int(query["partNumber"][0])
+                self.uploads[query["uploadId"][0]][part] = body
+                self.part_sizes.append(len(body))
+                return self.response(200, b"", {"ETag": f'"part-{part}"'})
+            if request.method == "POST" and "uploadId" in query:
+                parts = self.uploads.pop(query["uploadId"][0])
+                bodies = [self._stored(parts[n]) for n in sorted(parts)]
+                self.objects[key] = b"".join(bodies)
+                combined = b"".join(hashlib.sha256(part).digest() for part in bodies)
+                self.checksums[key] = f"{sha256_b64(combined)}-{len(bodies)}"
+                return self.response(
+                    200,
+                    f"<CompleteMultipartUploadResult><Key>{key}</Key>"
+                    f"<ETag>\"done\"</ETag></CompleteMultipartUploadResult>".encode(),
+                )
+            if request.method == "PUT":
+                stored = self._stored(body)
+                self.objects[key] = stored
+                self.checksums[key] = sha256_b64(stored)
+                self.part_sizes.append(len(body))
+                return self.response(200, b"", {"ETag": '"whole"'})
+            if request.method == "DELETE":
+                self.objects.pop(key, None)
+                self.checksums.pop(key, None)
+                return self.response(204, b"")
+            if request.method in ("HEAD", "GET"):
+                if key not in self.objects:
+                    return self.response(404, b"<Error><Code>NoSuchKey</Code></Error>")
+                stored = self.objects[key]
+                headers = {"Content-Length": str(len(stored))}
+                checksum_mode = request.headers.get("x-amz-checksum-mode")
+                if checksum_mode in ("ENABLED", b"ENABLED"):
+                    headers["x-amz-checksum-sha256"] = self.checksums[key]
+                return self.response(
+                    200, stored if request.method == "GET" else b"", headers
+                )
+        raise AssertionError(f"unexpected S3 request {request.method} {request.url}")
+
+    def _stored(self, body: bytes) -> bytes:
+        return self.corrupt(body) if self.corrupt else body
+
+    @staticmethod
+    def response(status, body, headers=None):
+        return AWSResponse("http://fake", status, headers or {}, FakeRaw(body))
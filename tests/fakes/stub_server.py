@@ -0,0 +1,156 @@
+import http.server
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+
+class FaultInjector:
+    """
+    Latency and errors for a fake backend. Every call sleeps latency (plus
+    up to jitter) and then fails with error_status at error_rate. Use
+    fail_next() for failures that need to happen at a known point.
+    """
+
+    def __init__(
+        self,
+        latency_seconds: float = 0.0,
+        jitter_seconds: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 500,
+        seed: Optional[int] = None,
+    ):
+        self.latency_seconds = latency_seconds
+        self.jitter_seconds = jitter_seconds
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._random = random.Random(seed)
+        self._queued: list[int] = []
+        self._lock = threading.Lock()
+
+    def fail_next(self, count: int = 1, status: Optional[int] = None) -> None:
+        with self._lock:
+            self._queued.extend([status or self.error_status] * count)
+
+    def __call__(self) -> Optional[int]:
+        """Apply the latency; return a status to fail with, or None."""
+        with self._lock:
+            delay = self.latency_seconds
+            if self.jitter_seconds:
+                delay += self._random.uniform(0, self.jitter_seconds)
+            if self._queued:
+                status: Optional[int] = self._queued.pop(0)
+            elif self.error_rate and self._random.random() < self.error_rate:
+                status = self.error_status
+            else:
+                status = None
+        if delay:
+            time.sleep(delay)
+        return status
+
+
+@dataclass
+class StubRequest:
+    method: str
+    path: str
+    query: dict
+    headers: dict
+    body: bytes
+
+    def json(self):
+        return json.loads(self.body or b"{}")
+
+
+@dataclass
+class StubResponse:
+    status: int
+    body: bytes = b""
+    headers: dict = field(default_factory=dict)
+
+    @classmethod
+    def json(cls, status: int, data, headers: Optional[dict] = None):
+        return cls(
+            status,
+            json.dumps(data).encode(),
+            {"Content-Type": "application/json", **(headers or {})},
+        )
+
+
+class StubServer:
+    """
+    A local HTTP server on a free port, run on a daemon thread. Subclasses
+    implement handle(); faults are applied to every request first.
+    """
+
+    def __init__(self, faults: Optional[FaultInjector] = None):
+        self.faults = faults or FaultInjector()
+        self.requests: list[StubRequest] = []
+        self._server: Optional[http.server.ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        assert self._server is not None, "server not started"
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _dispatch(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                url = urlparse(self.path)
+                request = StubRequest(
+                    method=self.command,
+                    path=url.path,
+                    query=parse_qs(url.query),
+                    headers=dict(self.headers),
+                    body=self.rfile.read(length) if length else b"",
+                )
+                stub.requests.append(request)
+                status = stub.faults()
+                if status is not None:
+                    response = stub.error_response(status)
+                else:
+                    response = stub.handle(request)
+                self.send_response(response.status)
+                for name, value in response.headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(response.body)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(response.body)
+
+            do_GET = do_POST = do_PUT = do_HEAD = _dispatch
+
+            def log_message(self, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(
+            target=self._server.serve_forever, args=(0.05,), daemon=True
+        ).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def handle(self, request: StubRequest) -> StubResponse:
+        raise NotImplementedError
+
+    def error_response(self, status: int) -> StubResponse:
+        return StubResponse.json(status, {"error": "injected fault"})
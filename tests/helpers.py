@@ -0,0 +1,55 @@
+from contextlib import contextmanager
+from unittest.mock import MagicMock
+
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+
+class SessionAccessor:
+    """Stand-in for DBAccessor that commits to the test session."""
+
+    def __init__(self, session, fail_writes=False):
+        self.session = session
+        self.fail_writes = fail_writes
+
+    @contextmanager
+    def session_scope(self):
+        if self.fail_writes:
+            raise RuntimeError("database unavailable")
+        yield self.session
+        self.session.commit()
+
+
+class ThreadSessionAccessor:
+    """Like DBAccessor under an app context per thread: one session per thread."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.session = scoped_session(sessionmaker(bind=engine))
+
+    @contextmanager
+    def session_scope(self):
+        session = self.session()
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+
+
+class FakeS3Factory:
+    """Signs locally like boto3 would; counts client lookups."""
+
+    def __init__(self):
+        self.client = MagicMock()
+        self.client.generate_presigned_url.side_effect = (
+            lambda op, Params, ExpiresIn: f"https://s3/{Params['Key']}?sig={self.signed}"
+        )
+        self.signed = 0
+        self.lookups = 0
+
+    def call_with_refresh(self, operation):
+        self.lookups += 1
+        result = operation(self.client)
+        self.signed += 1
+        return result
@@ -1,10 +1,18 @@
+from datetime import datetime
+from unittest.mock import patch
+
 import pytest
 from app import create_app
+from facades.cmc_facade import CMCApiError
+from extensions import db
+from server.models import Base, BitcoinPrice
+from server.page_state import page_state_cache
 
 @pytest.fixture
 def client():
     app = create_app()
     app.config['TESTING'] = True
+    page_state_cache.invalidate()
     with app.test_client() as client:
         yield client
 
@@ -12,3 +20,89 @@ def test_home_page(client):
     response = client.get('/')
     assert response.status_code == 200
     assert b"BTC 100K LOL" in response.data
+
+def test_home_page_uses_polled_price(client, monkeypatch):
+    monkeypatch.setenv("CMC_API_KEY", "test-key")
+    with client.application.app_context():
+        Base.metadata.create_all(db.engine)
+        db.session.add(BitcoinPrice(price=123456.78, quoted_at=datetime.now()))
+        db.session.commit()
+
+    with patch("app.get_cached_btc_price") as mock_cached_price:
+        response = client.get('/')
+
+    assert response.status_code == 200
+    assert b"$123,456.78" in response.data
+    mock_cached_price.assert_not_called()
+
+
+def test_home_page_conditional_get(client, monkeypatch):
+    monkeypatch.setenv("CMC_API_KEY", "test-key")
+    with patch("app.get_latest_btc_price", return_value=95000.0):
+        first = client.get('/')
+        etag = first.headers["ETag"]
+        assert "max-age" in first.headers["Cache-Control"]
+        assert first.headers["Last-Modified"]
+
+        revalidated = client.get('/', headers={"If-None-Match": etag})
+        assert revalidated.status_code == 304
+        assert revalidated.data == b""
+
+    with patch("app.get_latest_btc_price", return_value=96000.0):
+        changed = client.get('/', headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["ETag"] != etag
+
+
+def test_api_state(client, monkeypatch):
+    monkeypatch.setenv("CMC_API_KEY", "test-key")
+    with patch("app.get_latest_btc_price", return_value=101000.0):
+        response = client.get('/api/state')
+
+    assert response.status_code == 200
+    state = response.get_json()
+    assert state["price"] == 101000.0
+    assert state["is_above_100k"] is True
+    assert state["holidays"] == []
+    assert response.headers["ETag"]
+
+
+def test_api_state_price_unavailable(client, monkeypatch):
+    monkeypatch.setenv("CMC_API_KEY", "test-key")
+    with patch("app.get_latest_btc_price", side_effect=CMCApiError("down")):
+        response = client.get('/api/state')
+
+    assert response.status_code == 503
+
+
+def test_page_polls_when_stream_disabled(client, monkeypatch):
+    monkeypatch.setenv("CMC_API_KEY", "test-key")
+    with patch("app.get_latest_btc_price", return_value=95000.0):
+        page = client.get('/')
+
+    assert b"if (false && window.EventSource)" in page.data
+    assert client.get('/api/stream').status_code == 204
+
+
+def test_api_stream_shares_one_state_build(client):
+    client.application.config["STATE_STREAM_ENABLED"] = True
+    calls = []
+
+    def fake_context():
+        calls.append(1)
+        return {"price": 101000.0}
+
+    with patch("app.build_home_context", side_effect=fake_context):
+        streams = [client.get('/api/stream', buffered=False) for _ in range(5)]
+        first_events = []
+        for response in streams:
+            assert response.mimetype == "text/event-stream"
+            chunks = iter(response.response)
+            next(chunks)  # retry:
+            first_events.append(next(chunks))
+        for response in streams:
+            response.close()
+
+    assert set(first_events) == {b'event: state\ndata: {"price": 101000.0}\n\n'}
+    # Polled once (or so) for all five streams rather than once per stream.
+    assert len(calls) < 5
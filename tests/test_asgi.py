@@ -0,0 +1,203 @@
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+
+from asgi import AsyncApp
+from app import create_app
+from config import Config
+from facades.cmc_facade import CMCConnectionError
+from openai_files.utils import PromptType
+from server.async_db import async_session, dispose_async_engine, get_async_engine
+from server.models import Base, BitcoinPrice, DailyImageVersion, ImageLink, Prompt
+from server.models.utils import TaskStatus
+from server.page_state import PageStateCache, page_state_cache
+
+
+@pytest.fixture
+def asgi_app(monkeypatch):
+    monkeypatch.setenv("CMC_API_KEY", "test-key")
+    monkeypatch.setattr(Config, "SQLALCHEMY_DATABASE_URI", "sqlite://")
+    page_state_cache.invalidate()
+    return AsyncApp(create_app())
+
+
+async def seed(price=None, sad_image_url=None):
+    async with get_async_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with async_session() as session:
+        if price is not None:
+            session.add(BitcoinPrice(price=price, quoted_at=datetime.now()))
+        if sad_image_url is not None:
+            prompt = Prompt(
+                prompt_text="image prompt",
+                prompt_date=datetime.now().date(),
+                prompt_type=PromptType.GENERATE_IMAGE_SAD,
+                status=TaskStatus.COMPLETED,
+            )
+            session.add(
+                DailyImageVersion(
+                    image_link=ImageLink(
+                        prompt=prompt,
+                        openai_image_url="https://openai.com/sad.png",
+                        status=TaskStatus.COMPLETED,
+                    ),
+                    prompt_type=PromptType.GENERATE_IMAGE_SAD,
+                    prompt_date=datetime.now().date(),
+                    presigned_url=sad_image_url,
+                    presigned_url_expiry=datetime.now() + timedelta(hours=1),
+                    is_active=True,
+                    status=TaskStatus.COMPLETED,
+                )
+            )
+        await session.commit()
+
+
+def run(app, requests, seed_kwargs=None):
+    """Seed the async engine's database, then issue requests on one loop."""
+
+    async def main():
+        try:
+            if seed_kwargs is not None:
+                await seed(**seed_kwargs)
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://testserver"
+            ) as client:
+                return await requests(client)
+        finally:
+            # The engine's connections belong to this event loop.
+            await dispose_async_engine()
+
+    return asyncio.run(main())
+
+
+def test_home_served_from_async_reads(asgi_app):
+    async def requests(client):
+        response = await client.get("/")
+        revalidated = await client.get(
+            "/", headers={"If-None-Match": response.headers["ETag"]}
+        )
+        return response, revalidated
+
+    with patch("asgi.get_cached_btc_price_async", AsyncMock()) as mock_cached_price:
+        response, revalidated = run(
+            asgi_app,
+            requests,
+            {"price": 95000.0, "sad_image_url": "https://s3/sad.png"},
+        )
+
+    assert response.status_code == 200
+    assert b"$95,000.00" in response.content
+    assert b"https://s3/sad.png" in response.content
+    assert b"/static/css/styles.css" in response.content
+    assert revalidated.status_code == 304
+    mock_cached_price.assert_not_called()
+
+
+def test_api_state_served_from_async_reads(asgi_app):
+    async def requests(client):
+        return await client.get("/api/state")
+
+    with patch("asgi.get_cached_btc_price_async", AsyncMock()) as mock_cached_price:
+        response = run(
+            asgi_app, requests, {"price": 95000.0, "sad_image_url": "https://s3/sad.png"}
+        )
+
+    assert response.status_code == 200
+    assert response.json()["price"] == 95000.0
+    assert response.json()["image_url"] == "https://s3/sad.png"
+    mock_cached_price.assert_not_called()
+
+
+def test_concurrent_requests_never_use_sync_session(asgi_app):
+    async def requests(client):
+        await client.get("/api/state")
+        # Make the snapshot due so one coroutine refreshes while the rest
+        # are served the previous snapshot.
+        page_state_cache._recheck_at = 0.0
+        return await asyncio.gather(*(client.get("/api/state") for _ in range(20)))
+
+    with patch.object(
+        PageStateCache, "_refresh", side_effect=AssertionError("sync refresh")
+    ):
+        responses = run(asgi_app, requests, {"price": 95000.0})
+
+    assert [response.status_code for response in responses] == [200] * 20
+
+
+def test_falls_back_to_cmc_without_polled_price(asgi_app):
+    async def requests(client):
+        return await client.get("/api/state")
+
+    with patch(
+        "asgi.get_cached_btc_price_async", AsyncMock(return_value=101000.0)
+    ):
+        response = run(asgi_app, requests, {})
+
+    assert response.json()["is_above_100k"] is True
+
+
+def test_api_state_price_unavailable(asgi_app):
+    async def requests(client):
+        return await client.get("/api/state")
+
+    with patch(
+        "asgi.get_cached_btc_price_async",
+        AsyncMock(side_effect=CMCConnectionError("down")),
+    ):
+        response = run(asgi_app, requests, {})
+
+    assert response.status_code == 503
+
+
+def test_other_routes_fall_through_to_flask(asgi_app):
+    async def requests(client):
+        return await client.get("/health")
+
+    response = run(asgi_app, requests)
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "healthy"
+
+
+def test_stream_served_on_event_loop(asgi_app):
+    async def requests(client):
+        page = await client.get("/")
+
+        # httpx's ASGITransport buffers whole bodies, so talk ASGI directly.
+        messages = []
+        got_event = asyncio.Event()
+
+        async def receive():
+            await got_event.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            messages.append(message)
+            if b"event: state" in message.get("body", b""):
+                got_event.set()
+
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/api/stream",
+            "headers": [],
+            "query_string": b"",
+        }
+        await asyncio.wait_for(asgi_app(scope, receive, send), timeout=5)
+        return page, messages
+
+    page, messages = run(asgi_app, requests, {"price": 95000.0})
+
+    assert b"if (true && window.EventSource)" in page.content
+    start, retry, event = messages
+    assert start["status"] == 200
+    assert (b"content-type", b"text/event-stream; charset=utf-8") in start["headers"]
+    assert retry["body"] == b"retry: 5000\n\n"
+    assert event["body"].startswith(b"event: state\n")
+    assert b'"price": 95000.0' in event["body"]
+    assert asgi_app.state_publisher.subscribers == 0
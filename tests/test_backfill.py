@@ -0,0 +1,86 @@
+import threading
+import time
+from datetime import date
+
+from server.backfill import Backfill, date_range
+
+START = date(2026, 1, 30)
+
+
+def test_date_range_includes_both_ends():
+    assert date_range(START, date(2026, 2, 2)) == [
+        date(2026, 1, 30),
+        date(2026, 1, 31),
+        date(2026, 2, 1),
+        date(2026, 2, 2),
+    ]
+    assert date_range(START, START) == [START]
+
+
+def test_runs_dates_with_bounded_parallelism():
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def generate_day(day):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.02)
+        with lock:
+            running -= 1
+
+    dates = date_range(START, date(2026, 2, 8))
+    result = Backfill(generate_day, max_workers=3).run(reversed(dates))
+
+    assert result.completed == dates
+    assert result.failed == []
+    assert peak == 3
+
+
+def test_failed_dates_are_reported_not_raised():
+    def generate_day(day):
+        if day.day == 31:
+            raise RuntimeError("openai down")
+
+    result = Backfill(generate_day).run(date_range(START, date(2026, 2, 1)))
+
+    assert result.completed == [date(2026, 1, 30), date(2026, 2, 1)]
+    assert result.failed == [date(2026, 1, 31)]
+
+
+def test_starts_are_spaced_by_min_interval():
+    starts = []
+    lock = threading.Lock()
+
+    def generate_day(day):
+        with lock:
+            starts.append(time.monotonic())
+
+    began = time.monotonic()
+    Backfill(generate_day, max_workers=4, min_interval_seconds=0.05).run(
+        date_range(START, date(2026, 2, 2))
+    )
+
+    # The nth date never starts before its slot; a thread running late
+    # (GC, scheduling) only makes the gaps bigger.
+    starts.sort()
+    assert len(starts) == 4
+    for n, start in enumerate(starts):
+        assert start - began >= n * 0.05 - 0.005
+
+
+def test_stop_skips_dates_not_yet_started():
+    backfill = Backfill(lambda day: backfill.stop(), max_workers=1)
+
+    result = backfill.run(date_range(START, date(2026, 2, 2)))
+
+    assert result.completed == [START]
+    assert result.failed == []
+    assert result.skipped == date_range(date(2026, 1, 31), date(2026, 2, 2))
+
+
+def test_nothing_to_do():
+    result = Backfill(lambda day: None).run([])
+    assert (result.completed, result.failed, result.skipped) == ([], [], [])
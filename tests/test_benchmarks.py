@@ -0,0 +1,41 @@
+from benchmarks import lookup_indexes
+from benchmarks.suite import Result, compare, measure
+
+
+def result(name, median_us):
+    return Result(name, 10, median_us, median_us, median_us)
+
+
+BASELINE = {"cases": {"home": {"median_us": 1000.0}, "parse": {"median_us": 10.0}}}
+
+
+def test_compare_flags_slower_cases():
+    regressions = compare([result("home", 1600.0)], BASELINE, tolerance=0.5)
+    assert regressions == ["home: 1,600us vs baseline 1,000us (+60%)"]
+
+
+def test_compare_allows_noise_and_new_cases():
+    results = [
+        result("home", 1400.0),  # within the tolerance
+        result("parse", 25.0),  # +150%, but only 15us
+        result("new case", 5000.0),  # not in the baseline
+    ]
+    assert compare(results, BASELINE, tolerance=0.5) == []
+
+
+def test_measure_runs_warmup_untimed():
+    calls = []
+    measured = measure(
+        "case", lambda: calls.append("run"), 5, warmup=1, before_each=lambda: None
+    )
+    assert calls == ["run"] * 6
+    assert measured.iterations == 5
+    assert measured.min_us <= measured.median_us <= measured.p95_us
+
+
+def test_lookup_benchmark_times_the_recheck(tmp_path):
+    (row,) = lookup_indexes.run(f"sqlite:///{tmp_path / 'history.db'}", [1], 3)
+
+    assert row["versions"] == 730
+    assert row["recheck indexed"] > 0
+    assert row["recheck unindexed"] > 0
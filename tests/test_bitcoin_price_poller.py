@@ -0,0 +1,42 @@
+import pytest
+
+from server.bitcoin_price_poller import BitcoinPricePoller
+from server.models import BitcoinPrice
+from tests.helpers import SessionAccessor
+
+
+def test_poll_writes_quote(session):
+    poller = BitcoinPricePoller(SessionAccessor(session), fetch_price=lambda: 97000.0)
+
+    assert poller.poll() == 97000.0
+
+    saved = session.query(BitcoinPrice).one()
+    assert saved.price == 97000.0
+    assert saved.quoted_at is not None
+    assert poller.pending == 0
+
+
+def test_failed_flush_keeps_quotes_for_next_batch(session):
+    accessor = SessionAccessor(session, fail_writes=True)
+    prices = iter([97000.0, 98000.0, 99000.0])
+    poller = BitcoinPricePoller(accessor, fetch_price=lambda: next(prices), batch_size=2)
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            poller.poll()
+    assert poller.pending == 2
+
+    accessor.fail_writes = False
+    poller.poll()
+
+    saved = session.query(BitcoinPrice).order_by(BitcoinPrice.quoted_at).all()
+    assert [row.price for row in saved] == [97000.0, 98000.0, 99000.0]
+    assert poller.pending == 0
+
+
+def test_poll_rejects_non_positive_price(session):
+    poller = BitcoinPricePoller(SessionAccessor(session), fetch_price=lambda: 0.0)
+
+    with pytest.raises(ValueError):
+        poller.poll()
+    assert poller.pending == 0
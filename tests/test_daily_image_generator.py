@@ -0,0 +1,267 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import event
+
+from openai_files.utils import PromptType
+from server.daily_image_generator import (
+    DailyImageGenerationError,
+    DailyImageGenerator,
+)
+from server.models import DailyImageVersion, Holiday, ImageLink, PipelineStepStatus
+from server.models.utils import TaskStatus
+from server.pipeline_status import StepStatusRecorder
+from server.unit_of_work import UnitOfWork
+
+IMAGE_SECONDS = 0.3
+SAD = PromptType.GENERATE_IMAGE_SAD
+PROMPT_TYPES = [PromptType.GENERATE_IMAGE_HAPPY, SAD]
+
+
+class FakeOpenAI:
+    def __init__(self, fail_on=None, url_ttl=timedelta(hours=1)):
+        self.fail_on = fail_on
+        self.url_ttl = url_ttl
+        self.threads = set()
+        self.holiday_calls = 0
+        self.image_calls = 0
+
+    def fetch_holiday_list(self, target_date):
+        self.holiday_calls += 1
+        return "- Pizza Day - Eat pizza\n- Cat Day: Pet a cat"
+
+    def fetch_generated_image_url(self, prompt_text):
+        self.threads.add(threading.get_ident())
+        self.image_calls += 1
+        time.sleep(IMAGE_SECONDS)
+        if self.fail_on and self.fail_on in prompt_text:
+            raise RuntimeError("content policy violation")
+        expiry = datetime.now(timezone.utc) + self.url_ttl
+        return f"https://openai/image.png?se={expiry:%Y-%m-%dT%H:%M:%SZ}"
+
+    def generate_unique_file_name(self, file_name, file_type="png"):
+        return f"{file_name}.{file_type}"
+
+
+@pytest.fixture
+def db(thread_db):
+    return thread_db
+
+
+def make_generator(db, openai, max_workers=2, s3_fails_for=None, **kwargs):
+    def save_image_to_s3(url, name):
+        if s3_fails_for and name.startswith(s3_fails_for.value):
+            raise RuntimeError("S3 unavailable")
+        return f"https://bucket.s3.amazonaws.com/{name}"
+
+    s3 = MagicMock()
+    s3.save_image_to_s3.side_effect = save_image_to_s3
+    s3.fetch_presigned_url.side_effect = lambda name, expiry: f"https://s3/{name}?sig"
+    return DailyImageGenerator(openai, s3, db, max_workers=max_workers, **kwargs)
+
+
+def generate(generator):
+    return generator.generate_daily_images(
+        PROMPT_TYPES, datetime(2026, 5, 1), datetime.now() + timedelta(days=1)
+    )
+
+
+def test_prompt_types_generated_concurrently(db):
+    openai = FakeOpenAI()
+
+    start = time.monotonic()
+    versions = generate(make_generator(db, openai))
+    elapsed = time.monotonic() - start
+
+    assert [v.prompt_type for v in versions] == PROMPT_TYPES
+    assert len(openai.threads) == 2
+    # Both images were in flight at once: wall time is about one branch.
+    assert elapsed < 2 * IMAGE_SECONDS
+
+    session = db.session()
+    active = session.query(DailyImageVersion).filter_by(is_active=True).all()
+    assert {v.prompt_type for v in active} == set(PROMPT_TYPES)
+
+
+def test_failed_branch_does_not_lose_the_other(db):
+    openai = FakeOpenAI(fail_on="sad crypto investor")
+
+    with pytest.raises(DailyImageGenerationError) as raised:
+        generate(make_generator(db, openai))
+
+    error = raised.value
+    assert list(error.errors) == [PromptType.GENERATE_IMAGE_SAD]
+    assert [v.prompt_type for v in error.versions] == [PromptType.GENERATE_IMAGE_HAPPY]
+
+    session = db.session()
+    happy = session.query(DailyImageVersion).one()
+    assert happy.prompt_type == PromptType.GENERATE_IMAGE_HAPPY
+    assert happy.status == TaskStatus.COMPLETED
+    assert happy.is_active
+    failed_link = (
+        session.query(ImageLink).filter(ImageLink.status == TaskStatus.FAILED).one()
+    )
+    assert failed_link.openai_image_url == "content policy violation"
+
+
+def test_single_worker_runs_serially(db):
+    openai = FakeOpenAI()
+
+    versions = generate(make_generator(db, openai, max_workers=1))
+
+    assert len(versions) == 2
+    assert openai.threads == {threading.get_ident()}
+
+
+def test_rerun_resumes_from_first_incomplete_step(db):
+    openai = FakeOpenAI()
+    with pytest.raises(DailyImageGenerationError):
+        generate(make_generator(db, openai, s3_fails_for=SAD))
+    assert (openai.holiday_calls, openai.image_calls) == (1, 2)
+
+    generator = make_generator(db, openai)
+    versions = generate(generator)
+
+    # Neither OpenAI call is repeated: the holiday list and both images are
+    # reused, and only the sad image's S3 copy is retried.
+    assert (openai.holiday_calls, openai.image_calls) == (1, 2)
+    saved = generator.s3_client.save_image_to_s3.call_args_list
+    assert [call.args[1] for call in saved] == ["GENERATE_IMAGE_SAD-01-MAY-2026.png"]
+    assert [v.status for v in versions] == [TaskStatus.COMPLETED] * 2
+
+    session = db.session()
+    assert session.query(DailyImageVersion).count() == 2
+    assert {v.prompt_date for v in session.query(DailyImageVersion)} == {
+        datetime(2026, 5, 1).date()
+    }
+
+
+def test_rerun_after_completion_does_no_work(db):
+    openai = FakeOpenAI()
+    first = generate(make_generator(db, openai))
+
+    generator = make_generator(db, openai)
+    second = generate(generator)
+
+    assert [v.id for v in second] == [v.id for v in first]
+    assert (openai.holiday_calls, openai.image_calls) == (1, 2)
+    generator.s3_client.save_image_to_s3.assert_not_called()
+    generator.s3_client.fetch_presigned_url.assert_not_called()
+
+
+def test_expired_openai_url_is_regenerated(db):
+    openai = FakeOpenAI(url_ttl=timedelta(minutes=1))
+    with pytest.raises(DailyImageGenerationError):
+        generate(make_generator(db, openai, s3_fails_for=SAD))
+
+    generate(make_generator(db, openai))
+
+    assert openai.image_calls == 3
+
+
+def count_commits(engine):
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(conn))
+    return commits
+
+
+@pytest.mark.parametrize("batch_writes, expected", [(True, 5), (False, 16)])
+def test_writes_batched_into_few_transactions(db, batch_writes, expected):
+    commits = count_commits(db.engine)
+
+    versions = generate(
+        make_generator(db, FakeOpenAI(), max_workers=1, batch_writes=batch_writes)
+    )
+
+    # Writes plus the lookups that check for an earlier run's rows.
+    reads = 3
+    assert len(commits) - reads == expected
+    assert [v.status for v in versions] == [TaskStatus.COMPLETED] * 2
+    session = db.session()
+    assert session.query(DailyImageVersion).filter_by(is_active=True).count() == 2
+
+
+def test_batched_failure_is_still_recorded(db):
+    openai = FakeOpenAI(fail_on="sad crypto investor")
+
+    with pytest.raises(DailyImageGenerationError):
+        generate(make_generator(db, openai, batch_writes=True))
+
+    session = db.session()
+    failed_link = session.query(ImageLink).filter_by(status=TaskStatus.FAILED).one()
+    assert failed_link.prompt.prompt_type == SAD
+    assert failed_link.openai_image_url == "content policy violation"
+
+
+def test_batched_failure_keeps_step_error_when_recording_fails(db, monkeypatch):
+    commit = UnitOfWork.commit
+
+    def failing_commit(self):
+        if any(
+            getattr(instance, "status", None) == TaskStatus.FAILED
+            for instance in self._instances
+        ):
+            raise RuntimeError("database unavailable")
+        commit(self)
+
+    monkeypatch.setattr(UnitOfWork, "commit", failing_commit)
+    openai = FakeOpenAI(fail_on="sad crypto investor")
+
+    with pytest.raises(DailyImageGenerationError) as raised:
+        generate(make_generator(db, openai, batch_writes=True))
+
+    assert str(raised.value.errors[SAD]) == "content policy violation"
+    assert [v.prompt_type for v in raised.value.versions] == [
+        PromptType.GENERATE_IMAGE_HAPPY
+    ]
+
+
+def test_step_status_table_tracks_progress(db):
+    openai = FakeOpenAI(fail_on="sad crypto investor")
+
+    with pytest.raises(DailyImageGenerationError):
+        generate(make_generator(db, openai, step_status=StepStatusRecorder(db)))
+
+    session = db.session()
+    rows = {
+        row.prompt_type: (row.step, row.status, row.error)
+        for row in session.query(PipelineStepStatus)
+    }
+    assert rows == {
+        PromptType.GET_HOLIDAYS: ("done", TaskStatus.COMPLETED, None),
+        PromptType.GENERATE_IMAGE_HAPPY: ("done", TaskStatus.COMPLETED, None),
+        SAD: ("image", TaskStatus.FAILED, "content policy violation"),
+    }
+
+
+@pytest.mark.parametrize("batch_writes", [True, False])
+def test_holidays_stored_parsed(db, batch_writes):
+    generate(make_generator(db, FakeOpenAI(), batch_writes=batch_writes))
+
+    session = db.session()
+    holidays = session.query(Holiday).order_by(Holiday.position).all()
+    assert [(h.name, h.description) for h in holidays] == [
+        ("Pizza Day", "Eat pizza"),
+        ("Cat Day", "Pet a cat"),
+    ]
+    assert {h.holiday_date for h in holidays} == {datetime(2026, 5, 1).date()}
+    assert holidays[0].prompt.prompt_type == PromptType.GET_HOLIDAYS
+
+
+def test_pregenerated_versions_left_inactive(db):
+    current = generate(make_generator(db, FakeOpenAI()))
+
+    ahead = make_generator(db, FakeOpenAI()).generate_daily_images(
+        PROMPT_TYPES,
+        datetime(2026, 5, 2),
+        datetime.now() + timedelta(days=1),
+        activate=False,
+    )
+
+    assert [v.status for v in ahead] == [TaskStatus.COMPLETED] * 2
+    session = db.session()
+    active = session.query(DailyImageVersion).filter_by(is_active=True).all()
+    assert {v.id for v in active} == {v.id for v in current}
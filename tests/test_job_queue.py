@@ -0,0 +1,143 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from server.job_queue import JobQueue, JobWorker
+from server.models import Job
+from server.models.utils import TaskStatus
+
+
+@pytest.fixture
+def clock():
+    now = [datetime(2026, 5, 1, 12, 0)]
+
+    def tick(seconds=0):
+        now[0] += timedelta(seconds=seconds)
+        return now[0]
+
+    return tick
+
+
+@pytest.fixture
+def job_queue(thread_db, clock):
+    return JobQueue(
+        thread_db,
+        visibility_timeout_seconds=60,
+        max_attempts=3,
+        backoff=lambda attempt: 10 * attempt,
+        clock=clock,
+    )
+
+
+def job_row(thread_db, job_id):
+    session = thread_db.session()
+    session.expire_all()
+    return session.get(Job, job_id)
+
+
+def test_claimed_job_is_hidden_until_visibility_timeout(job_queue, clock):
+    job_id = job_queue.enqueue("generate_images", {"date": "2026-05-01"})
+
+    [job] = job_queue.claim("worker-a")
+    assert (job.id, job.payload, job.attempts) == (job_id, {"date": "2026-05-01"}, 1)
+    assert job_queue.claim("worker-b") == []
+
+    # worker-a went quiet: after the timeout the job is someone else's.
+    clock(61)
+    [retaken] = job_queue.claim("worker-b")
+    assert (retaken.id, retaken.attempts) == (job_id, 2)
+    assert not job_queue.complete(job)
+    assert job_queue.complete(retaken)
+
+
+def test_heartbeat_extends_visibility(job_queue, clock):
+    job_queue.enqueue("generate_images")
+    [job] = job_queue.claim("worker-a")
+
+    clock(50)
+    assert job_queue.heartbeat(job)
+    clock(50)
+    assert job_queue.claim("worker-b") == []
+
+
+def test_failures_back_off_then_dead_letter(job_queue, thread_db, clock):
+    job_id = job_queue.enqueue("generate_images")
+
+    for attempt in (1, 2):
+        [job] = job_queue.claim("worker")
+        job_queue.fail(job, "openai down")
+        # Not due again until the backoff has passed.
+        assert job_queue.claim("worker") == []
+        clock(10 * attempt)
+
+    [job] = job_queue.claim("worker")
+    job_queue.fail(job, "openai down")
+
+    row = job_row(thread_db, job_id)
+    assert (row.status, row.attempts, row.last_error) == (
+        TaskStatus.FAILED,
+        3,
+        "openai down",
+    )
+    clock(3600)
+    assert job_queue.claim("worker") == []
+    assert [dead.id for dead in job_queue.dead_letters()] == [job_id]
+
+    assert job_queue.requeue(job_id)
+    assert [job.id for job in job_queue.claim("worker")] == [job_id]
+
+
+def test_last_attempt_timing_out_dead_letters(job_queue, thread_db, clock):
+    job_id = job_queue.enqueue("generate_images", max_attempts=1)
+    job_queue.claim("worker-a")
+
+    clock(61)
+    assert job_queue.claim("worker-b") == []
+    assert job_row(thread_db, job_id).status == TaskStatus.FAILED
+
+
+def test_dedupe_key_allows_one_unfinished_job(job_queue):
+    key = "generate_images:2026-05-01"
+    assert job_queue.enqueue("generate_images", dedupe_key=key) is not None
+    assert job_queue.enqueue("generate_images", dedupe_key=key) is None
+
+    [job] = job_queue.claim("worker")
+    job_queue.complete(job)
+    assert job_queue.enqueue("generate_images", dedupe_key=key)
+
+
+def test_worker_pool_runs_each_job_once(thread_db):
+    job_queue = JobQueue(thread_db, visibility_timeout_seconds=60)
+    for n in range(20):
+        job_queue.enqueue("record", {"n": n})
+    seen = []
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def record(payload):
+        with lock:
+            seen.append(payload["n"])
+            if len(seen) == 20:
+                done.set()
+
+    worker = JobWorker(job_queue, {"record": record}, concurrency=4, poll_seconds=0.01)
+    worker.start()
+    try:
+        assert done.wait(10)
+    finally:
+        worker.stop(timeout=5)
+
+    assert sorted(seen) == list(range(20))
+    session = thread_db.session()
+    assert {job.status for job in session.query(Job)} == {TaskStatus.COMPLETED}
+
+
+def test_worker_fails_job_with_unknown_task(job_queue, thread_db):
+    job_id = job_queue.enqueue("nope")
+
+    assert JobWorker(job_queue, {}).run_once("worker")
+
+    row = job_row(thread_db, job_id)
+    assert row.status == TaskStatus.PENDING
+    assert row.last_error == "No handler for task 'nope'"
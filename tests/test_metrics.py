@@ -0,0 +1,201 @@
+from datetime import datetime
+
+import http.server
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import create_app
+from asgi import AsyncApp
+from config import Config
+from extensions import db
+from facades.cmc_facade import get_btc_price
+from server import metrics as metrics_module
+from server.metrics import (
+    Histogram,
+    _after_cursor_execute,
+    _before_cursor_execute,
+    metrics,
+    metrics_handler,
+    start_metrics_server,
+)
+from server.models import Base, BitcoinPrice
+from server.page_state import page_state_cache
+from tests.fakes import FaultInjector, OfflineBackends
+from tests.test_asgi import run
+
+HOME_STAGES = ["state", "price", "image", "holidays", "render"]
+TOKEN = "scrape-me"
+AUTH = {"Authorization": f"Bearer {TOKEN}"}
+
+
+@pytest.fixture
+def enabled_metrics(monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", True)
+    metrics.reset()
+    yield metrics
+    metrics.reset()
+    if event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.remove(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.remove(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@pytest.fixture
+def seeded_app(monkeypatch):
+    monkeypatch.setenv("CMC_API_KEY", "test-key")
+    monkeypatch.setattr(metrics_module, "METRICS_TOKEN", TOKEN)
+    app = create_app()
+    with app.app_context():
+        Base.metadata.create_all(db.engine)
+        db.session.add(BitcoinPrice(price=123456.78, quoted_at=datetime.now()))
+        db.session.commit()
+    page_state_cache.invalidate()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        Base.metadata.drop_all(db.engine)
+    page_state_cache.invalidate()
+
+
+def server_timing(response) -> dict[str, str]:
+    entries = {}
+    for entry in response.headers["Server-Timing"].split(", "):
+        name, _, params = entry.partition(";")
+        entries[name] = params
+    return entries
+
+
+def test_home_reports_stages_and_queries(enabled_metrics, seeded_app):
+    client = seeded_app.test_client()
+    cold = client.get("/")
+    warm = client.get("/")
+
+    assert cold.status_code == warm.status_code == 200
+    # Publicly cacheable: a CDN would replay the timings to everyone.
+    assert cold.cache_control.public
+    assert "Server-Timing" not in cold.headers
+
+    text = client.get("/metrics", headers=AUTH).data.decode()
+    for stage in HOME_STAGES:
+        assert f'btc100k_request_stage_seconds_count{{stage="{stage}"}}' in text
+    assert 'btc100k_request_stage_seconds_count{stage="render"} 2' in text
+    # The second request is served from the page state snapshot: no SQL.
+    assert 'btc100k_request_db_queries_bucket{route="/",le="0"} 1' in text
+    assert 'btc100k_request_duration_seconds_count{route="/",status="200"} 2' in text
+    assert 'btc100k_cache_lookups_total{cache="page_state",result="hit"} 1' in text
+    assert 'btc100k_cache_hit_ratio{cache="page"} 0.5' in text
+
+
+def test_server_timing_on_uncacheable_responses(enabled_metrics, seeded_app):
+    response = seeded_app.test_client().get("/api/stream")
+
+    assert not response.cache_control.public
+    assert server_timing(response)["total"].startswith("dur=")
+
+
+def test_metrics_require_the_token(enabled_metrics, seeded_app):
+    client = seeded_app.test_client()
+
+    assert client.get("/metrics").status_code == 401
+    wrong = {"Authorization": "Bearer nope"}
+    assert client.get("/metrics", headers=wrong).status_code == 401
+    assert client.get("/metrics", headers=AUTH).status_code == 200
+
+
+def test_metrics_not_routed_without_a_token(enabled_metrics, monkeypatch):
+    monkeypatch.setattr(metrics_module, "METRICS_TOKEN", "")
+
+    assert create_app().test_client().get("/metrics").status_code == 404
+
+
+def test_worker_metrics_server_requires_the_token(enabled_metrics, monkeypatch):
+    monkeypatch.setattr(metrics_module, "METRICS_TOKEN", "")
+    assert start_metrics_server(9999) is None
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), metrics_handler(TOKEN))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/metrics"
+    try:
+        with pytest.raises(urllib.error.HTTPError) as denied:
+            urllib.request.urlopen(url)
+        assert denied.value.code == 401
+        with urllib.request.urlopen(urllib.request.Request(url, headers=AUTH)) as ok:
+            assert b"btc100k_request_duration_seconds" in ok.read()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_disabled_metrics_add_nothing(seeded_app):
+    assert not metrics.enabled
+    client = seeded_app.test_client()
+
+    response = client.get("/")
+
+    assert response.status_code == 200
+    assert "Server-Timing" not in response.headers
+    assert client.get("/metrics", headers=AUTH).status_code == 404
+    # Nothing was counted: only the HELP/TYPE lines.
+    assert all(line.startswith("#") for line in metrics.render().splitlines())
+
+
+def test_upstream_latency_and_errors(enabled_metrics):
+    faults = FaultInjector()
+    faults.fail_next(1, status=503)
+    with OfflineBackends(cmc_faults=faults):
+        get_btc_price(serve_last_known=False)
+
+    text = metrics.render()
+    assert (
+        'btc100k_upstream_request_seconds_count{upstream="cmc",operation="quotes",'
+        'outcome="error"} 1' in text
+    )
+    assert (
+        'btc100k_upstream_request_seconds_count{upstream="cmc",operation="quotes",'
+        'outcome="ok"} 1' in text
+    )
+
+    with pytest.raises(ValueError):
+        with metrics.upstream("s3", "upload"):
+            raise ValueError("boom")
+    assert 'operation="upload",outcome="error"} 1' in metrics.render()
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Latency.", (0.1, 1), ("route",))
+    for value in (0.05, 0.5, 0.5, 5):
+        histogram.observe(value, "/")
+
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/",le="0.1"} 1',
+        'latency_seconds_bucket{route="/",le="1"} 3',
+        'latency_seconds_bucket{route="/",le="+Inf"} 4',
+        'latency_seconds_sum{route="/"} 6.05',
+        'latency_seconds_count{route="/"} 4',
+    ]
+
+
+def test_asgi_home_reports_stages_and_queries(enabled_metrics, monkeypatch):
+    monkeypatch.setenv("CMC_API_KEY", "test-key")
+    monkeypatch.setattr(Config, "SQLALCHEMY_DATABASE_URI", "sqlite://")
+    page_state_cache.invalidate()
+
+    async def requests(client):
+        return await client.get("/")
+
+    response = run(AsyncApp(create_app()), requests, {"price": 95000.0})
+    page_state_cache.invalidate()
+
+    assert response.status_code == 200
+    assert "Server-Timing" not in response.headers
+    text = metrics.render()
+    for stage in HOME_STAGES:
+        assert f'btc100k_request_stage_seconds_count{{stage="{stage}"}} 1' in text
+    # Queries through the async engine are counted too.
+    assert 'btc100k_request_db_queries_bucket{route="/",le="0"} 0' in text
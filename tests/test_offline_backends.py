@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from openai import OpenAI
+
+from app import create_app
+from extensions import db
+from facades.cmc_facade import get_btc_price
+from openai_files.openai_client import OpenAIClient
+from openai_files.utils import PromptType
+from server.daily_image_generator import DailyImageGenerator
+from server.db_accessor import DBAccessor
+from server.models import Base, DailyImageVersion
+from server.models.utils import TaskStatus
+from server.page_state import page_state_cache
+from tests.fakes import (
+    Cassette,
+    FakeOpenAIServer,
+    FaultInjector,
+    OfflineBackends,
+    RecordingTransport,
+)
+
+PROMPT_TYPES = [PromptType.GENERATE_IMAGE_HAPPY, PromptType.GENERATE_IMAGE_SAD]
+
+
+def generate(backends, db_accessor, **kwargs):
+    generator = DailyImageGenerator(
+        backends.openai_client(), backends.s3_client, db_accessor, **kwargs
+    )
+    return generator.generate_daily_images(
+        PROMPT_TYPES, datetime(2026, 5, 1), datetime.now() + timedelta(days=1)
+    )
+
+
+def test_pipeline_runs_end_to_end_offline(thread_db, tmp_path):
+    with OfflineBackends(s3_root=str(tmp_path / "bucket")) as backends:
+        versions = generate(backends, thread_db)
+
+    assert [v.status for v in versions] == [TaskStatus.COMPLETED] * 2
+    assert len(backends.openai.chat_requests) == 1
+    assert len(backends.openai.image_requests) == 2
+    # The images really went through the download and upload.
+    assert len(backends.s3.objects) == 2
+    assert all(body == backends.openai.image for body in backends.s3.objects.values())
+    assert sorted(p.name for p in (tmp_path / "bucket").iterdir()) == sorted(
+        backends.s3.objects
+    )
+
+
+def test_injected_faults_are_retried(thread_db):
+    openai_faults = FaultInjector()
+    openai_faults.fail_next(2, status=429)
+    s3_faults = FaultInjector()
+    s3_faults.fail_next(1, status=503)
+
+    with OfflineBackends(openai_faults=openai_faults, s3_faults=s3_faults) as backends:
+        versions = generate(backends, thread_db, max_workers=1)
+
+    assert [v.status for v in versions] == [TaskStatus.COMPLETED] * 2
+    assert len(backends.openai.requests) == 2 + 1 + 2 + 2  # faults, chat, images
+
+
+def test_injected_latency():
+    faults = FaultInjector(latency_seconds=0.05)
+    with OfflineBackends(cmc_faults=faults):
+        started = datetime.now()
+        assert get_btc_price(serve_last_known=False) == 101000.0
+        assert datetime.now() - started >= timedelta(seconds=0.05)
+
+
+def test_home_page_offline():
+    app = create_app()
+    with app.app_context():
+        Base.metadata.create_all(db.engine)
+        try:
+            with OfflineBackends(btc_price=123456.0) as backends:
+                generate(backends, DBAccessor(), max_workers=1)
+                version = (
+                    db.session.query(DailyImageVersion)
+                    .filter_by(prompt_type=PromptType.GENERATE_IMAGE_HAPPY)
+                    .one()
+                )
+                page_state_cache.invalidate()
+                response = app.test_client().get("/")
+        finally:
+            db.session.remove()
+            Base.metadata.drop_all(db.engine)
+            page_state_cache.invalidate()
+
+    assert response.status_code == 200
+    assert b"$123,456.00" in response.data
+    assert version.presigned_url.startswith("http://s3.test/test-bucket/")
+    assert version.presigned_url.encode().replace(b"&", b"&amp;") in response.data
+    assert len(backends.cmc.requests) == 1
+
+
+def test_recorded_responses_replay(tmp_path):
+    cassette = Cassette(str(tmp_path / "openai.json"))
+
+    with FakeOpenAIServer(holidays="Recorded Day - From a live run") as live:
+        recorder = OpenAIClient(
+            client=OpenAI(
+                base_url=live.url + "/v1",
+                api_key="test",
+                http_client=httpx.Client(
+                    transport=RecordingTransport(httpx.HTTPTransport(), cassette)
+                ),
+            ),
+            use_cache=False,
+        )
+        recorder.fetch_holiday_list(datetime(2026, 5, 1))
+        recorder.fetch_generated_image_url("a prompt")
+
+    with OfflineBackends(cassette=Cassette(cassette.path)) as backends:
+        client = backends.openai_client()
+        assert client.fetch_holiday_list(datetime(2026, 5, 1)) == (
+            "Recorded Day - From a live run"
+        )
+        # Unrecorded requests still get the stub's own answers.
+        assert client.fetch_holiday_list(datetime(2026, 5, 2)) != (
+            "Recorded Day - From a live run"
+        )
+        url = client.fetch_generated_image_url("a prompt")
+        assert url.startswith(backends.openai.url)
+
+
+@pytest.mark.parametrize("status", [500, 429])
+def test_error_rate_fails_requests(status):
+    faults = FaultInjector(error_rate=1.0, error_status=status)
+    with FakeOpenAIServer(faults) as server:
+        response = httpx.post(server.url + "/v1/images/generations", json={})
+    assert response.status_code == status
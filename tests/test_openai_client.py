@@ -0,0 +1,149 @@
+import httpx
+import pytest
+from openai import OpenAI
+
+from openai_files.openai_client import OpenAIClient
+from openai_files.openai_exceptions import OpenAIClientError
+from openai_files.rate_limiter import RateLimiter
+from openai_files.response_cache import ResponseCache
+from tests.test_rate_limiter import FakeTime
+
+COMPLETION = {
+    "id": "chatcmpl-1",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4o-mini",
+    "choices": [
+        {
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": "Pizza Day - Eat pizza"},
+        }
+    ],
+    "usage": {"prompt_tokens": 40, "completion_tokens": 10, "total_tokens": 50},
+}
+IMAGE = {"created": 0, "data": [{"url": "https://openai.com/image.png"}]}
+RATE_LIMITED = {"error": {"message": "slow down", "type": "requests", "code": None}}
+NO_CREDIT = {"error": {"message": "no", "type": "x", "code": "insufficient_quota"}}
+
+
+def make_client(responses, fake_time, max_retries=3, cache=None):
+    """An OpenAIClient whose HTTP calls get `responses` in turn."""
+    requests = []
+    responses = iter(responses)
+
+    def handler(request):
+        requests.append(request)
+        return next(responses)
+
+    limiter = RateLimiter(clock=fake_time.clock, sleep=fake_time.sleep)
+    client = OpenAIClient(
+        client=OpenAI(
+            api_key="test",
+            max_retries=0,
+            http_client=httpx.Client(transport=httpx.MockTransport(handler)),
+        ),
+        rate_limiter=limiter,
+        max_retries=max_retries,
+        cache=cache,
+        use_cache=cache is not None,
+    )
+    return client, limiter, requests
+
+
+@pytest.fixture
+def fake_time():
+    return FakeTime()
+
+
+def test_retries_429_after_retry_after(fake_time):
+    client, limiter, requests = make_client(
+        [
+            httpx.Response(429, json=RATE_LIMITED, headers={"retry-after": "3"}),
+            httpx.Response(200, json=IMAGE),
+        ],
+        fake_time,
+    )
+
+    assert client.fetch_generated_image_url("a prompt") == IMAGE["data"][0]["url"]
+
+    assert len(requests) == 2
+    assert fake_time.slept == [pytest.approx(3)]
+    assert limiter.stats()["dall-e-3"]["throttled"] == 1
+
+
+def test_gives_up_after_max_retries(fake_time):
+    client, _, requests = make_client(
+        [httpx.Response(429, json=RATE_LIMITED, headers={"retry-after": "1"})] * 3,
+        fake_time,
+        max_retries=2,
+    )
+
+    with pytest.raises(OpenAIClientError):
+        client.fetch_generated_image_url("a prompt")
+    assert len(requests) == 3
+
+
+def test_insufficient_quota_is_not_retried(fake_time):
+    client, _, requests = make_client(
+        [httpx.Response(429, json=NO_CREDIT)], fake_time
+    )
+
+    with pytest.raises(OpenAIClientError):
+        client.fetch_chat_completion("prompt", "system")
+    assert len(requests) == 1
+
+
+def test_server_errors_are_retried(fake_time, monkeypatch):
+    monkeypatch.setattr("openai_files.openai_client.time.sleep", lambda s: None)
+    client, _, requests = make_client(
+        [httpx.Response(503, json={}), httpx.Response(200, json=COMPLETION)],
+        fake_time,
+    )
+
+    assert client.fetch_chat_completion("prompt", "system") == "Pizza Day - Eat pizza"
+    assert len(requests) == 2
+
+
+def test_response_headers_pace_the_next_request(fake_time):
+    client, _, _ = make_client(
+        [
+            httpx.Response(
+                200,
+                json=IMAGE,
+                headers={
+                    "x-ratelimit-limit-requests": "5",
+                    "x-ratelimit-remaining-requests": "0",
+                    "x-ratelimit-reset-requests": "10s",
+                },
+            ),
+            httpx.Response(200, json=IMAGE),
+        ],
+        fake_time,
+    )
+
+    client.fetch_generated_image_url("first")
+    client.fetch_generated_image_url("second")
+
+    assert fake_time.slept == [pytest.approx(10)]
+
+
+def test_identical_requests_are_served_from_cache(fake_time, tmp_path):
+    cache = ResponseCache(str(tmp_path / "openai.sqlite3"), max_bytes=1 << 20)
+    client, _, requests = make_client(
+        [httpx.Response(200, json=COMPLETION), httpx.Response(200, json=IMAGE)] * 2,
+        fake_time,
+        cache=cache,
+    )
+
+    for _ in range(2):
+        holidays = client.fetch_chat_completion("prompt", "system")
+        assert holidays == "Pizza Day - Eat pizza"
+        assert client.fetch_generated_image_url("a prompt") == IMAGE["data"][0]["url"]
+    assert len(requests) == 2
+
+    # A different prompt, or an explicit bypass, goes to OpenAI.
+    client.fetch_chat_completion("other prompt", "system")
+    client.fetch_generated_image_url("a prompt", use_cache=False)
+    assert len(requests) == 4
+    assert cache.stats.snapshot()["hits"] == 2
@@ -0,0 +1,267 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app
+from extensions import db
+from openai_files.utils import PromptType
+from server.models import (
+    Base,
+    BitcoinPrice,
+    DailyImageVersion,
+    Holiday,
+    ImageLink,
+    Prompt,
+)
+from server.models.utils import TaskStatus
+from server.page_state import (
+    PageStateCache,
+    active_version_query,
+    latest_holidays_query,
+    page_state_cache,
+    recheck_query,
+)
+
+
+@pytest.fixture
+def app_context():
+    # Fresh tables per test, so a file-backed DATABASE_URL doesn't carry
+    # rows from one test into the next.
+    app = create_app()
+    with app.app_context():
+        Base.metadata.drop_all(db.engine)
+        Base.metadata.create_all(db.engine)
+        try:
+            yield app
+        finally:
+            db.session.remove()
+            Base.metadata.drop_all(db.engine)
+            page_state_cache.invalidate()
+
+
+@pytest.fixture
+def query_counter(app_context):
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", count)
+    yield statements
+    event.remove(db.engine, "before_cursor_execute", count)
+
+
+def add_holidays(text, rows=()):
+    db.session.add(
+        Prompt(
+            prompt_text=text,
+            prompt_date=datetime.now().date(),
+            prompt_type=PromptType.GET_HOLIDAYS,
+            status=TaskStatus.COMPLETED,
+            holidays=[
+                Holiday(
+                    holiday_date=datetime.now().date(),
+                    position=position,
+                    name=name,
+                    description=description,
+                )
+                for position, (name, description) in enumerate(rows)
+            ],
+        )
+    )
+    db.session.commit()
+
+
+def add_active_version(prompt_type, url, expiry):
+    prompt = Prompt(
+        prompt_text="image prompt",
+        prompt_date=datetime.now().date(),
+        prompt_type=prompt_type,
+        status=TaskStatus.COMPLETED,
+    )
+    image_link = ImageLink(
+        prompt=prompt, openai_image_url="https://openai.com/img.png",
+        status=TaskStatus.COMPLETED,
+    )
+    db.session.add(
+        DailyImageVersion(
+            image_link=image_link,
+            prompt_type=prompt_type,
+            prompt_date=datetime.now().date(),
+            presigned_url=url,
+            presigned_url_expiry=expiry,
+            is_active=True,
+            status=TaskStatus.COMPLETED,
+        )
+    )
+    db.session.commit()
+
+
+def test_steady_state_does_no_sql(app_context, query_counter):
+    add_holidays("- Pizza Day - Eat pizza\n- Cat Day: Pet a cat")
+    add_active_version(
+        PromptType.GENERATE_IMAGE_HAPPY,
+        "https://s3/happy.png",
+        datetime.now() + timedelta(hours=1),
+    )
+    cache = PageStateCache(recheck_seconds=60)
+
+    state = cache.get()
+    assert state.image_url(PromptType.GENERATE_IMAGE_HAPPY) == "https://s3/happy.png"
+    assert state.image_url(PromptType.GENERATE_IMAGE_SAD) is None
+    assert list(state.holidays) == [
+        {"name": "Pizza Day", "description": "Eat pizza"},
+        {"name": "Cat Day", "description": "Pet a cat"},
+    ]
+
+    query_counter.clear()
+    for _ in range(10):
+        assert cache.get() is state
+    assert query_counter == []
+
+
+def test_holidays_read_from_parsed_rows(app_context):
+    # The rows win over the raw text, which is only parsed for old prompts.
+    add_holidays("unparseable", rows=[("Pizza Day", "Eat pizza"), ("Cat Day", "")])
+
+    state = PageStateCache(recheck_seconds=60).get()
+
+    assert list(state.holidays) == [
+        {"name": "Pizza Day", "description": "Eat pizza"},
+        {"name": "Cat Day", "description": ""},
+    ]
+
+
+def add_price(price, quoted_at=None):
+    db.session.add(BitcoinPrice(price=price, quoted_at=quoted_at or datetime.now()))
+    db.session.commit()
+
+
+def test_steady_state_home_request_does_no_sql(app_context, query_counter, monkeypatch):
+    monkeypatch.setenv("CMC_API_KEY", "test-key")
+    add_price(95000.0)
+    add_holidays("- Pizza Day - Eat pizza")
+    add_active_version(
+        PromptType.GENERATE_IMAGE_SAD,
+        "https://s3/sad.png",
+        datetime.now() + timedelta(hours=1),
+    )
+    page_state_cache.invalidate()
+    client = app_context.test_client()
+
+    first = client.get("/")
+    assert b"$95,000.00" in first.data
+    assert b"https://s3/sad.png" in first.data
+
+    query_counter.clear()
+    for _ in range(10):
+        response = client.get("/")
+        assert response.status_code == 200
+        assert response.data == first.data
+    assert query_counter == []
+
+
+def test_recheck_picks_up_new_price_without_rebuild(app_context):
+    add_holidays("- Pizza Day - Eat pizza")
+    add_price(95000.0, datetime.now() - timedelta(seconds=30))
+    cache = PageStateCache(recheck_seconds=0)
+    first = cache.get()
+    assert first.latest_btc_price(max_age_seconds=300) == 95000.0
+
+    add_price(101000.0)
+    second = cache.get()
+    assert second.latest_btc_price(max_age_seconds=300) == 101000.0
+    assert second.holidays is first.holidays
+    assert second.built_at == first.built_at
+
+
+def test_stale_polled_price_is_ignored(app_context):
+    add_price(95000.0, datetime.now() - timedelta(minutes=10))
+    state = PageStateCache().get()
+
+    assert state.btc_price == 95000.0
+    assert state.latest_btc_price(max_age_seconds=300) is None
+
+
+def test_rebuilds_when_rows_change(app_context):
+    add_holidays("- Pizza Day - Eat pizza")
+    cache = PageStateCache(recheck_seconds=0)
+    first = cache.get()
+
+    assert cache.get() is first
+
+    add_holidays("- Donut Day - Eat a donut")
+    assert cache.get().holidays[0]["name"] == "Donut Day"
+
+
+def test_rebuilds_when_active_version_changes(app_context):
+    add_active_version(
+        PromptType.GENERATE_IMAGE_SAD,
+        "https://s3/old.png",
+        datetime.now() + timedelta(hours=1),
+    )
+    cache = PageStateCache(recheck_seconds=0)
+    assert cache.get().image_url(PromptType.GENERATE_IMAGE_SAD) == "https://s3/old.png"
+
+    db.session.query(DailyImageVersion).update({DailyImageVersion.is_active: False})
+    db.session.commit()
+    add_active_version(
+        PromptType.GENERATE_IMAGE_SAD,
+        "https://s3/new.png",
+        datetime.now() + timedelta(hours=1),
+    )
+    assert cache.get().image_url(PromptType.GENERATE_IMAGE_SAD) == "https://s3/new.png"
+
+
+def test_rebuilds_at_presigned_url_expiry(app_context):
+    add_active_version(
+        PromptType.GENERATE_IMAGE_SAD,
+        "https://s3/sad.png",
+        # Leaves room for a full GC pause before the first get().
+        datetime.now() + timedelta(seconds=0.5),
+    )
+    cache = PageStateCache(recheck_seconds=60)
+    assert cache.get().image_url(PromptType.GENERATE_IMAGE_SAD) == "https://s3/sad.png"
+
+    time.sleep(0.6)
+    assert cache.get().image_url(PromptType.GENERATE_IMAGE_SAD) is None
+
+
+def test_database_error_serves_empty_state(app_context):
+    # No tables at all: every query fails.
+    Base.metadata.drop_all(db.engine)
+    state = PageStateCache().get()
+
+    assert state.image_urls == {}
+    assert state.holidays == ()
+
+
+def query_plan(engine, query):
+    compiled = query.compile(engine, compile_kwargs={"literal_binds": True})
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}").fetchall()
+    return " ".join(row[-1] for row in rows)
+
+
+def test_current_lookups_use_indexes(engine):
+    image_plan = query_plan(
+        engine, active_version_query(PromptType.GENERATE_IMAGE_SAD, datetime.now())
+    )
+    holiday_plan = query_plan(engine, latest_holidays_query())
+
+    assert "ix_daily_image_version_current" in image_plan
+    assert "TEMP B-TREE" not in image_plan
+    assert "ix_prompt_type_status_date" in holiday_plan
+    assert "TEMP B-TREE" not in holiday_plan
+
+
+def test_recheck_query_uses_indexes(engine):
+    plan = query_plan(engine, recheck_query(datetime.now()))
+
+    # Every recheck would otherwise read the whole history.
+    for table in ("daily_image_version", "prompt", "holiday"):
+        assert f"SCAN {table}" not in plan
+    assert "ix_daily_image_version_current" in plan
+    assert "ix_prompt_type_status_date" in plan
@@ -0,0 +1,112 @@
+import json
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from openai_files.utils import PromptType
+from server.daily_image_generator import DailyImageGenerator
+from server.models import PipelineRun
+from server.models.utils import TaskStatus
+from server.pipeline_trace import PipelineTracer, current_span
+from tests.fakes import FaultInjector, OfflineBackends
+
+PROMPT_TYPES = [PromptType.GENERATE_IMAGE_HAPPY, PromptType.GENERATE_IMAGE_SAD]
+
+
+def generate(backends, db_accessor, tracer, **kwargs):
+    generator = DailyImageGenerator(
+        backends.openai_client(),
+        backends.s3_client,
+        db_accessor,
+        tracer=tracer,
+        **kwargs,
+    )
+    return generator.generate_daily_images(
+        PROMPT_TYPES, datetime(2026, 5, 1), datetime.now() + timedelta(days=1)
+    )
+
+
+def saved_run(db_accessor) -> PipelineRun:
+    with db_accessor.session_scope() as session:
+        return session.query(PipelineRun).one()
+
+
+def test_run_totals_are_saved(thread_db):
+    faults = FaultInjector()
+    faults.fail_next(1, status=429)
+
+    with OfflineBackends(openai_faults=faults, image_bytes=1000) as backends:
+        generate(backends, thread_db, PipelineTracer(thread_db))
+
+    run = saved_run(thread_db)
+    assert run.status == TaskStatus.COMPLETED
+    assert run.prompt_date == date(2026, 5, 1)
+    assert run.openai_retries == 1
+    assert run.prompt_tokens > 0
+    assert run.completion_tokens > 0
+    assert run.images_generated == 2
+    assert run.image_bytes == 2000
+    assert run.s3_seconds > 0
+    assert run.duration_seconds >= max(s["duration_seconds"] for s in run.spans[1:])
+    assert run.error is None
+
+
+def test_spans_nest_across_branch_threads(thread_db):
+    with OfflineBackends() as backends:
+        generate(backends, thread_db, PipelineTracer(thread_db), max_workers=2)
+
+    spans = saved_run(thread_db).spans
+    by_id = {span["span_id"]: span for span in spans}
+    root = spans[0]
+    assert root["name"] == "generate_daily_images"
+    assert root["parent_span_id"] is None
+    branches = [s for s in spans if s["name"] == "generate_for_prompt_type"]
+    assert sorted(s["attributes"]["prompt_type"] for s in branches) == sorted(
+        prompt_type.value for prompt_type in PROMPT_TYPES
+    )
+    assert all(s["parent_span_id"] == root["span_id"] for s in branches)
+    for name in ("image_prompt", "image", "s3", "presign"):
+        steps = [s for s in spans if s["name"] == name]
+        assert len(steps) == 2
+        assert {by_id[s["parent_span_id"]]["name"] for s in steps} == {
+            "generate_for_prompt_type"
+        }
+    holidays = next(s for s in spans if s["name"] == "holidays")
+    assert holidays["attributes"]["openai.prompt_tokens"] > 0
+    # Nothing leaks onto the calling thread once the run is over.
+    assert current_span() is None
+
+
+def test_trace_is_exported_as_otlp_json(thread_db, tmp_path):
+    path = tmp_path / "traces.jsonl"
+    with OfflineBackends() as backends:
+        generate(backends, thread_db, PipelineTracer(export_path=str(path)))
+
+    (line,) = path.read_text().splitlines()
+    resource_spans = json.loads(line)["resourceSpans"][0]
+    assert resource_spans["resource"]["attributes"][0]["key"] == "service.name"
+    spans = resource_spans["scopeSpans"][0]["spans"]
+    assert len({span["traceId"] for span in spans}) == 1
+    assert len(spans[0]["traceId"]) == 32
+    assert "parentSpanId" not in spans[0]
+    assert all(span["status"] == {"code": 1} for span in spans)
+    s3 = next(span for span in spans if span["name"] == "s3")
+    attributes = {a["key"]: a["value"] for a in s3["attributes"]}
+    assert attributes["image.bytes"] == {"intValue": str(256 * 1024)}
+    assert "doubleValue" in attributes["s3.upload_seconds"]
+    assert int(s3["endTimeUnixNano"]) >= int(s3["startTimeUnixNano"])
+
+
+def test_failed_run_is_recorded(thread_db):
+    faults = FaultInjector()
+    faults.fail_next(1, status=400)
+
+    with OfflineBackends(openai_faults=faults) as backends:
+        with pytest.raises(Exception):
+            generate(backends, thread_db, PipelineTracer(thread_db))
+
+    run = saved_run(thread_db)
+    assert run.status == TaskStatus.FAILED
+    assert run.error.startswith("OpenAIClientError")
+    holidays = next(s for s in run.spans if s["name"] == "holidays")
+    assert holidays["status"] == "error"
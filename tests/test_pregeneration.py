@@ -0,0 +1,108 @@
+from datetime import date, datetime, timedelta
+from unittest.mock import MagicMock
+
+from openai_files.utils import PromptType
+from server.models import DailyImageVersion, ImageLink, Prompt
+from server.models.utils import TaskStatus
+from server.pregeneration import activate_versions, missing_dates
+from server.presigner import Presigner
+from server.workers import daily_task
+from tests.helpers import FakeS3Factory, SessionAccessor
+
+HAPPY = PromptType.GENERATE_IMAGE_HAPPY
+SAD = PromptType.GENERATE_IMAGE_SAD
+TODAY = date(2026, 5, 1)
+
+
+def add_version(
+    session, prompt_type, day, is_active=False, status=TaskStatus.COMPLETED
+):
+    key = f"{prompt_type.value}-{day}.png"
+    version = DailyImageVersion(
+        image_link=ImageLink(
+            prompt=Prompt(
+                prompt_text="image prompt",
+                prompt_date=day,
+                prompt_type=prompt_type,
+                status=TaskStatus.COMPLETED,
+            ),
+            openai_image_url="https://openai.com/image.png",
+            s3_image_url=f"https://bucket.s3.amazonaws.com/{key}",
+            status=TaskStatus.COMPLETED,
+        ),
+        prompt_type=prompt_type,
+        prompt_date=day,
+        presigned_url="https://s3/signed-when-generated",
+        presigned_url_expiry=datetime(2026, 4, 1),
+        is_active=is_active,
+        status=status,
+    )
+    session.add(version)
+    session.commit()
+    return version
+
+
+def test_missing_dates_needs_every_type(session):
+    add_version(session, HAPPY, TODAY)
+    add_version(session, SAD, TODAY)
+    add_version(session, HAPPY, TODAY + timedelta(days=1))
+    add_version(session, SAD, TODAY + timedelta(days=2), status=TaskStatus.FAILED)
+
+    missing = missing_dates(SessionAccessor(session), TODAY, 3, [HAPPY, SAD])
+
+    assert missing == [TODAY + timedelta(days=1), TODAY + timedelta(days=2)]
+
+
+def test_activation_flips_to_the_days_versions(session):
+    yesterday_happy = add_version(session, HAPPY, TODAY - timedelta(days=1), True)
+    yesterday_sad = add_version(session, SAD, TODAY - timedelta(days=1), True)
+    happy = add_version(session, HAPPY, TODAY)
+    sad = add_version(session, SAD, TODAY)
+    tomorrow = add_version(session, HAPPY, TODAY + timedelta(days=1))
+    s3 = FakeS3Factory()
+
+    activated = activate_versions(
+        SessionAccessor(session), Presigner(s3, bucket="bucket"), TODAY, [HAPPY, SAD]
+    )
+
+    assert activated == [happy, sad]
+    assert happy.is_active and sad.is_active
+    assert not yesterday_happy.is_active and not yesterday_sad.is_active
+    assert not tomorrow.is_active
+    # Re-signed at activation, in one signing pass.
+    assert happy.presigned_url.startswith(f"https://s3/{HAPPY.value}-{TODAY}.png")
+    assert happy.presigned_url_expiry > datetime.now() + timedelta(hours=23)
+    assert s3.lookups == 1
+
+    # Running it again changes nothing.
+    assert activate_versions(
+        SessionAccessor(session), Presigner(s3, bucket="bucket"), TODAY, [HAPPY, SAD]
+    ) == []
+
+
+def test_activation_keeps_current_version_when_nothing_ready(session):
+    yesterday_sad = add_version(session, SAD, TODAY - timedelta(days=1), True)
+    happy = add_version(session, HAPPY, TODAY)
+
+    activated = activate_versions(
+        SessionAccessor(session),
+        Presigner(FakeS3Factory(), bucket="bucket"),
+        TODAY,
+        [HAPPY, SAD],
+    )
+
+    assert activated == [happy]
+    assert yesterday_sad.is_active
+
+
+def test_daily_run_targets_today_in_image_timezone(monkeypatch):
+    # Just past midnight in IMAGE_TIMEZONE, still the day before on the server.
+    generator = MagicMock()
+    monkeypatch.setattr(daily_task, "today", lambda: TODAY)
+    monkeypatch.setattr(daily_task, "build_generator", lambda db_accessor: generator)
+
+    daily_task.run()
+
+    prompt_types, target, expiry = generator.generate_daily_images.call_args.args
+    assert target == datetime(2026, 5, 1)
+    assert expiry > datetime.now()
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+
+from openai_files.utils import PromptType
+from server.models import DailyImageVersion, ImageLink, Prompt
+from server.models.utils import TaskStatus
+from server.presigner import Presigner, rotate_presigned_urls, s3_key_from_url
+from tests.helpers import FakeS3Factory, SessionAccessor
+
+
+def test_presign_many_signs_in_one_lookup():
+    s3 = FakeS3Factory()
+    presigner = Presigner(s3, bucket="bucket", refresh_ahead_seconds=60)
+
+    urls = presigner.presign_many(["a.png", "b.png", "a.png"], expires_in=3600)
+
+    assert list(urls) == ["a.png", "b.png"]
+    assert urls["a.png"].url.startswith("https://s3/a.png")
+    assert s3.lookups == 1
+    assert s3.client.generate_presigned_url.call_count == 2
+
+
+def test_presigned_urls_reused_until_refresh_window():
+    now = [datetime(2026, 1, 1)]
+    s3 = FakeS3Factory()
+    presigner = Presigner(
+        s3, bucket="bucket", refresh_ahead_seconds=600, clock=lambda: now[0]
+    )
+
+    first = presigner.presign("a.png", expires_in=3600)
+    assert presigner.presign("a.png", expires_in=3600) is first
+
+    now[0] += timedelta(seconds=3000)  # 10 minutes left: mint the next one
+    second = presigner.presign("a.png", expires_in=3600)
+    assert second.url != first.url
+    assert second.expires_at == now[0] + timedelta(seconds=3600)
+
+
+def test_cached_urls_match_the_requested_lifetime():
+    now = datetime(2026, 1, 1)
+    presigner = Presigner(
+        FakeS3Factory(), bucket="bucket", refresh_ahead_seconds=60, clock=lambda: now
+    )
+
+    short = presigner.presign("a.png", expires_in=600)
+    long = presigner.presign("a.png", expires_in=86400)
+
+    assert long is not short
+    assert long.expires_at == now + timedelta(seconds=86400)
+    assert presigner.presign("a.png", expires_in=600) is short
+
+
+def add_version(session, key, expiry, is_active=True):
+    prompt = Prompt(
+        prompt_text="image prompt",
+        prompt_date=datetime.now().date(),
+        prompt_type=PromptType.GENERATE_IMAGE_SAD,
+        status=TaskStatus.COMPLETED,
+    )
+    version = DailyImageVersion(
+        image_link=ImageLink(
+            prompt=prompt,
+            openai_image_url="https://openai.com/sad.png",
+            s3_image_url=f"https://bucket.s3.us-east-1.amazonaws.com/{key}",
+            status=TaskStatus.COMPLETED,
+        ),
+        prompt_type=PromptType.GENERATE_IMAGE_SAD,
+        prompt_date=datetime.now().date(),
+        presigned_url="https://s3/old",
+        presigned_url_expiry=expiry,
+        is_active=is_active,
+        status=TaskStatus.COMPLETED,
+    )
+    session.add(version)
+    session.commit()
+    return version
+
+
+def test_rotate_replaces_urls_close_to_expiry(session):
+    expiring = add_version(session, "sad-1.png", datetime.now() + timedelta(hours=1))
+    fresh = add_version(session, "sad-2.png", datetime.now() + timedelta(hours=20))
+    inactive = add_version(
+        session, "sad-3.png", datetime.now() + timedelta(hours=1), is_active=False
+    )
+    s3 = FakeS3Factory()
+
+    rotated = rotate_presigned_urls(
+        SessionAccessor(session),
+        Presigner(s3, bucket="bucket"),
+        refresh_ahead_seconds=6 * 3600,
+        expires_in=24 * 3600,
+    )
+
+    assert rotated == 1
+    assert expiring.presigned_url.startswith("https://s3/sad-1.png")
+    assert expiring.presigned_url_expiry > datetime.now() + timedelta(hours=23)
+    assert fresh.presigned_url == "https://s3/old"
+    assert inactive.presigned_url == "https://s3/old"
+
+
+def test_s3_key_from_url():
+    url = "https://bucket.s3.us-east-1.amazonaws.com/GENERATE_IMAGE_SAD-01-JAN-2026%20x.png"
+    assert s3_key_from_url(url) == "GENERATE_IMAGE_SAD-01-JAN-2026 x.png"
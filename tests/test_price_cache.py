@@ -0,0 +1,166 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from facades.cmc_facade import CMCConnectionError
+from facades.price_cache import (
+    CachedPrice,
+    InMemoryPriceStore,
+    PriceCache,
+    SQLitePriceStore,
+)
+
+
+class CountingFetcher:
+    def __init__(self, price=45000.0, delay=0.0):
+        self.price = price
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return self.price
+
+
+def test_fresh_quote_served_from_cache():
+    fetch = CountingFetcher()
+    cache = PriceCache(fetch_price=fetch, ttl_seconds=60)
+
+    assert cache.get_price() == 45000.0
+    assert cache.get_price() == 45000.0
+    assert fetch.calls == 1
+
+
+def test_concurrent_misses_make_one_upstream_call():
+    fetch = CountingFetcher(delay=0.2)
+    cache = PriceCache(fetch_price=fetch, ttl_seconds=60)
+    results = []
+
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_price()))
+        for _ in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [45000.0] * 10
+    assert fetch.calls == 1
+
+
+def test_stale_quote_served_while_refreshing():
+    fetch = CountingFetcher(price=101000.0, delay=0.1)
+    store = InMemoryPriceStore()
+    store.set(CachedPrice(price=99000.0, fetched_at=time.time() - 120))
+    cache = PriceCache(
+        fetch_price=fetch, store=store, ttl_seconds=60, max_stale_seconds=300
+    )
+
+    assert cache.get_price() == 99000.0
+
+    time.sleep(0.3)
+    assert fetch.calls == 1
+    assert cache.get_price() == 101000.0
+
+
+def test_expired_quote_refreshes_inline():
+    fetch = CountingFetcher(price=101000.0)
+    store = InMemoryPriceStore()
+    store.set(CachedPrice(price=99000.0, fetched_at=time.time() - 1000))
+    cache = PriceCache(
+        fetch_price=fetch, store=store, ttl_seconds=60, max_stale_seconds=300
+    )
+
+    assert cache.get_price() == 101000.0
+
+
+def test_upstream_error_propagates_without_cached_quote():
+    def failing_fetch():
+        raise CMCConnectionError("down")
+
+    cache = PriceCache(fetch_price=failing_fetch)
+    with pytest.raises(CMCConnectionError):
+        cache.get_price()
+
+
+def test_sqlite_store_shared_between_caches(tmp_path):
+    path = str(tmp_path / "price_cache.sqlite3")
+    fetch = CountingFetcher()
+
+    first = PriceCache(fetch_price=fetch, store=SQLitePriceStore(path))
+    second = PriceCache(fetch_price=fetch, store=SQLitePriceStore(path))
+
+    assert first.get_price() == 45000.0
+    assert second.get_price() == 45000.0
+    assert fetch.calls == 1
+
+
+def test_sqlite_store_lease_is_exclusive(tmp_path):
+    store = SQLitePriceStore(str(tmp_path / "price_cache.sqlite3"))
+
+    assert store.try_acquire_lease(10)
+    assert not store.try_acquire_lease(10)
+    store.release_lease()
+    assert store.try_acquire_lease(10)
+
+
+def test_async_concurrent_misses_share_one_fetch():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 45000.0
+
+    async def main():
+        cache = PriceCache(ttl_seconds=60)
+        return await asyncio.gather(
+            *(cache.get_price_async(fetch) for _ in range(10))
+        )
+
+    assert asyncio.run(main()) == [45000.0] * 10
+    assert len(calls) == 1
+
+
+def test_async_fetch_waits_on_other_process_lease(tmp_path):
+    path = str(tmp_path / "price_cache.sqlite3")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return 45000.0
+
+    other_process = SQLitePriceStore(path)
+    assert other_process.try_acquire_lease(10)
+
+    async def main():
+        cache = PriceCache(store=SQLitePriceStore(path), lease_seconds=5)
+        pending = asyncio.ensure_future(cache.get_price_async(fetch))
+        await asyncio.sleep(0.1)
+        # The lease holder lands its quote; we should pick it up.
+        other_process.set(CachedPrice(price=46000.0, fetched_at=time.time()))
+        other_process.release_lease()
+        return await pending
+
+    assert asyncio.run(main()) == 46000.0
+    assert calls == []
+
+
+def test_fetch_without_lease_leaves_other_lease_alone(tmp_path):
+    path = str(tmp_path / "price_cache.sqlite3")
+    other_process = SQLitePriceStore(path)
+    assert other_process.try_acquire_lease(10)
+
+    cache = PriceCache(
+        fetch_price=CountingFetcher(), store=SQLitePriceStore(path), lease_seconds=0.2
+    )
+    assert cache.get_price() == 45000.0
+
+    # The other process still holds its lease.
+    assert not other_process.try_acquire_lease(10)
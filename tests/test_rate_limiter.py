@@ -0,0 +1,114 @@
+import threading
+
+import pytest
+
+from openai_files.rate_limiter import (
+    RateLimiter,
+    TokenBucket,
+    parse_reset_duration,
+    retry_after_seconds,
+)
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+        self._lock = threading.Lock()
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        with self._lock:
+            self.slept.append(seconds)
+            self.now += seconds
+
+
+@pytest.fixture
+def fake_time():
+    return FakeTime()
+
+
+@pytest.mark.parametrize(
+    "value, seconds",
+    [("20ms", 0.02), ("1s", 1), ("6m0s", 360), ("1h2m3.5s", 3723.5), ("", None)],
+)
+def test_parse_reset_duration(value, seconds):
+    assert parse_reset_duration(value) == seconds
+
+
+def test_retry_after_prefers_milliseconds():
+    assert retry_after_seconds({"retry-after-ms": "1500", "retry-after": "2"}) == 1.5
+    assert retry_after_seconds({"retry-after": "2"}) == 2
+    assert retry_after_seconds({"retry-after": "Wed, 21 Oct 2026"}) is None
+
+
+def test_bucket_spaces_requests_past_its_burst(fake_time):
+    bucket = TokenBucket(60, clock=fake_time.clock)
+
+    waits = [bucket.reserve() for _ in range(62)]
+
+    assert waits[:60] == [0.0] * 60
+    assert waits[60:] == [pytest.approx(1.0), pytest.approx(2.0)]
+
+
+def test_bucket_refills_over_time(fake_time):
+    bucket = TokenBucket(60, clock=fake_time.clock)
+    bucket.reserve(60)
+
+    fake_time.now += 30
+    assert bucket.reserve(30) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+
+
+def test_acquire_waits_and_records_queued_time(fake_time):
+    limiter = RateLimiter(clock=fake_time.clock, sleep=fake_time.sleep)
+    limiter.configure("dall-e-3", requests_per_minute=2)
+
+    for _ in range(4):
+        limiter.acquire("dall-e-3")
+
+    assert fake_time.slept == [pytest.approx(30), pytest.approx(30)]
+    stats = limiter.stats()["dall-e-3"]
+    assert (stats["requests"], stats["waits"]) == (4, 2)
+    assert stats["max_queued_seconds"] == pytest.approx(30)
+
+
+def test_token_bucket_holds_large_prompts(fake_time):
+    limiter = RateLimiter(clock=fake_time.clock, sleep=fake_time.sleep)
+    limiter.configure("gpt-4o-mini", requests_per_minute=500, tokens_per_minute=1200)
+
+    assert limiter.acquire("gpt-4o-mini", tokens=1000) == 0
+    assert limiter.acquire("gpt-4o-mini", tokens=1000) == pytest.approx(40)
+
+    # Only 200 tokens were really used: the difference comes back.
+    limiter.settle("gpt-4o-mini", reserved_tokens=1000, used_tokens=200)
+    fake_time.now += 60
+    assert limiter.acquire("gpt-4o-mini", tokens=1000) == 0
+
+
+def test_headers_replace_configured_limits(fake_time):
+    limiter = RateLimiter(clock=fake_time.clock, sleep=fake_time.sleep)
+    limiter.configure("dall-e-3", requests_per_minute=100)
+
+    limiter.observe(
+        "dall-e-3",
+        {
+            "x-ratelimit-limit-requests": "5",
+            "x-ratelimit-remaining-requests": "0",
+            "x-ratelimit-reset-requests": "12s",
+        },
+    )
+
+    assert limiter.acquire("dall-e-3") == pytest.approx(12)
+
+
+def test_throttled_holds_every_caller_for_retry_after(fake_time):
+    limiter = RateLimiter(clock=fake_time.clock, sleep=fake_time.sleep)
+    limiter.configure("dall-e-3", requests_per_minute=100)
+
+    assert limiter.throttled("dall-e-3", {"retry-after": "7"}) == 7
+
+    assert limiter.acquire("dall-e-3") == pytest.approx(7)
+    assert limiter.stats()["dall-e-3"]["throttled"] == 1
@@ -0,0 +1,82 @@
+import pytest
+
+from openai_files.response_cache import ResponseCache, cache_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def make_cache(tmp_path, clock, max_bytes=1 << 20):
+    return ResponseCache(str(tmp_path / "openai.sqlite3"), max_bytes, clock=clock)
+
+
+def test_cache_key_is_content_addressed():
+    messages = [{"role": "user", "content": "hi"}]
+    key = cache_key("chat", model="gpt-4o-mini", messages=messages)
+
+    assert key == cache_key("chat", messages=messages, model="gpt-4o-mini")
+    assert key != cache_key("chat", model="gpt-4o", messages=messages)
+    assert key != cache_key("image", model="gpt-4o-mini", messages=messages)
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = make_cache(tmp_path, clock)
+    cache.set("key", "value", ttl_seconds=60)
+
+    clock.now += 59
+    assert cache.get("key") == "value"
+    clock.now += 1
+    assert cache.get("key") is None
+    assert cache.stats.snapshot()["expired"] == 1
+
+
+def test_least_recently_used_is_evicted_past_max_bytes(tmp_path, clock):
+    # Each entry is a 1-byte key plus a 100-byte value.
+    cache = make_cache(tmp_path, clock, max_bytes=303)
+    for key in "abc":
+        clock.now += 1
+        cache.set(key, "x" * 100, ttl_seconds=3600)
+    clock.now += 1
+    cache.get("a")
+
+    clock.now += 1
+    cache.set("d", "x" * 100, ttl_seconds=3600)
+
+    assert [cache.get(key) is not None for key in "abcd"] == [True, False, True, True]
+    assert cache.stats.snapshot()["evicted"] == 1
+
+
+def test_get_or_fetch_only_fetches_on_a_miss(tmp_path, clock):
+    cache = make_cache(tmp_path, clock)
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return "fresh"
+
+    assert cache.get_or_fetch("key", fetch, 60) == "fresh"
+    assert cache.get_or_fetch("key", fetch, 60) == "fresh"
+    assert len(calls) == 1
+    assert cache.stats.snapshot()["hit_ratio"] == 0.5
+
+
+def test_shared_between_instances_on_one_file(tmp_path, clock):
+    make_cache(tmp_path, clock).set("key", "value", 60)
+    assert make_cache(tmp_path, clock).get("key") == "value"
+
+
+def test_broken_cache_falls_through_to_fetch(tmp_path, clock):
+    cache = make_cache(tmp_path, clock)
+    (tmp_path / "openai.sqlite3").write_bytes(b"not a database" * 100)
+
+    assert cache.get_or_fetch("key", lambda: "fresh", 60) == "fresh"
@@ -0,0 +1,129 @@
+import io
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+from botocore.exceptions import ClientError
+
+from server.s3_client import S3ClientFactory
+
+
+def client_error(code):
+    return ClientError({"Error": {"Code": code, "Message": code}}, "GetObject")
+
+
+@pytest.fixture
+def factory():
+    S3ClientFactory._s3_client = None
+    factory = S3ClientFactory()
+    factory._s3_client = None
+    yield factory
+    factory._s3_client = None
+
+
+def test_client_reused_without_validation_calls(factory):
+    client = MagicMock()
+    client.generate_presigned_url.return_value = "https://s3/signed"
+
+    with patch.object(S3ClientFactory, "_create_s3_client", return_value=client) as create:
+        for _ in range(5):
+            assert factory.fetch_presigned_url("image.png", 60) == "https://s3/signed"
+
+    create.assert_called_once()
+    client.list_buckets.assert_not_called()
+
+
+def test_expired_token_refreshes_and_retries_once(factory):
+    expired = MagicMock()
+    expired.generate_presigned_url.side_effect = client_error("ExpiredToken")
+    fresh = MagicMock()
+    fresh.generate_presigned_url.return_value = "https://s3/signed"
+
+    with patch.object(S3ClientFactory, "_create_s3_client", side_effect=[expired, fresh]):
+        assert factory.fetch_presigned_url("image.png", 60) == "https://s3/signed"
+
+    assert factory.get_s3_client() is fresh
+
+
+def test_auth_error_after_refresh_is_raised(factory):
+    client = MagicMock()
+    client.generate_presigned_url.side_effect = client_error("InvalidToken")
+
+    with patch.object(S3ClientFactory, "_create_s3_client", return_value=client) as create:
+        with pytest.raises(ClientError):
+            factory.fetch_presigned_url("image.png", 60)
+
+    assert create.call_count == 2
+
+
+def test_other_errors_do_not_refresh(factory):
+    client = MagicMock()
+    client.generate_presigned_url.side_effect = client_error("NoSuchBucket")
+
+    with patch.object(S3ClientFactory, "_create_s3_client", return_value=client) as create:
+        with pytest.raises(ClientError):
+            factory.fetch_presigned_url("image.png", 60)
+
+    create.assert_called_once()
+
+
+class FakeRaw(io.BytesIO):
+    def read(self, size=-1, decode_content=True):
+        return super().read(size)
+
+
+class FakeDownload:
+    def __init__(self, content):
+        self.status_code = 200
+        self.headers = {"Content-Length": str(len(content))}
+        self.raw = FakeRaw(content)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def test_upload_retried_with_fresh_download(factory):
+    expired = MagicMock()
+    expired.upload_fileobj.side_effect = client_error("ExpiredToken")
+    fresh = MagicMock()
+    uploaded = []
+    fresh.upload_fileobj.side_effect = lambda body, *args, **kwargs: uploaded.append(
+        body.read()
+    )
+    fresh.head_object.return_value = {"ContentLength": len(b"png-bytes")}
+
+    with patch(
+        "server.s3_client.requests.get",
+        side_effect=lambda *args, **kwargs: FakeDownload(b"png-bytes"),
+    ) as download, patch.object(
+        S3ClientFactory, "_create_s3_client", side_effect=[expired, fresh]
+    ):
+        factory.save_image_to_s3("https://openai/image.png", "image.png")
+
+    assert uploaded == [b"png-bytes"]
+    assert download.call_count == 2
+
+
+def test_concurrent_callers_share_one_client(factory):
+    created = []
+
+    def create():
+        created.append(MagicMock())
+        return created[-1]
+
+    with patch.object(S3ClientFactory, "_create_s3_client", side_effect=create):
+        clients = []
+        threads = [
+            threading.Thread(target=lambda: clients.append(factory.get_s3_client()))
+            for _ in range(20)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert len(created) == 1
+    assert all(client is created[0] for client in clients)
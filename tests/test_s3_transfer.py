@@ -0,0 +1,128 @@
+import hashlib
+import http.server
+import os
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from server import s3_client as s3_module
+from server.s3_client import S3ClientFactory
+from tests.fakes.s3 import FakeS3
+
+BUCKET = "test-bucket"
+CHUNK = 5 * 1024 * 1024
+
+
+@pytest.fixture
+def fake_s3():
+    s3 = FakeS3(BUCKET)
+    factory = S3ClientFactory()
+    factory._s3_client = s3.client()
+    with patch.object(s3_module, "AWS_S3_BUCKET", BUCKET), patch.object(
+        s3_module, "S3_TRANSFER_CHUNK_BYTES", CHUNK
+    ), patch.object(s3_module, "S3_TRANSFER_MAX_CONCURRENCY", 2):
+        yield s3
+    factory._s3_client = None
+
+
+@pytest.fixture
+def image_server():
+    image = os.urandom(2 * CHUNK + 12345)
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(image)))
+            self.end_headers()
+            if self.path != "/truncated.png":
+                self.wfile.write(image)
+            else:
+                self.wfile.write(image[:1000])
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", image
+    server.shutdown()
+
+
+def test_streams_image_into_multipart_upload(fake_s3, image_server):
+    base_url, image = image_server
+    reads = []
+    original_read = s3_module.HashingReader.read
+
+    def tracking_read(self, size=-1):
+        reads.append(size)
+        return original_read(self, size)
+
+    with patch.object(s3_module.HashingReader, "read", tracking_read):
+        url = S3ClientFactory().save_image_to_s3(f"{base_url}/image.png", "image.png")
+
+    assert url.endswith("/image.png")
+    assert fake_s3.objects["image.png"] == image
+    # Three parts of at most one chunk each; the download is never read whole.
+    assert len(fake_s3.part_sizes) == 3
+    assert max(fake_s3.part_sizes) <= CHUNK
+    assert reads and all(0 < size <= CHUNK for size in reads)
+
+
+def test_transfer_config_bounds_buffered_chunks(fake_s3):
+    config = s3_module.transfer_config()
+
+    assert config.multipart_chunksize == CHUNK
+    assert config.max_concurrency == 2
+    assert config.max_in_memory_upload_chunks == 2
+
+
+def test_truncated_download_is_rejected(fake_s3, image_server):
+    base_url, _ = image_server
+
+    with pytest.raises(Exception, match="IncompleteRead|truncated"):
+        S3ClientFactory().save_image_to_s3(f"{base_url}/truncated.png", "image.png")
+
+    assert "image.png" not in fake_s3.objects
+
+
+def test_returns_sha256_of_streamed_bytes(fake_s3, image_server):
+    base_url, image = image_server
+    factory = S3ClientFactory()
+
+    digest = factory._stream_to_s3(
+        factory.get_s3_client(), f"{base_url}/image.png", "image.png"
+    )
+
+    assert digest == hashlib.sha256(image).hexdigest()
+
+
+def test_upload_checksum_verified_against_s3(fake_s3, image_server):
+    base_url, image = image_server
+    factory = S3ClientFactory()
+    factory._stream_to_s3(factory.get_s3_client(), f"{base_url}/image.png", "a.png")
+
+    # A multipart upload's checksum of part checksums matched the download.
+    assert fake_s3.checksums["a.png"].endswith("-3")
+
+
+def test_checksum_mismatch_deletes_the_object(fake_s3, image_server):
+    base_url, _ = image_server
+    # Same length, different bytes: only the checksum can tell.
+    fake_s3.corrupt = lambda body: bytes([body[0] ^ 1]) + body[1:]
+
+    with pytest.raises(Exception, match="checksum"):
+        S3ClientFactory().save_image_to_s3(f"{base_url}/image.png", "image.png")
+
+    assert "image.png" not in fake_s3.objects
+
+
+def test_size_mismatch_deletes_the_object(fake_s3, image_server):
+    base_url, _ = image_server
+    fake_s3.corrupt = lambda body: body[:-1]
+
+    with pytest.raises(Exception, match="does not match"):
+        S3ClientFactory().save_image_to_s3(f"{base_url}/image.png", "image.png")
+
+    assert "image.png" not in fake_s3.objects
@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+from server.state_stream import StatePublisher, format_event
+
+
+class StateSource:
+    def __init__(self, *states):
+        self.states = list(states)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if len(self.states) > 1:
+            return self.states.pop(0)
+        return self.states[0]
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_pushes_only_on_change():
+    low = {"price": 95000.0}
+    high = {"price": 101000.0}
+    publisher = StatePublisher(StateSource(low, low, high), poll_seconds=0.01)
+
+    events = list(publisher.subscribe(heartbeat_seconds=60, max_seconds=0.3))
+
+    assert events == ["retry: 10\n\n", format_event(low), format_event(high)]
+
+
+def test_heartbeat_when_idle():
+    publisher = StatePublisher(StateSource({"price": 95000.0}), poll_seconds=0.01)
+
+    events = list(publisher.subscribe(heartbeat_seconds=0.1, max_seconds=0.35))
+
+    assert events.count(": keepalive\n\n") >= 2
+    assert events.count(format_event({"price": 95000.0})) == 1
+
+
+def test_skips_unavailable_state():
+    def failing_state():
+        raise RuntimeError("db down")
+
+    publisher = StatePublisher(failing_state, poll_seconds=0.01)
+
+    events = list(publisher.subscribe(heartbeat_seconds=60, max_seconds=0.1))
+
+    assert events == ["retry: 10\n\n"]
+
+
+def test_state_built_once_per_poll_for_all_streams():
+    source = StateSource({"price": 95000.0})
+    publisher = StatePublisher(source, poll_seconds=0.05)
+    streams = [publisher.subscribe(heartbeat_seconds=60, max_seconds=5) for _ in range(20)]
+
+    for stream in streams:
+        assert next(stream) == "retry: 50\n\n"
+        assert next(stream) == format_event({"price": 95000.0})
+    assert publisher.subscribers == 20
+
+    time.sleep(0.25)
+    # One poller for the process, however many tabs are open.
+    assert source.calls <= 8
+    poller = publisher._poller
+    assert poller is not None and poller.is_alive()
+
+    for stream in streams:
+        stream.close()
+    assert publisher.subscribers == 0
+    poller.join(timeout=1)
+    assert not poller.is_alive()
+
+
+def test_poller_stops_without_subscribers():
+    source = StateSource({"price": 95000.0})
+    publisher = StatePublisher(source, poll_seconds=0.01)
+    stream = publisher.subscribe(heartbeat_seconds=60, max_seconds=5)
+    next(stream)
+    next(stream)
+    stream.close()
+
+    wait_for(lambda: publisher._poller is None)
+    calls = source.calls
+    time.sleep(0.05)
+    assert source.calls == calls
+
+
+def test_async_streams_share_the_poller():
+    source = StateSource({"price": 95000.0}, {"price": 101000.0})
+    publisher = StatePublisher(source, poll_seconds=0.05)
+
+    async def collect():
+        return await asyncio.gather(
+            *(
+                consume(publisher.subscribe_async(heartbeat_seconds=60, max_seconds=0.3))
+                for _ in range(50)
+            )
+        )
+
+    async def consume(stream):
+        return [event async for event in stream]
+
+    results = asyncio.run(collect())
+
+    assert all(
+        events == [
+            "retry: 50\n\n",
+            format_event({"price": 95000.0}),
+            format_event({"price": 101000.0}),
+        ]
+        for events in results
+    )
+    assert source.calls <= 10
+    assert publisher.subscribers == 0